@@ -1,19 +1,409 @@
-from fastapi import APIRouter, HTTPException
-from app.models import Diagram
+import asyncio
+import itertools
+from typing import Annotated, Any, List, Optional
+from fastapi import APIRouter, Body, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError, WrapValidator
+from app.compact import CompactDiagram
+from app.models import Diagram, DiagramPrompt, CapacityRequest
 from app.data.templates import TEMPLATES
-from app.services.generator import generate_project
+from app.services.template_cache import build_template_cache, template_response
+from app.services.archive import stream_project_archive
+from app.services.generator import output_name
+from app.services.writers import ARCHIVE_FORMATS
+from app.services.jobs import get_job_manager, dedupe_project_names, JobQueueFull
+from app.services.ai_service import llm_cache_stats, stream_diagram_from_prompt
+from app.services.diagram_stream import format_sse
+from app.services.capacity import simulate_capacity, CapacityError
+from app.services.layout import layout_compact, DIRECTIONS
+from app.services.sessions import get_session_store, PreconditionFailed, InvalidDiagram
+from app.services.json_patch import JsonPatchError, JsonPatchConflict
+from app.services.project_store import (get_project_store, dumps, InvalidCursor, InvalidProjectName, DEFAULT_PAGE_SIZE,
+                                        MAX_PAGE_SIZE, MAX_CACHED_ARCHIVE)
+from app.services.instrumentation import REGISTRY, span
 
 router = APIRouter()
 
+# Routes that read a Diagram body through read_diagram() document it this way
+DIAGRAM_BODY = {"requestBody": {"required": True, "content": {
+    "application/json": {"schema": {"$ref": "#/components/schemas/Diagram"}}}}}
+
+def timed_validation(value, handler):
+    with span("validate"):
+        return handler(value)
+
+# Body parameters FastAPI validates are timed as the "validate" phase, like
+# the bodies read_diagram() parses
+TIMED = WrapValidator(timed_validation)
+
+# Validated and encoded once at startup; requests only pick a variant
+TEMPLATE_CACHE = build_template_cache(TEMPLATES)
+
+@router.get("/templates")
+async def list_templates():
+    return [
+        {"id": entry.id, "nodes": entry.node_count, "edges": entry.edge_count, "etag": entry.etags["identity"]}
+        for entry in TEMPLATE_CACHE.values()
+    ]
+
 @router.get("/templates/{template_id}")
-async def get_template(template_id: str):
-    if template_id not in TEMPLATES:
+async def get_template(template_id: str, request: Request):
+    entry = TEMPLATE_CACHE.get(template_id)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Template not found")
-    return TEMPLATES[template_id]
+    return template_response(entry, request)
+
+@router.post("/generate", status_code=202, openapi_extra=DIAGRAM_BODY)
+async def generate_code(request: Request, incremental: bool = False, archive: Optional[str] = None):
+    """
+    Queues generation and returns the job right away; poll /jobs/{job_id} for
+    progress and the result. With ?archive=zip|tar.gz the project is streamed
+    back as a download instead.
+    """
+    diagram = (await read_diagram(request)).to_diagram()
+    if archive is not None:
+        return await generate_archive(diagram, archive)
+    return submit_job(diagram, incremental)
+
+@router.post("/generate/batch")
+async def generate_batch(diagrams: Annotated[List[Diagram], TIMED], incremental: bool = False, wait: bool = True):
+    """
+    Generates many diagrams in parallel on the job pool. Each diagram is its
+    own job, so a failure only shows up in that diagram's entry. Repeated
+    project names are suffixed (_2, _3, ...) to keep their outputs apart.
+    With wait=false the queued jobs are returned immediately.
+    """
+    manager = get_job_manager()
+    try:
+        jobs = manager.submit_batch(dedupe_project_names(diagrams), incremental=incremental)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    if wait:
+        await asyncio.gather(*(asyncio.wrap_future(job.done) for job in jobs))
+    return [manager.describe(job) for job in jobs]
+
+@router.get("/jobs")
+async def list_jobs():
+    manager = get_job_manager()
+    return [manager.describe(job) for job in manager.list()]
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return manager.describe(job)
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    manager = get_job_manager()
+    job = manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return manager.describe(job)
+
+@router.post("/generate-diagram/stream")
+async def stream_diagram(request: DiagramPrompt):
+    """
+    Server-sent events: `node` and `edge` events as soon as each element is
+    parsed and validated, `error` for elements that fail validation, a
+    `layout` event with positions for nodes that came without one, and a
+    final `done` event.
+    """
+    def events():
+        for kind, payload in stream_diagram_from_prompt(request.prompt, request.project_type):
+            if hasattr(payload, "model_dump"):
+                payload = payload.model_dump()
+            yield format_sse(kind, payload)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.post("/layout", openapi_extra=DIAGRAM_BODY)
+async def layout(request: Request, direction: str = "TB", force: bool = False):
+    """
+    Places the nodes that have no position (all of them with force=true),
+    top-down (TB) or left-to-right (LR), and returns the diagram.
+    """
+    if direction not in DIRECTIONS:
+        raise HTTPException(status_code=400, detail=f"direction must be one of: {', '.join(DIRECTIONS)}")
+    compact = await read_diagram(request)
+    body = await run_in_threadpool(lambda: layout_compact(compact, direction, force).to_json())
+    return Response(body, media_type="application/json")
 
-@router.post("/generate")
-async def generate_code(diagram: Diagram):
+@router.post("/simulate")
+async def simulate(request: Annotated[CapacityRequest, TIMED]):
+    """
+    Capacity estimate for a diagram under an offered load: per-node
+    utilisation, queue length and latency percentiles, and the bottleneck.
+    """
     try:
-        return generate_project(diagram)
+        return await run_in_threadpool(simulate_capacity, request.diagram, request.rates, request.rps)
+    except CapacityError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.post("/sessions", status_code=201, openapi_extra=DIAGRAM_BODY)
+async def create_session(request: Request, response: Response):
+    """
+    Stores a diagram server-side. Later edits can be sent as JSON Patch to
+    PATCH /sessions/{session_id} instead of resending the whole diagram.
+    """
+    compact = await read_diagram(request)
+    session = get_session_store().create(compact.to_dict())
+    response.headers["ETag"] = session.etag
+    return session.to_dict()
+
+@router.get("/sessions/{session_id}")
+async def get_session(session_id: str, response: Response):
+    session = get_session_or_404(session_id)
+    response.headers["ETag"] = session.etag
+    return session.to_dict(include_diagram=True)
+
+@router.patch("/sessions/{session_id}")
+async def patch_session(session_id: str, response: Response, patch: List[Any] = Body(...),
+                        if_match: Optional[str] = Header(None)):
+    """
+    Applies an RFC 6902 JSON Patch to the session's diagram. Send the ETag of
+    the version the patch was made against as If-Match: 412 if the session
+    has moved on since, 409 if the patch doesn't apply (missing path, failed
+    `test`), 400 for a malformed patch and 422 if the result isn't a valid
+    diagram. Without If-Match the patch goes onto the latest version.
+    """
+    session = get_session_or_404(session_id)
+    try:
+        await run_in_threadpool(session.apply, patch, if_match)
+    except PreconditionFailed as e:
+        raise HTTPException(status_code=412, detail=str(e), headers={"ETag": e.etag})
+    except JsonPatchConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except JsonPatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except InvalidDiagram as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    response.headers["ETag"] = session.etag
+    return session.to_dict()
+
+@router.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str):
+    if not get_session_store().delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+@router.post("/sessions/{session_id}/generate", status_code=202)
+async def generate_from_session(session_id: str, incremental: bool = False, archive: Optional[str] = None,
+                                if_match: Optional[str] = Header(None)):
+    """
+    /generate for the session's current diagram (or 412 if If-Match names
+    another version).
+    """
+    session = get_session_or_404(session_id)
+    if if_match is not None and not session.matches(if_match):
+        raise HTTPException(status_code=412, detail=f"Session has moved on to {session.etag}",
+                            headers={"ETag": session.etag})
+    diagram = session.diagram()
+    if archive is not None:
+        return await generate_archive(diagram, archive)
+    return submit_job(diagram, incremental)
+
+@router.post("/projects", status_code=201, openapi_extra=DIAGRAM_BODY)
+async def save_project(request: Request, response: Response, owner: Optional[str] = None):
+    """
+    Saves the diagram as the next version of the project named by its
+    project_name, creating the project on first save. Saving content equal
+    to the latest version answers 200 without adding a version.
+    """
+    compact = await read_diagram(request)
+    try:
+        project = await run_in_threadpool(get_project_store().save_version, compact.to_dict(), owner)
+    except InvalidProjectName as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not project["created"]:
+        response.status_code = 200
+    return project
+
+@router.get("/projects")
+async def list_projects(owner: Optional[str] = None, cursor: Optional[str] = None,
+                        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """
+    Projects, most recently updated first. Pass `next_cursor` back as
+    `cursor` for the following page.
+    """
+    return await search_page(owner=owner, limit=limit, cursor=cursor)
+
+@router.get("/projects/search")
+async def search_projects(q: Optional[str] = None, node_type: Optional[str] = None, owner: Optional[str] = None,
+                          cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """
+    Projects whose name starts with `q` (case insensitive), whose latest
+    version has a `node_type` node and/or that belong to `owner`.
+    """
+    return await search_page(q=q, node_type=node_type, owner=owner, limit=limit, cursor=cursor)
+
+@router.get("/projects/{name}")
+async def get_project(name: str):
+    store = get_project_store()
+    project = await run_in_threadpool(store.get_project, name)
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    project["node_types"] = await run_in_threadpool(store.node_types, project["id"])
+    return project
+
+@router.delete("/projects/{name}", status_code=204)
+async def delete_project(name: str):
+    if not await run_in_threadpool(get_project_store().delete_project, name):
+        raise HTTPException(status_code=404, detail="Project not found")
+
+@router.get("/projects/{name}/versions")
+async def list_project_versions(name: str, cursor: Optional[str] = None,
+                                limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    return await store_page(get_project_store().list_versions, name, limit, cursor)
+
+@router.get("/projects/{name}/versions/{version}")
+async def get_project_version(name: str, version: int):
+    stored = await run_in_threadpool(get_project_store().get_version, name, version)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Project version not found")
+    return Response(dumps(stored), media_type="application/json")
+
+@router.get("/projects/{name}/generations")
+async def list_project_generations(name: str, cursor: Optional[str] = None,
+                                   limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    return await store_page(get_project_store().list_generations, name, limit, cursor)
+
+@router.post("/projects/{name}/generate", status_code=202)
+async def generate_stored_project(name: str, version: Optional[int] = None, incremental: bool = False,
+                                  archive: Optional[str] = None):
+    """
+    /generate for a stored version (the latest by default), recorded in the
+    project's generation history. Archives are kept per version and format,
+    so downloading the same version again skips generation.
+    """
+    store = get_project_store()
+    stored = await run_in_threadpool(store.get_version, name, version)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Project version not found")
+    project_id, version = stored["project"]["id"], stored["version"]["version"]
+    diagram = CompactDiagram.from_dict(stored["diagram"]).to_diagram()
+
+    if archive is not None:
+        if archive not in ARCHIVE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"archive must be one of: {', '.join(ARCHIVE_FORMATS)}")
+        cached = await run_in_threadpool(store.cached_archive, project_id, version, archive)
+        if cached is not None:
+            return Response(cached, media_type=ARCHIVE_FORMATS[archive],
+                            headers={"Content-Disposition": f'attachment; filename="{name}.{archive}"', "X-Cache": "hit"})
+        generation_id = await run_in_threadpool(store.start_generation, project_id, version, archive)
+
+        def finish(status, data):
+            store.finish_generation(generation_id, status, archive=data)
+
+        return await generate_archive(diagram, archive, finish)
+
+    def record(job):
+        # Runs on the job manager's hook thread once the job has finished
+        store.record_job(project_id, version, job.id, job.status, job.result, job.error)
+
+    manager = get_job_manager()
+    try:
+        job = manager.submit(diagram, incremental=incremental, on_finish=record)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    generation_id = await run_in_threadpool(store.record_job, project_id, version, job.id, "running")
+    return dict(manager.describe(job), generation_id=generation_id, version=version)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus exposition of per-phase timings and node/edge/byte counters.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/ai/cache")
+async def get_llm_cache_stats():
+    return llm_cache_stats()
+
+async def read_diagram(request: Request) -> CompactDiagram:
+    """
+    Parses a Diagram request body on the compact fast path. Invalid bodies get
+    the same 422 response as a `diagram: Diagram` parameter would.
+    """
+    body = await request.body()
+    try:
+        return await run_in_threadpool(CompactDiagram.from_json, body)
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)])
+    except ValueError as e:
+        raise RequestValidationError([{"type": "json_invalid", "loc": ("body", 0), "msg": "JSON decode error",
+                                       "input": {}, "ctx": {"error": str(e)}}])
+
+def get_session_or_404(session_id: str):
+    session = get_session_store().get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+def submit_job(diagram: Diagram, incremental: bool):
+    manager = get_job_manager()
+    try:
+        job = manager.submit(diagram, incremental=incremental)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return manager.describe(job)
+
+async def search_page(**filters):
+    try:
+        return await run_in_threadpool(lambda: get_project_store().search_projects(**filters))
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def store_page(query, name: str, limit: int, cursor: Optional[str]):
+    try:
+        page = await run_in_threadpool(query, name, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return page
+
+def record_archive(chunks, finish):
+    """
+    Passes archive chunks through, then calls finish(status, archive bytes);
+    the bytes are None unless the archive completed within MAX_CACHED_ARCHIVE.
+    """
+    parts, size, status = [], 0, "failed"
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            if parts is not None:
+                parts.append(chunk)
+                if size > MAX_CACHED_ARCHIVE:
+                    parts = None
+            yield chunk
+        status = "completed"
+    except GeneratorExit:
+        status = "cancelled"
+        raise
+    finally:
+        finish(status, b"".join(parts) if status == "completed" and parts is not None else None)
+
+async def generate_archive(diagram: Diagram, fmt: str, finish=None):
+    if fmt not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"archive must be one of: {', '.join(ARCHIVE_FORMATS)}")
+
+    chunks = stream_project_archive(diagram, fmt)
+    if finish is not None:
+        chunks = record_archive(chunks, finish)
+    # Pull the first chunk before answering so generation errors still map to a 500
+    try:
+        first = await run_in_threadpool(next, chunks, b"")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    filename = f"{output_name(diagram)}.{fmt}"
+    return StreamingResponse(
+        itertools.chain([first], chunks),
+        media_type=ARCHIVE_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
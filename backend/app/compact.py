@@ -0,0 +1,234 @@
+import sys
+import json
+import numpy as np
+from app.models import Diagram, Node, Edge
+from app.services.instrumentation import span, count
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_MISSING = float("nan")
+
+
+class CompactDiagram:
+    """
+    Column-oriented Diagram for large imports: one list or array per field
+    instead of a model object (and a position dict) per node and edge.
+
+    Node and data["type"] strings are interned, x / y are float64 arrays (NaN
+    when the node has no position) and edges hold int32 indices into the
+    node list. Endpoints that name no node are kept by name in
+    `external_ids` and indexed from len(ids) on, positions with keys other
+    than x and y in `extra_positions`, and edge data only where non-empty,
+    so converting back gives exactly Diagram.model_validate(...).model_dump().
+    """
+
+    __slots__ = ("project_name", "ids", "types", "data", "x", "y", "extra_positions",
+                 "edge_ids", "source", "target", "edge_data", "external_ids")
+
+    def __init__(self, project_name, ids, types, data, x, y, extra_positions,
+                 edge_ids, source, target, edge_data, external_ids):
+        self.project_name = project_name
+        self.ids = ids
+        self.types = types
+        self.data = data
+        self.x = x
+        self.y = y
+        self.extra_positions = extra_positions  # {node index: position}
+        self.edge_ids = edge_ids
+        self.source = source
+        self.target = target
+        self.edge_data = edge_data              # {edge index: data}
+        self.external_ids = external_ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_ids)
+
+    @classmethod
+    def from_json(cls, body):
+        """
+        Parses a Diagram JSON document (bytes or str). Raises ValueError for
+        malformed JSON and pydantic's ValidationError for a document that
+        isn't a valid Diagram.
+        """
+        with span("parse"):
+            document = orjson.loads(body) if orjson is not None else json.loads(body)
+        return cls.from_dict(document)
+
+    @classmethod
+    def from_dict(cls, document):
+        """
+        Checks the common shape directly and builds the columns in one pass.
+        Anything unusual (coercions, missing fields, wrong types) goes through
+        the Diagram model instead, so acceptance and errors match it exactly;
+        that fallback is timed as "validate_fallback" and counted as
+        "compact_fallback". Node and edge data dicts are copied, so the
+        result doesn't share them with `document`.
+        """
+        with span("validate"):
+            try:
+                compact = _from_plain(document)
+            except (TypeError, KeyError, AttributeError, ValueError):
+                compact = None
+        if compact is None:
+            count("compact_fallback")
+            with span("validate_fallback"):
+                compact = cls.from_diagram(Diagram.model_validate(document))
+        return compact
+
+    @classmethod
+    def from_diagram(cls, diagram: Diagram):
+        return _from_plain(diagram.model_dump(), trusted=True)
+
+    def positions(self):
+        """
+        Position of every node as a dict, or None, like Node.position.
+        """
+        result = []
+        extra = self.extra_positions
+        for i, (x, y) in enumerate(zip(self.x.tolist(), self.y.tolist())):
+            if i in extra:
+                result.append(dict(extra[i]))
+            elif x != x:
+                result.append(None)
+            else:
+                result.append({"x": x, "y": y})
+        return result
+
+    def endpoint_ids(self):
+        return self.ids + self.external_ids
+
+    def to_dict(self) -> dict:
+        """
+        Same document as Diagram.model_dump().
+        """
+        names = self.endpoint_ids()
+        edge_data = self.edge_data
+        return {
+            "nodes": [
+                {"id": node_id, "type": node_type, "data": data, "position": position}
+                for node_id, node_type, data, position in zip(self.ids, self.types, self.data, self.positions())
+            ],
+            "edges": [
+                {"id": edge_id, "source": names[source], "target": names[target], "data": edge_data.get(i, {})}
+                for i, (edge_id, source, target) in enumerate(zip(self.edge_ids, self.source.tolist(), self.target.tolist()))
+            ],
+            "project_name": self.project_name,
+        }
+
+    def to_json(self) -> bytes:
+        document = self.to_dict()
+        if orjson is not None:
+            return orjson.dumps(document)
+        return json.dumps(document, separators=(",", ":")).encode()
+
+    def to_diagram(self) -> Diagram:
+        """
+        The Diagram models, built without validating again.
+        """
+        document = self.to_dict()
+        return Diagram.model_construct(
+            nodes=[Node.model_construct(**node) for node in document["nodes"]],
+            edges=[Edge.model_construct(**edge) for edge in document["edges"]],
+            project_name=document["project_name"],
+        )
+
+
+def _from_plain(document, trusted=False):
+    """
+    Columns from a plain diagram document, or None when it needs the model's
+    validation (only checked when not `trusted`). A `trusted` document is a
+    fresh model_dump(), so its data dicts are taken over instead of copied.
+    """
+    if not trusted:
+        if type(document) is not dict or type(document.get("nodes")) is not list or type(document.get("edges")) is not list:
+            return None
+    project_name = document.get("project_name", Diagram.model_fields["project_name"].default)
+    nodes = document["nodes"]
+    edges = document["edges"]
+    if not trusted and type(project_name) is not str:
+        return None
+
+    intern = sys.intern
+    n = len(nodes)
+    ids = [None] * n
+    types = [None] * n
+    data = [None] * n
+    xs = [_MISSING] * n
+    ys = [_MISSING] * n
+    extra_positions = {}
+    index = {}
+    for i, node in enumerate(nodes):
+        node_id, node_type, node_data = node["id"], node["type"], node["data"]
+        position = node.get("position")
+        if not trusted and (type(node) is not dict or type(node_id) is not str
+                            or type(node_type) is not str or type(node_data) is not dict):
+            return None
+        ids[i] = node_id
+        types[i] = intern(node_type)
+        if not trusted:
+            node_data = dict(node_data)
+        data_type = node_data.get("type")
+        if type(data_type) is str:
+            node_data["type"] = intern(data_type)
+        data[i] = node_data
+        index.setdefault(node_id, i)
+        if position is None:
+            continue
+        if not trusted:
+            if type(position) is not dict:
+                return None
+            for value in position.values():
+                if type(value) is not float and type(value) is not int:
+                    return None
+        px, py = position.get("x"), position.get("y")
+        # NaN marks "no position", so a NaN coordinate is kept on the side
+        if len(position) == 2 and px is not None and py is not None and px == px and py == py:
+            xs[i] = px
+            ys[i] = py
+        else:
+            extra_positions[i] = {key: float(value) for key, value in position.items()}
+
+    m = len(edges)
+    edge_ids = [None] * m
+    sources = [0] * m
+    targets = [0] * m
+    edge_data = {}
+    external_ids = []
+    external = {}
+    for i, edge in enumerate(edges):
+        edge_id, edge_source, edge_target = edge["id"], edge["source"], edge["target"]
+        if not trusted and (type(edge) is not dict or type(edge_id) is not str
+                            or type(edge_source) is not str or type(edge_target) is not str):
+            return None
+        edge_ids[i] = edge_id
+        source = index.get(edge_source)
+        if source is None:
+            source = _external_index(edge_source, n, external, external_ids)
+        target = index.get(edge_target)
+        if target is None:
+            target = _external_index(edge_target, n, external, external_ids)
+        sources[i] = source
+        targets[i] = target
+        if "data" in edge:
+            payload = edge["data"]
+            if not trusted and type(payload) is not dict:
+                return None
+            if payload:
+                edge_data[i] = payload if trusted else dict(payload)
+    return CompactDiagram(project_name, ids, types, data, np.array(xs, dtype=float), np.array(ys, dtype=float),
+                          extra_positions, edge_ids, np.array(sources, dtype=np.int32),
+                          np.array(targets, dtype=np.int32), edge_data, external_ids)
+
+
+def _external_index(name, n, external, external_ids):
+    position = external.get(name)
+    if position is None:
+        position = external[name] = n + len(external_ids)
+        external_ids.append(name)
+    return position
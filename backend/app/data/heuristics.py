@@ -0,0 +1,83 @@
+# Rules for generate_diagram_heuristic, evaluated in order.
+#
+# A rule fires when any of its keywords appears in the lowercased prompt (no
+# keywords = always) and, if set, the project type is listed. Only the first
+# firing rule of each slot is applied, which gives if/else choices such as
+# Load Balancer vs API Gateway.
+#
+# Nodes are (key, label, type, x, y, icon, color); edges are (source key,
+# target key) and may point at nodes added by earlier rules. Edges to a key
+# that was never added are skipped. x, y are only used with layout=False;
+# otherwise the layout engine places the nodes.
+HEURISTIC_RULES = [
+    # 1. Client Layer
+    {
+        "slot": "client",
+        "project_types": ("mobile",),
+        "nodes": [("client", "Mobile App", "Mobile App", 250, 50, "Mobile", "bg-purple-600")],
+    },
+    {
+        "slot": "client",
+        "nodes": [("client", "Web App", "Web App", 250, 50, "Web", "bg-blue-500")],
+    },
+
+    # 2. Gateway / Load Balancer
+    {
+        "slot": "gateway",
+        "keywords": ("load balancer", "scale"),
+        "nodes": [("gateway", "Load Balancer", "Load Balancer", 250, 200, "Server", "bg-yellow-500")],
+        "edges": [("client", "gateway")],
+    },
+    {
+        "slot": "gateway",
+        "nodes": [("gateway", "API Gateway", "API Gateway", 250, 200, "Gateway", "bg-orange-500")],
+        "edges": [("client", "gateway")],
+    },
+
+    # 3. Services
+    {
+        "slot": "core",
+        "nodes": [("core", "Core Service", "Microservice", 250, 350, "Microservice", "bg-green-600")],
+        "edges": [("gateway", "core")],
+    },
+    {
+        "slot": "auth",
+        "keywords": ("auth", "login", "user"),
+        "nodes": [("auth", "Auth Service", "Microservice", 50, 350, "Key", "bg-blue-500")],
+        "edges": [("gateway", "auth")],
+    },
+    {
+        "slot": "payment",
+        "keywords": ("payment", "stripe", "shop"),
+        "nodes": [("payment", "Payment Service", "Microservice", 450, 350, "Microservice", "bg-green-600")],
+        "edges": [("gateway", "payment")],
+    },
+    {
+        "slot": "search",
+        "keywords": ("search",),
+        "nodes": [
+            ("search", "Search Service", "Microservice", 650, 350, "Microservice", "bg-green-600"),
+            ("elasticsearch", "Elasticsearch", "ELK", 650, 500, "Stack", "bg-blue-400"),
+        ],
+        "edges": [("gateway", "search"), ("search", "elasticsearch")],
+    },
+
+    # 4. Data Layer
+    {
+        "slot": "db",
+        "nodes": [("db", "Primary DB", "Database", 250, 500, "Database", "bg-red-600")],
+        "edges": [("core", "db")],
+    },
+    {
+        "slot": "cache",
+        "keywords": ("cache", "fast", "real-time"),
+        "nodes": [("cache", "Redis Cache", "Database", 450, 500, "Stack", "bg-red-400")],
+        "edges": [("core", "cache")],
+    },
+    {
+        "slot": "queue",
+        "keywords": ("queue", "async", "event"),
+        "nodes": [("queue", "Kafka", "RabbitMQ/KAFKA", 50, 500, "Queue", "bg-blue-800")],
+        "edges": [("core", "queue")],
+    },
+]
@@ -0,0 +1,284 @@
+"""
+Load generator for this project's API gateway. Standard library only.
+
+    python loadtest.py --base-url http://localhost --concurrency 64 --duration 30
+    python loadtest.py --mix user_service=3,order_service=1 --target-rps 500
+    python loadtest.py --stub           # run against a local stub server
+
+Routes come from routes.json next to this file, generated from the same
+upstreams and locations as the gateway's nginx.conf. Each worker keeps one
+HTTP/1.1 keep-alive connection and sends requests back to back (closed loop),
+picking a route per request by weight. The report is printed as JSON; with
+--target-rps / --max-p99-ms the exit status is 1 when a target is missed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+ROUTES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routes.json")
+
+
+def load_config(path=ROUTES_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_mix(value):
+    """
+    "user_service=3,order_service=1" -> {"user_service": 3.0, "order_service": 1.0}
+    """
+    mix = {}
+    for part in filter(None, (item.strip() for item in value.split(","))):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight) if weight else 1.0
+    return mix
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile over an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "p50": ms(percentile(latencies, 50)),
+        "p95": ms(percentile(latencies, 95)),
+        "p99": ms(percentile(latencies, 99)),
+        "max": ms(latencies[-1]) if latencies else 0.0,
+        "mean": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+    }
+
+
+class Connection:
+    """
+    Minimal HTTP/1.1 client connection with keep-alive.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, timeout):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nAccept: */*\r\nContent-Length: 0\r\n\r\n"
+        self.writer.write(head.encode())
+        return await asyncio.wait_for(self._read_response(), timeout)
+
+    async def _read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            await self.reader.read()
+            self.close()
+            return status
+
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def worker(host, port, routes, weights, deadline, timeout, results):
+    conn = Connection(host, port)
+    rng = random.Random()
+    try:
+        while time.perf_counter() < deadline:
+            route = rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = await conn.request(route["method"], route["path"], timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+                conn.close()
+                status = 0
+            results.append((route["name"], status, time.perf_counter() - start))
+    finally:
+        conn.close()
+
+
+async def run_load(base_url, routes, concurrency, duration, timeout=10.0):
+    parts = urlsplit(base_url)
+    host = parts.hostname or "localhost"
+    port = parts.port or 80
+    prefix = parts.path.rstrip("/")
+    routes = [dict(route, path=prefix + route["path"]) for route in routes]
+    weights = [route["weight"] for route in routes]
+
+    results = []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        worker(host, port, routes, weights, deadline, timeout, results) for _ in range(concurrency)
+    ))
+    return results, time.perf_counter() - start
+
+
+def build_report(results, elapsed, concurrency):
+    by_route = {}
+    status_codes = {}
+    for name, status, seconds in results:
+        by_route.setdefault(name, []).append((status, seconds))
+        key = str(status) if status else "error"
+        status_codes[key] = status_codes.get(key, 0) + 1
+
+    def section(items):
+        # Connection failures (0), rate-limit rejections and 5xx all count as errors
+        ok = [seconds for status, seconds in items if 0 < status < 400]
+        return {
+            "requests": len(items),
+            "errors": len(items) - len(ok),
+            "rps": round(len(items) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": summarize(ok),
+        }
+
+    report = section([(status, seconds) for _, status, seconds in results])
+    report.update({
+        "duration_s": round(elapsed, 3),
+        "concurrency": concurrency,
+        "status_codes": status_codes,
+        "routes": {name: section(items) for name, items in sorted(by_route.items())},
+    })
+    return report
+
+
+def check_targets(report, target_rps=None, max_p99_ms=None):
+    failures = []
+    if target_rps and report["rps"] < target_rps:
+        failures.append(f"rps {report['rps']} < target {target_rps}")
+    if max_p99_ms and report["latency_ms"]["p99"] > max_p99_ms:
+        failures.append(f"p99 {report['latency_ms']['p99']}ms > max {max_p99_ms}ms")
+    return failures
+
+
+async def _stub_handler(reader, writer):
+    # Answers every request with a small JSON body over keep-alive
+    body = b'{"status": "ok"}'
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: "
+                         + str(len(body)).encode() + b"\r\n\r\n" + body)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_stub_server(host="127.0.0.1", port=0):
+    """
+    Local stand-in for the gateway; returns (server, base_url).
+    """
+    server = await asyncio.start_server(_stub_handler, host, port)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://{host}:{port}"
+
+
+def select_routes(config, mix=None):
+    routes = [dict(route) for route in config["routes"]]
+    if mix:
+        unknown = set(mix) - {route["name"] for route in routes}
+        if unknown:
+            raise SystemExit(f"unknown routes in --mix: {', '.join(sorted(unknown))}")
+        routes = [dict(route, weight=mix[route["name"]]) for route in routes if mix.get(route["name"], 0) > 0]
+    routes = [route for route in routes if route.get("weight", 1) > 0]
+    if not routes:
+        raise SystemExit("no routes to test")
+    return routes
+
+
+async def main_async(args):
+    config = load_config(args.routes)
+    routes = select_routes(config, parse_mix(args.mix) if args.mix else None)
+    targets = config.get("targets", {})
+    target_rps = args.target_rps if args.target_rps is not None else targets.get("rps")
+    max_p99_ms = args.max_p99_ms if args.max_p99_ms is not None else targets.get("p99_ms")
+
+    server = None
+    base_url = args.base_url
+    if args.stub:
+        server, base_url = await start_stub_server()
+    try:
+        results, elapsed = await run_load(base_url, routes, args.concurrency, args.duration, args.timeout)
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+    report = build_report(results, elapsed, args.concurrency)
+    report["base_url"] = base_url
+    failures = check_targets(report, target_rps, max_p99_ms)
+    report["targets"] = {"rps": target_rps, "p99_ms": max_p99_ms, "passed": not failures, "failures": failures}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("LOADTEST_BASE_URL", "http://localhost"))
+    parser.add_argument("--concurrency", type=int, default=32, help="parallel connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout in seconds")
+    parser.add_argument("--mix", help="route weights, e.g. user_service=3,order_service=1")
+    parser.add_argument("--target-rps", type=float, help="fail when throughput is below this")
+    parser.add_argument("--max-p99-ms", type=float, help="fail when p99 latency is above this")
+    parser.add_argument("--routes", default=ROUTES_FILE, help="routes file (default: routes.json)")
+    parser.add_argument("--stub", action="store_true", help="target a local stub server instead of --base-url")
+    parser.add_argument("--output", help="also write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return 0 if report["targets"]["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
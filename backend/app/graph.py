@@ -0,0 +1,70 @@
+from collections import defaultdict
+from typing import Dict, List, Optional
+from app.models import Diagram, Node, Edge
+
+
+class DiagramGraph:
+    """
+    Adjacency index over a Diagram, built once in O(V + E).
+    Lookups that used to scan every edge are now dictionary hits.
+    """
+
+    def __init__(self, diagram: Diagram):
+        self.diagram = diagram
+        self.nodes: Dict[str, Node] = {}
+        self.out_edges: Dict[str, List[Edge]] = defaultdict(list)
+        self.in_edges: Dict[str, List[Edge]] = defaultdict(list)
+        # Edges touching a node, in diagram order (self loops listed once)
+        self.incident: Dict[str, List[Edge]] = defaultdict(list)
+        self.by_type: Dict[str, List[Node]] = defaultdict(list)
+
+        for node in diagram.nodes:
+            self.nodes[node.id] = node
+            self.by_type[node.data.get('type', 'unknown')].append(node)
+
+        for edge in diagram.edges:
+            self.out_edges[edge.source].append(edge)
+            self.in_edges[edge.target].append(edge)
+            self.incident[edge.source].append(edge)
+            if edge.target != edge.source:
+                self.incident[edge.target].append(edge)
+
+    def get(self, node_id: str) -> Optional[Node]:
+        return self.nodes.get(node_id)
+
+    def nodes_of_type(self, *node_types: str) -> List[Node]:
+        if len(node_types) == 1:
+            return list(self.by_type.get(node_types[0], []))
+        wanted = set(node_types)
+        return [node for node in self.diagram.nodes if node.data.get('type', 'unknown') in wanted]
+
+    def successors(self, node_id: str, node_type: Optional[str] = None) -> List[Node]:
+        return self._resolve((edge.target for edge in self.out_edges.get(node_id, [])), node_type)
+
+    def predecessors(self, node_id: str, node_type: Optional[str] = None) -> List[Node]:
+        return self._resolve((edge.source for edge in self.in_edges.get(node_id, [])), node_type)
+
+    def neighbors(self, node_id: str, node_type: Optional[str] = None) -> List[Node]:
+        """
+        Nodes connected to node_id in either direction, in edge order.
+        """
+        other_ids = (
+            edge.target if edge.source == node_id else edge.source
+            for edge in self.incident.get(node_id, [])
+        )
+        return self._resolve(other_ids, node_type)
+
+    def _resolve(self, node_ids, node_type):
+        result = []
+        for node_id in node_ids:
+            node = self.nodes.get(node_id)
+            if node is None:
+                continue
+            if node_type is not None and node.data.get('type') != node_type:
+                continue
+            result.append(node)
+        return result
+
+
+def build_graph(diagram: Diagram) -> DiagramGraph:
+    return DiagramGraph(diagram)
@@ -1,18 +1,30 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class Node(BaseModel):
     id: str
     type: str
     data: Dict[str, Any]
-    position: Dict[str, float]
+    # Filled in by the layout engine when missing
+    position: Optional[Dict[str, float]] = None
 
 class Edge(BaseModel):
     id: str
     source: str
     target: str
+    data: Dict[str, Any] = {}
 
 class Diagram(BaseModel):
     nodes: List[Node]
     edges: List[Edge]
     project_name: str = "generated_project"
+
+class DiagramPrompt(BaseModel):
+    prompt: str
+    project_type: str = "web"
+
+class CapacityRequest(BaseModel):
+    diagram: Diagram
+    # Offered load: per-node rates, or a total split across the client nodes
+    rates: Dict[str, float] = {}
+    rps: Optional[float] = None
@@ -2,31 +2,21 @@ from app.models import Diagram, Node, Edge
 import uuid
 import os
 import json
-from typing import Optional
+import threading
+from typing import List, Optional
+from app.services.llm_cache import ResponseCache, cache_key, normalize_prompt
+from app.services.diagram_stream import DiagramStreamParser, iter_diagram_events
+from app.data.heuristics import HEURISTIC_RULES
+from app.services.instrumentation import span
+from app.services.layout import layout_diagram, compute_layout
 try:
     from openai import OpenAI
 except ImportError:
     OpenAI = None
 
-def generate_diagram_from_prompt(prompt: str, project_type: str) -> Diagram:
-    """
-    Generates a Diagram based on a natural language prompt.
-    Uses OpenAI if OPENAI_API_KEY is set, otherwise falls back to heuristics.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if api_key and OpenAI:
-        try:
-            return generate_diagram_with_llm(prompt, project_type, api_key)
-        except Exception as e:
-            print(f"LLM generation failed, falling back to heuristics: {e}")
-            return generate_diagram_heuristic(prompt, project_type)
-    else:
-        return generate_diagram_heuristic(prompt, project_type)
+LLM_MODEL = "gpt-4-turbo-preview"
 
-def generate_diagram_with_llm(prompt: str, project_type: str, api_key: str) -> Diagram:
-    client = OpenAI(api_key=api_key)
-    
-    system_prompt = """
+SYSTEM_PROMPT = """
     You are an expert software architect. Create a system architecture diagram based on the user's description.
     You must return a JSON object that matches the following Pydantic schema:
     
@@ -34,7 +24,6 @@ def generate_diagram_with_llm(prompt: str, project_type: str, api_key: str) -> D
         id: str
         type: str # Options: 'Microservice', 'Database', 'Gateway', 'Queue', 'Web App', 'Mobile App'
         data: Dict[str, Any] # Must include 'label' (str) and 'type' (same as above). Optional: 'icon', 'color'
-        position: Dict[str, float] # x, y coordinates. Spread them out nicely.
         
     class Edge(BaseModel):
         id: str
@@ -46,7 +35,8 @@ def generate_diagram_with_llm(prompt: str, project_type: str, api_key: str) -> D
         edges: List[Edge]
         project_name: str
         
-    Ensure the nodes are positioned logically (e.g., Client at top, Gateway below, Services below that, Databases at bottom).
+    Do not include positions; the diagram is laid out automatically. Point edges in the direction of the
+    call (e.g., Client -> Gateway -> Services -> Databases).
     Use specific colors for types:
     - Web/Mobile: bg-blue-500 / bg-purple-600
     - Gateway: bg-orange-500
@@ -54,114 +44,250 @@ def generate_diagram_with_llm(prompt: str, project_type: str, api_key: str) -> D
     - Database: bg-red-600
     - Queue: bg-blue-800
     """
+
+# One client per (api key, base url): the OpenAI client keeps a pooled HTTP
+# connection, so reusing it skips the TCP/TLS handshake on every request.
+# OPENAI_BASE_URL points it at a compatible endpoint, e.g. a local stub server.
+_clients = {}
+_clients_lock = threading.Lock()
+
+llm_cache = ResponseCache.from_env()
+
+def get_client(api_key: str):
+    base_url = os.getenv("OPENAI_BASE_URL") or None
+    with _clients_lock:
+        client = _clients.get((api_key, base_url))
+        if client is None:
+            client = _clients[(api_key, base_url)] = OpenAI(api_key=api_key, base_url=base_url)
+        return client
+
+def llm_cache_stats() -> dict:
+    return llm_cache.stats()
+
+def flush_llm_cache():
+    llm_cache.flush()
+
+def generate_diagram_from_prompt(prompt: str, project_type: str) -> Diagram:
+    """
+    Generates a Diagram based on a natural language prompt.
+    Uses OpenAI if OPENAI_API_KEY is set, otherwise falls back to heuristics.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if api_key and OpenAI:
+        try:
+            with span("llm"):
+                return generate_diagram_with_llm(prompt, project_type, api_key)
+        except Exception as e:
+            print(f"LLM generation failed, falling back to heuristics: {e}")
+    with span("heuristic"):
+        return generate_diagram_heuristic(prompt, project_type)
+
+def generate_diagram_with_llm(prompt: str, project_type: str, api_key: str) -> Diagram:
+    """
+    Identical (normalized prompt, project type) requests are answered from the
+    cache, and concurrent ones share a single upstream call.
+    """
+    key = cache_key(LLM_MODEL, project_type, normalize_prompt(prompt))
+    data = llm_cache.get_or_compute(key, lambda: request_diagram_json(prompt, project_type, api_key))
     
+    # Validate and convert to Diagram model
+    return layout_diagram(Diagram(**data))
+
+def build_messages(prompt: str, project_type: str):
     user_prompt = f"Project Type: {project_type}\nDescription: {prompt}"
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def request_diagram_json(prompt: str, project_type: str, api_key: str) -> dict:
+    client = get_client(api_key)
+    
+    with span("llm_request"):
+        response = client.chat.completions.create(
+            model=LLM_MODEL,
+            response_format={"type": "json_object"},
+            messages=build_messages(prompt, project_type)
+        )
     
-    response = client.chat.completions.create(
-        model="gpt-4-turbo-preview",
+    with span("llm_parse"):
+        content = response.choices[0].message.content
+        data = json.loads(content)
+    # Fail before caching if the model returned something unusable
+    Diagram(**data)
+    return data
+
+def stream_diagram_from_prompt(prompt: str, project_type: str):
+    """
+    Streaming counterpart of generate_diagram_from_prompt. Yields
+    ("project_name", str), ("node", Node), ("edge", Edge) and ("error", str)
+    events as the diagram is produced, then ("layout", {node_id: position})
+    for nodes that arrived without a position, then ("done", summary).
+    """
+    counts = {"node": 0, "edge": 0}
+    source = "heuristic"
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    def counted(events):
+        for kind, payload in events:
+            if kind in counts:
+                counts[kind] += 1
+            yield kind, payload
+
+    if api_key and OpenAI:
+        source = "llm"
+        try:
+            with span("llm_stream"):
+                yield from counted(stream_diagram_with_llm(prompt, project_type, api_key))
+        except Exception as e:
+            if counts["node"] or counts["edge"]:
+                yield "error", f"LLM generation failed: {e}"
+            else:
+                print(f"LLM generation failed, falling back to heuristics: {e}")
+                source = "heuristic"
+    if source == "heuristic":
+        with span("heuristic"):
+            diagram = generate_diagram_heuristic(prompt, project_type)
+        yield from counted(iter_diagram_events(diagram))
+
+    yield "done", {"source": source, "nodes": counts["node"], "edges": counts["edge"]}
+
+def stream_diagram_with_llm(prompt: str, project_type: str, api_key: str):
+    """
+    Runs the completion in streaming mode and emits each node and edge as soon
+    as its JSON object is complete. Cached answers are replayed directly.
+    """
+    key = cache_key(LLM_MODEL, project_type, normalize_prompt(prompt))
+    cached = llm_cache.get(key)
+    if cached is not None:
+        yield from iter_diagram_events(layout_diagram(Diagram(**cached)))
+        return
+
+    client = get_client(api_key)
+    stream = client.chat.completions.create(
+        model=LLM_MODEL,
         response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        messages=build_messages(prompt, project_type),
+        stream=True
     )
-    
-    content = response.choices[0].message.content
-    data = json.loads(content)
-    
-    # Validate and convert to Diagram model
-    return Diagram(**data)
 
-def generate_diagram_heuristic(prompt: str, project_type: str) -> Diagram:
+    parser = DiagramStreamParser()
+    content = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            content.append(delta)
+            yield from parser.feed(delta)
+
+    data = json.loads("".join(content))
+    diagram = Diagram(**data)
+    llm_cache.put(key, data)
+
+    # Positions need the whole graph, so they follow the last edge
+    missing = {node.id for node in diagram.nodes if node.position is None}
+    if missing:
+        layout_diagram(diagram)
+        yield "layout", {node.id: node.position for node in diagram.nodes if node.id in missing}
+
+# (slot, project types, keywords) per rule, with () for "any"
+_rule_conditions = [(rule["slot"], rule.get("project_types") or (), rule.get("keywords") or ())
+                    for rule in HEURISTIC_RULES]
+
+def _fire_rules(text: str, project_type: str) -> tuple:
     """
-    Legacy heuristic generation.
+    Indices of the rules that fire for a lowercased prompt. Plain substring
+    checks: with a rule table this size they beat any single-scan matcher
+    written in Python.
     """
-    prompt = prompt.lower()
+    filled_slots = set()
+    fired = []
+    for rule_index, (slot, project_types, keywords) in enumerate(_rule_conditions):
+        if slot in filled_slots:
+            continue
+        if project_types and project_type not in project_types:
+            continue
+        if keywords and not any(kw in text for kw in keywords):
+            continue
+        filled_slots.add(slot)
+        fired.append(rule_index)
+    return tuple(fired)
+
+# The diagram only depends on which rules fired, so each combination is built
+# (and laid out) once: {(fired rule indices, layout): (nodes, edges)} with
+# nodes as (type, data, position) and edges as (source index, target index)
+_heuristic_templates = {}
+
+def _heuristic_template(fired: tuple, layout: bool):
+    template = _heuristic_templates.get((fired, layout))
+    if template is not None:
+        return template
     nodes = []
     edges = []
-    
-    # Helper to add node
-    def add_node(label, type, x, y, icon=None, color=None):
-        node_id = str(uuid.uuid4())
-        data = {"label": label, "type": type}
-        if icon: data["icon"] = icon
-        if color: data["color"] = color
-        
-        nodes.append(Node(
-            id=node_id,
-            type=type.lower().replace(" ", ""), # simplified type mapping
-            position={"x": x, "y": y},
-            data=data
-        ))
-        return node_id
-
-    # Helper to add edge
-    def add_edge(source, target):
-        edges.append(Edge(
-            id=f"e{source}-{target}",
-            source=source,
-            target=target
-        ))
-
-    # 1. Client Layer
-    client_id = None
-    if project_type == 'mobile':
-        client_id = add_node("Mobile App", "Mobile App", 250, 50, "Mobile", "bg-purple-600")
-    else:
-        client_id = add_node("Web App", "Web App", 250, 50, "Web", "bg-blue-500")
-
-    # 2. Gateway / Load Balancer
-    gateway_id = None
-    if "load balancer" in prompt or "scale" in prompt:
-        gateway_id = add_node("Load Balancer", "Load Balancer", 250, 200, "Server", "bg-yellow-500")
-    else:
-        gateway_id = add_node("API Gateway", "API Gateway", 250, 200, "Gateway", "bg-orange-500")
-    
-    add_edge(client_id, gateway_id)
+    node_index = {}
+    for rule_index in fired:
+        rule = HEURISTIC_RULES[rule_index]
+        for key, label, type, x, y, icon, color in rule["nodes"]:
+            data = {"label": label, "type": type}
+            if icon: data["icon"] = icon
+            if color: data["color"] = color
+            node_index[key] = len(nodes)
+            nodes.append((type.lower().replace(" ", ""), data, {"x": x, "y": y}))  # simplified type mapping
+        for source_key, target_key in rule.get("edges", ()):
+            if source_key in node_index and target_key in node_index:
+                edges.append((node_index[source_key], node_index[target_key]))
 
-    # 3. Services (Heuristic Analysis)
-    service_ids = []
-    
-    # Core Service
-    core_svc_id = add_node("Core Service", "Microservice", 250, 350, "Microservice", "bg-green-600")
-    add_edge(gateway_id, core_svc_id)
-    service_ids.append(core_svc_id)
-
-    # Auth Service (almost always needed)
-    if "auth" in prompt or "login" in prompt or "user" in prompt:
-        auth_id = add_node("Auth Service", "Microservice", 50, 350, "Key", "bg-blue-500")
-        add_edge(gateway_id, auth_id)
-        service_ids.append(auth_id)
-
-    # Payment Service
-    if "payment" in prompt or "stripe" in prompt or "shop" in prompt:
-        pay_id = add_node("Payment Service", "Microservice", 450, 350, "Microservice", "bg-green-600")
-        add_edge(gateway_id, pay_id)
-        service_ids.append(pay_id)
-
-    # Search Service
-    if "search" in prompt:
-        search_id = add_node("Search Service", "Microservice", 650, 350, "Microservice", "bg-green-600")
-        add_edge(gateway_id, search_id)
-        service_ids.append(search_id)
-        
-        # Elasticsearch
-        es_id = add_node("Elasticsearch", "ELK", 650, 500, "Stack", "bg-blue-400")
-        add_edge(search_id, es_id)
-
-    # 4. Data Layer
-    # Main DB
-    db_id = add_node("Primary DB", "Database", 250, 500, "Database", "bg-red-600")
-    add_edge(core_svc_id, db_id)
-
-    # Redis/Cache
-    if "cache" in prompt or "fast" in prompt or "real-time" in prompt:
-        redis_id = add_node("Redis Cache", "Database", 450, 500, "Stack", "bg-red-400") # Updated icon/color
-        add_edge(core_svc_id, redis_id)
-
-    # Kafka/Queue
-    if "queue" in prompt or "async" in prompt or "event" in prompt:
-        kafka_id = add_node("Kafka", "RabbitMQ/KAFKA", 50, 500, "Queue", "bg-blue-800")
-        add_edge(core_svc_id, kafka_id)
-
-    return Diagram(nodes=nodes, edges=edges, project_name="ai_generated_project")
+    if layout and nodes:
+        coords = compute_layout([data["type"] for _, data, _ in nodes], edges).round(1).tolist()
+        nodes = [(type, data, {"x": x, "y": y}) for (type, data, _), (x, y) in zip(nodes, coords)]
+    template = _heuristic_templates[(fired, layout)] = (nodes, edges)
+    return template
+
+def _uuid4_strings(count: int) -> List[str]:
+    """
+    `count` str(uuid.uuid4()) values from a single os.urandom call.
+    """
+    raw = bytearray(os.urandom(16 * count))
+    for i in range(0, 16 * count, 16):
+        raw[i + 6] = raw[i + 6] & 0x0F | 0x40  # version 4
+        raw[i + 8] = raw[i + 8] & 0x3F | 0x80  # RFC 4122 variant
+    h = raw.hex()
+    return [f"{h[j:j + 8]}-{h[j + 8:j + 12]}-{h[j + 12:j + 16]}-{h[j + 16:j + 20]}-{h[j + 20:j + 32]}"
+            for j in range(0, 32 * count, 32)]
+
+def _build_heuristic_diagram(template, ids) -> Diagram:
+    # One validation call for the whole document is cheaper than a model
+    # constructor call per node and edge
+    nodes, edges = template
+    return Diagram.model_validate({
+        "nodes": [{"id": node_id, "type": type, "data": dict(data), "position": dict(position)}
+                  for node_id, (type, data, position) in zip(ids, nodes)],
+        "edges": [{"id": f"e{ids[source]}-{ids[target]}", "source": ids[source], "target": ids[target]}
+                  for source, target in edges],
+        "project_name": "ai_generated_project",
+    })
+
+def generate_diagram_heuristic(prompt: str, project_type: str, layout: bool = True) -> Diagram:
+    """
+    Legacy heuristic generation, driven by the rule table in app/data/heuristics.py.
+    Nodes are placed by the layout engine, or at the rule table's fixed
+    coordinates with layout=False.
+    """
+    template = _heuristic_template(_fire_rules(prompt.lower(), project_type), layout)
+    return _build_heuristic_diagram(template, _uuid4_strings(len(template[0])))
+
+def generate_diagrams_heuristic(prompts: List[str], project_type: str, layout: bool = True) -> List[Diagram]:
+    """
+    generate_diagram_heuristic for many prompts, for seeding diagrams offline.
+    The ids for the whole batch come from one random draw.
+    """
+    templates = [_heuristic_template(_fire_rules(prompt.lower(), project_type), layout) for prompt in prompts]
+    ids = _uuid4_strings(sum(len(nodes) for nodes, _ in templates))
+    diagrams = []
+    start = 0
+    for template in templates:
+        end = start + len(template[0])
+        diagrams.append(_build_heuristic_diagram(template, ids[start:end]))
+        start = end
+    return diagrams
@@ -0,0 +1,94 @@
+import queue
+import threading
+from app.models import Diagram
+from app.services.generator import generate_project
+from app.services.writers import ArchiveWriter
+
+CHUNK_SIZE = 64 * 1024
+# Chunks waiting for the client; bounds memory to roughly CHUNK_SIZE * MAX_PENDING_CHUNKS
+MAX_PENDING_CHUNKS = 16
+
+_DONE = object()
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _QueueSink:
+    """
+    Write-only file object that cuts the archive byte stream into chunks and
+    hands them to the consumer through a bounded queue. A full queue blocks
+    the producer, so a slow client throttles generation instead of buffering.
+    """
+
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= CHUNK_SIZE:
+            self._emit()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._buffer:
+            self._emit()
+
+    def _emit(self):
+        _put(self._chunks, bytes(self._buffer), self._cancelled)
+        self._buffer.clear()
+
+
+def _put(chunks, item, cancelled):
+    while True:
+        if cancelled.is_set():
+            raise _Cancelled()
+        try:
+            chunks.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def stream_project_archive(diagram: Diagram, fmt: str = "zip"):
+    """
+    Generates the project into an in-memory archive and yields it in chunks.
+    Generation runs on a worker thread; closing the iterator early (e.g. the
+    client went away) stops it at the next chunk boundary.
+    """
+    chunks = queue.Queue(maxsize=MAX_PENDING_CHUNKS)
+    cancelled = threading.Event()
+
+    def produce():
+        try:
+            sink = _QueueSink(chunks, cancelled)
+            with ArchiveWriter(sink, fmt) as writer:
+                generate_project(diagram, writer=writer)
+            sink.close()
+            _put(chunks, _DONE, cancelled)
+        except _Cancelled:
+            pass
+        except Exception as e:
+            try:
+                _put(chunks, e, cancelled)
+            except _Cancelled:
+                pass
+
+    worker = threading.Thread(target=produce, name="archive-producer", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
@@ -0,0 +1,378 @@
+import numpy as np
+from app.models import Diagram
+from app.services.scaffold import datastore_engine
+from app.services.instrumentation import span, count
+
+# Per-replica defaults used when a node carries no annotations:
+# (mean service time in ms, concurrent requests one replica can work on)
+TYPE_DEFAULTS = {
+    "API Gateway": (0.5, 1024),
+    "Load Balancer": (0.2, 4096),
+    "Nginx": (0.5, 1024),
+    "CDN": (0.2, 10000),
+    "Microservice": (10.0, 8),
+    "Service": (10.0, 8),
+    "Database": (5.0, 100),
+    "RabbitMQ/KAFKA": (1.0, 64),
+    "Management": (50.0, 100),
+}
+REDIS_DEFAULTS = (0.2, 1)
+OTHER_DEFAULTS = (10.0, 8)
+
+# Offered load enters the graph here; they are sources, not queues
+CLIENT_TYPES = {"Mobile App", "Web App", "SPA"}
+# Requests through these are routed to one successor, not sent to every one
+ROUTING_TYPES = {"API Gateway", "Load Balancer", "Nginx", "CDN"}
+
+PERCENTILES = (50, 95, 99)
+# Stand-in for an unbounded latency so saturated nodes stay finite in the math
+_UNBOUNDED = 1e9
+
+
+class CapacityError(ValueError):
+    pass
+
+
+def simulate_capacity(diagram: Diagram, rates=None, rps=None):
+    """
+    Capacity model of a diagram as an open network of M/M/c queues.
+
+    Node data: `service_time_ms`, `replicas`, `max_connections` (per replica)
+    and `rps` for offered load; edge data: `fanout` (calls per request) and
+    `async` (the caller doesn't wait). Requests through gateways and load
+    balancers are split across their targets by `load_weight` unless the edge
+    sets a fanout. `rates` ({node_id: rps}) or `rps` (split across the client
+    nodes) override the offered load from the diagram.
+
+    Arrival rates come from the traffic equations, a synchronous caller holds
+    its worker for its downstream latency, and each node's waiting time
+    follows Erlang C. The bottleneck is the node that saturates first as the
+    offered load is scaled up.
+    """
+    with span("capacity_model"):
+        model = _build_model(diagram, rates, rps)
+    count("capacity_nodes", len(model["ids"]))
+
+    with span("capacity_solve"):
+        scale = _saturation_scale(model)
+        state = _evaluate(model, 1.0)
+        percentiles = _sojourn_percentiles(state)
+    return _report(model, state, percentiles, scale)
+
+
+def _build_model(diagram, rates, rps):
+    nodes = diagram.nodes
+    ids = [node.id for node in nodes]
+    if not ids:
+        raise CapacityError("Diagram has no nodes")
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    n = len(ids)
+
+    service_time = np.zeros(n)
+    servers = np.zeros(n)
+    is_client = np.zeros(n, dtype=bool)
+    for i, node in enumerate(nodes):
+        node_type = node.data.get('type', 'unknown')
+        if node_type in CLIENT_TYPES:
+            is_client[i] = True
+            servers[i] = np.inf
+            continue
+        if node_type == "Database" and datastore_engine(node.data) == "redis":
+            default_ms, default_conns = REDIS_DEFAULTS
+        else:
+            default_ms, default_conns = TYPE_DEFAULTS.get(node_type, OTHER_DEFAULTS)
+        service_time[i] = _number(node.data.get('service_time_ms'), default_ms, 0.0) / 1000.0
+        servers[i] = _number(node.data.get('replicas'), 1, 1) * _number(node.data.get('max_connections'), default_conns, 1)
+    servers = np.where(is_client, np.inf, np.floor(servers))
+
+    # Routing nodes split traffic by the targets' load_weight
+    route_weight = {}
+    for edge in diagram.edges:
+        source, target = index.get(edge.source), index.get(edge.target)
+        if source is None or target is None or nodes[source].data.get('type') not in ROUTING_TYPES:
+            continue
+        route_weight[source] = route_weight.get(source, 0.0) + _number(nodes[target].data.get('load_weight'), 1.0, 0.0)
+
+    fanout = np.zeros((n, n))
+    blocking = np.zeros((n, n))
+    for edge in diagram.edges:
+        source, target = index.get(edge.source), index.get(edge.target)
+        if source is None or target is None:
+            continue
+        if edge.data.get('fanout') is not None:
+            calls = _number(edge.data.get('fanout'), 1.0, 0.0)
+        elif source in route_weight:
+            weight = _number(nodes[target].data.get('load_weight'), 1.0, 0.0)
+            calls = weight / route_weight[source] if route_weight[source] else 0.0
+        else:
+            calls = 1.0
+        fanout[source, target] += calls
+        if not edge.data.get('async'):
+            blocking[source, target] += calls
+
+    offered = np.zeros(n)
+    if rates:
+        for node_id, rate in rates.items():
+            if node_id not in index:
+                raise CapacityError(f"Unknown node in rates: {node_id}")
+            offered[index[node_id]] = _number(rate, 0.0, 0.0)
+    elif rps is not None:
+        clients = np.flatnonzero(is_client)
+        if not len(clients):
+            raise CapacityError("Diagram has no client nodes to offer load at")
+        offered[clients] = max(float(rps), 0.0) / len(clients)
+    else:
+        for i, node in enumerate(nodes):
+            offered[i] = _number(node.data.get('rps'), 0.0, 0.0)
+    if offered.sum() <= 0:
+        raise CapacityError("No offered load: set `rps` on client nodes or pass rates")
+
+    # Traffic equations: lambda = offered + fanout^T lambda
+    try:
+        arrivals = np.linalg.solve(np.eye(n) - fanout.T, offered)
+    except np.linalg.LinAlgError:
+        raise CapacityError("Call graph has a cycle that amplifies traffic without bound")
+    if not np.all(np.isfinite(arrivals)) or np.any(arrivals < -1e-9):
+        raise CapacityError("Call graph has a cycle that amplifies traffic without bound")
+
+    return {
+        "nodes": nodes,
+        "ids": ids,
+        "service_time": service_time,
+        "servers": servers,
+        "is_client": is_client,
+        "fanout": fanout,
+        "blocking": blocking,
+        "offered": offered,
+        "arrivals": np.maximum(arrivals, 0.0),
+    }
+
+
+def _evaluate(model, scale):
+    """
+    Steady state with the offered load multiplied by `scale`.
+    """
+    arrivals = model["arrivals"] * scale
+    own = model["service_time"]
+    servers = model["servers"]
+    blocking = model["blocking"]
+
+    # A caller's effective service time includes the latency of the calls it
+    # waits on; on a DAG this settles after (depth + 1) passes
+    sojourn = own.copy()
+    for _ in range(len(own) + 1):
+        effective = own + blocking @ np.minimum(sojourn, _UNBOUNDED)
+        state = _mmc(arrivals, effective, servers)
+        if np.allclose(state["sojourn"], sojourn, rtol=1e-9, atol=1e-12):
+            break
+        sojourn = state["sojourn"]
+    state["effective"] = effective
+    state["arrivals"] = arrivals
+    # Waiting on a saturated callee leaves a node's own service time unbounded
+    state["blocked"] = (blocking > 0) @ state["saturated"].astype(float) > 0
+    return state
+
+
+def _mmc(arrivals, service_time, servers):
+    """
+    Vectorised M/M/c: utilisation, Erlang C wait probability, mean queue
+    length and mean time in system for every node at once.
+    """
+    n = len(arrivals)
+    finite = np.isfinite(servers)
+    load = arrivals * service_time                      # offered Erlangs
+    utilization = np.where(finite, load / np.where(finite, servers, 1.0), 0.0)
+    active = finite & (arrivals > 0) & (service_time > 0)
+    stable = utilization < 1.0
+    queued = active & stable
+
+    wait_probability = np.zeros(n)
+    if queued.any():
+        a = load[queued]
+        c = servers[queued]
+        # Erlang B is the Poisson(a) mass at c over the mass up to c, computed
+        # in log space for all nodes at once. Nodes with far more servers than
+        # load (c past a + 10 sqrt(a) + 50) never wait, so they are skipped.
+        erlang_b = np.zeros_like(a)
+        near = c <= np.ceil(a + 10 * np.sqrt(a) + 50)
+        if near.any():
+            a_near, c_near = a[near], c[near]
+            limit = int(c_near.max())
+            k = np.arange(limit + 1)
+            log_factorial = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, limit + 1)))))
+            log_terms = np.where(k <= c_near[:, None], np.outer(np.log(a_near), k) - log_factorial, -np.inf)
+            terms = np.exp(log_terms - log_terms.max(axis=1, keepdims=True))
+            erlang_b[near] = terms[np.arange(len(a_near)), c_near.astype(int)] / terms.sum(axis=1)
+        rho = a / c
+        wait_probability[queued] = erlang_b / (1 - rho * (1 - erlang_b))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drain = np.where(queued, servers * np.where(service_time > 0, 1 / service_time, 0) - arrivals, 0.0)
+        waiting = np.where(queued, wait_probability / np.where(queued, drain, 1.0), 0.0)
+        queue_length = np.where(queued, wait_probability * utilization / (1 - np.where(queued, utilization, 0.0)), 0.0)
+    saturated = active & ~stable
+    sojourn = np.where(saturated, np.inf, service_time + waiting)
+    queue_length = np.where(saturated, np.inf, queue_length)
+    return {
+        "utilization": utilization,
+        "wait_probability": wait_probability,
+        "queue_length": queue_length,
+        "waiting": waiting,
+        "sojourn": sojourn,
+        "drain": drain,
+        "saturated": saturated,
+        "servers": servers,
+    }
+
+
+def _saturation_scale(model, iterations=25):
+    """
+    Smallest multiple of the offered load at which some node saturates, and
+    the node that saturates first (not merely because a callee did).
+    """
+    def saturated(scale):
+        return _evaluate(model, scale)["saturated"]
+
+    low, high = 0.0, 1.0
+    while not saturated(high).any():
+        low, high = high, high * 2
+        if high > 2 ** 40:
+            return None, None
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        if saturated(middle).any():
+            high = middle
+        else:
+            low = middle
+
+    state = _evaluate(model, high)
+    candidates = np.flatnonzero(state["saturated"])
+    node = int(candidates[np.argmax(state["utilization"][candidates])])
+    # A caller that saturates because it waits on a congested callee isn't
+    # the cause: follow the slowest call while that callee's time is mostly
+    # spent queueing, down to where the queue actually builds up
+    downstream_time = model["blocking"] * np.minimum(state["sojourn"], _UNBOUNDED)
+    congested = state["waiting"] > state["effective"]
+    visited = {node}
+    while downstream_time[node].any():
+        callee = int(np.argmax(downstream_time[node]))
+        if callee in visited or not (congested[callee] or state["saturated"][callee]):
+            break
+        visited.add(callee)
+        node = callee
+    return high, node
+
+
+def _sojourn_percentiles(state, iterations=60):
+    """
+    Percentiles of time in system per node, where it is waiting time (zero
+    with probability 1 - C, else exponential) plus an exponential service time.
+    Inverted by bisection on the closed-form tail, for all nodes at once.
+    """
+    n = len(state["sojourn"])
+    sojourn = state["sojourn"]
+    effective = state["effective"]
+    result = np.zeros((n, len(PERCENTILES)))
+    queued = np.isfinite(sojourn) & (effective > 0)
+    if not queued.any():
+        result[~np.isfinite(sojourn)] = np.inf
+        return result
+
+    mu = 1 / effective[queued]
+    theta = np.maximum(state["drain"][queued], 1e-12)
+    wait = state["wait_probability"][queued]
+
+    def tail(t):
+        close = np.abs(theta - mu) < 1e-9 * mu
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            mixed = np.where(close, (1 + mu * t) * np.exp(-mu * t),
+                             (theta * np.exp(-mu * t) - mu * np.exp(-theta * t)) / np.where(close, 1.0, theta - mu))
+        return (1 - wait) * np.exp(-mu * t) + wait * mixed
+
+    for column, pct in enumerate(PERCENTILES):
+        target = 1 - pct / 100
+        low = np.zeros_like(mu)
+        high = 2 * np.log(2 / target) * np.maximum(1 / mu, 1 / theta)
+        for _ in range(iterations):
+            middle = (low + high) / 2
+            above = tail(middle) > target
+            low = np.where(above, middle, low)
+            high = np.where(above, high, middle)
+        result[queued, column] = high
+    result[~np.isfinite(sojourn)] = np.inf
+    return result
+
+
+def _report(model, state, percentiles, saturation):
+    scale, bottleneck = saturation
+    nodes = model["nodes"]
+    total_offered = float(model["offered"].sum())
+
+    report_nodes = []
+    for i, node in enumerate(nodes):
+        if model["is_client"][i]:
+            continue
+        report_nodes.append({
+            "id": node.id,
+            "label": node.data.get('label', node.id),
+            "type": node.data.get('type', 'unknown'),
+            "arrival_rps": round(float(state["arrivals"][i]), 3),
+            "servers": int(state["servers"][i]),
+            "service_time_ms": _ms(model["service_time"][i]),
+            "effective_service_time_ms": None if state["blocked"][i] else _ms(state["effective"][i]),
+            "utilization": None if state["blocked"][i] else _finite(state["utilization"][i]),
+            "queue_length": _finite(state["queue_length"][i]),
+            "latency_ms": {
+                "mean": _ms(state["sojourn"][i]),
+                **{f"p{pct}": _ms(percentiles[i, column]) for column, pct in enumerate(PERCENTILES)},
+            },
+            "saturated": bool(state["saturated"][i]),
+        })
+
+    clients = {}
+    for i in np.flatnonzero(model["offered"] > 0):
+        # A client's time in system covers every call it waits on downstream
+        latency = state["sojourn"][i]
+        clients[nodes[i].id] = {
+            "label": nodes[i].data.get('label', nodes[i].id),
+            "offered_rps": round(float(model["offered"][i]), 3),
+            "latency_ms": {"mean": _ms(latency if latency < _UNBOUNDED else np.inf)},
+        }
+
+    summary = {
+        "offered_rps": round(total_offered, 3),
+        "saturated": bool(state["saturated"].any()),
+        "bottleneck": None,
+        "headroom": None,
+        "max_offered_rps": None,
+    }
+    if bottleneck is not None:
+        node = nodes[bottleneck]
+        summary.update({
+            "bottleneck": {
+                "id": node.id,
+                "label": node.data.get('label', node.id),
+                "type": node.data.get('type', 'unknown'),
+                "utilization": None if state["blocked"][bottleneck] else _finite(state["utilization"][bottleneck]),
+            },
+            # How far the offered load can be scaled before the bottleneck saturates
+            "headroom": round(scale, 4),
+            "max_offered_rps": round(scale * total_offered, 3),
+        })
+    return {"summary": summary, "nodes": report_nodes, "clients": clients}
+
+
+def _number(value, default, minimum):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if np.isfinite(number) and number >= minimum else default
+
+
+def _ms(seconds):
+    return round(float(seconds) * 1000, 3) if np.isfinite(seconds) else None
+
+
+def _finite(value):
+    return round(float(value), 4) if np.isfinite(value) else None
@@ -0,0 +1,128 @@
+import json
+from typing import Iterable, Iterator, Tuple
+from pydantic import ValidationError
+from app.models import Diagram, Node, Edge
+
+ELEMENT_MODELS = {"nodes": ("node", Node), "edges": ("edge", Edge)}
+
+
+class DiagramStreamParser:
+    """
+    Incremental parser for a Diagram JSON document arriving in arbitrary chunks.
+
+    feed() scans only the new text and returns the elements of the top-level
+    "nodes" and "edges" arrays that completed in it, as ("node", Node) /
+    ("edge", Edge) events, plus ("project_name", str). Elements that fail
+    validation come out as ("error", message) without stopping the stream.
+    Text before the element being parsed is dropped, so memory stays at one
+    element regardless of document size.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._element_start = None
+        self._array_key = None
+        self._last_key = None
+        self._expect_key = False
+        self._after_colon = False
+
+    def feed(self, text: str):
+        self._buf += text
+        events = []
+        buf = self._buf
+        i = self._pos
+        n = len(buf)
+        while i < n:
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._top_level_string(json.loads(buf[self._string_start:i + 1]), events)
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                depth = len(self._stack)
+                if depth == 1 and ch == "[":
+                    self._array_key = self._last_key if self._after_colon else None
+                elif depth == 2 and ch == "{" and self._array_key in ELEMENT_MODELS:
+                    self._element_start = i
+                self._stack.append(ch)
+                self._after_colon = False
+                if len(self._stack) == 1:
+                    self._expect_key = True
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                depth = len(self._stack)
+                if depth == 2 and ch == "}" and self._element_start is not None:
+                    events.append(self._element(buf[self._element_start:i + 1]))
+                    self._element_start = None
+                elif depth == 1 and ch == "]":
+                    self._array_key = None
+            elif len(self._stack) == 1:
+                if ch == ":":
+                    self._after_colon = True
+                    self._expect_key = False
+                elif ch == ",":
+                    self._after_colon = False
+                    self._expect_key = True
+            i += 1
+
+        # Keep only the unfinished element or string (if any)
+        keep_from = self._element_start if self._element_start is not None else (
+            self._string_start if self._in_string else i)
+        self._buf = buf[keep_from:]
+        self._pos = i - keep_from
+        if self._element_start is not None:
+            self._element_start = 0
+        if self._in_string:
+            self._string_start -= keep_from
+        return events
+
+    def _top_level_string(self, value, events):
+        if self._expect_key:
+            self._last_key = value
+        elif self._after_colon and self._last_key == "project_name":
+            events.append(("project_name", value))
+
+    def _element(self, text):
+        kind, model = ELEMENT_MODELS[self._array_key]
+        try:
+            return kind, model(**json.loads(text))
+        except (ValueError, TypeError, ValidationError) as e:
+            return "error", f"Invalid {kind}: {e}"
+
+
+def parse_diagram_stream(chunks: Iterable[str]) -> Iterator[Tuple[str, object]]:
+    """
+    Replays a sequence of text chunks (e.g. recorded LLM deltas) through the parser.
+    """
+    parser = DiagramStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+
+
+def iter_diagram_events(diagram: Diagram) -> Iterator[Tuple[str, object]]:
+    """
+    Same events for a Diagram that is already complete.
+    """
+    yield "project_name", diagram.project_name
+    for node in diagram.nodes:
+        yield "node", node
+    for edge in diagram.edges:
+        yield "edge", edge
+
+
+def format_sse(event: str, payload) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
@@ -0,0 +1,233 @@
+import re
+from app.services.node_settings import int_setting
+
+# Settings read from the API Gateway node's data. Anything missing or invalid
+# falls back to these production defaults.
+GATEWAY_DEFAULTS = {
+    "worker_processes": "auto",
+    "worker_connections": 4096,
+    "keepalive_timeout": 65,
+    "keepalive_requests": 1000,
+    "client_max_body_size": "10m",
+    "gzip": True,
+    "gzip_comp_level": 5,
+    "gzip_min_length": 1024,
+}
+
+# Settings read from a service node's data; the data of edges between the
+# gateway and that service override them for its route.
+ROUTE_DEFAULTS = {
+    "replicas": 1,
+    "lb_method": "least_conn",
+    "keepalive": 32,          # idle upstream connections kept open per worker, 0 disables
+    "max_fails": 3,
+    "fail_timeout": "10s",
+    "connect_timeout": "5s",
+    "read_timeout": "60s",
+    "rate_limit": None,       # requests per second per client IP, or e.g. "600r/m"
+    "rate_limit_burst": None, # defaults to the per-second rate
+    "cache_ttl": None,        # e.g. "30s"; enables a proxy cache zone for the route
+    "cache_size": "100m",
+}
+
+LB_METHODS = {"round_robin", "least_conn", "ip_hash", "random"}
+
+GZIP_TYPES = "text/plain text/css application/json application/javascript text/xml application/xml"
+
+_DURATION = re.compile(r"^\d+(ms|s|m|h|d)?$")
+_SIZE = re.compile(r"^\d+[kmg]?$", re.IGNORECASE)
+_RATE = re.compile(r"^(\d+)r/([sm])$")
+
+
+def gateway_settings(data):
+    """
+    Gateway-wide nginx settings from a gateway node's data (or None).
+    """
+    data = data or {}
+    return {
+        "worker_processes": _worker_processes(data.get("worker_processes")),
+        "worker_connections": int_setting(data.get("worker_connections"), GATEWAY_DEFAULTS["worker_connections"], 64),
+        "keepalive_timeout": int_setting(data.get("keepalive_timeout"), GATEWAY_DEFAULTS["keepalive_timeout"], 0),
+        "keepalive_requests": int_setting(data.get("keepalive_requests"), GATEWAY_DEFAULTS["keepalive_requests"], 1),
+        "client_max_body_size": _match(data.get("client_max_body_size"), _SIZE, GATEWAY_DEFAULTS["client_max_body_size"]),
+        "gzip": _bool(data.get("gzip"), GATEWAY_DEFAULTS["gzip"]),
+        "gzip_comp_level": min(9, int_setting(data.get("gzip_comp_level"), GATEWAY_DEFAULTS["gzip_comp_level"], 1)),
+        "gzip_min_length": int_setting(data.get("gzip_min_length"), GATEWAY_DEFAULTS["gzip_min_length"], 0),
+    }
+
+
+def route_settings(*sources):
+    """
+    Per-route settings merged from the given data dicts, later ones winning.
+    """
+    data = {}
+    for source in sources:
+        data.update({key: value for key, value in (source or {}).items() if value is not None})
+
+    lb_method = str(data.get("lb_method", ROUTE_DEFAULTS["lb_method"])).lower()
+    settings = {
+        "replicas": int_setting(data.get("replicas"), ROUTE_DEFAULTS["replicas"], 1),
+        "lb_method": lb_method if lb_method in LB_METHODS else ROUTE_DEFAULTS["lb_method"],
+        "keepalive": int_setting(data.get("keepalive"), ROUTE_DEFAULTS["keepalive"], 0),
+        "max_fails": int_setting(data.get("max_fails"), ROUTE_DEFAULTS["max_fails"], 0),
+        "fail_timeout": _duration(data.get("fail_timeout"), ROUTE_DEFAULTS["fail_timeout"]),
+        "connect_timeout": _duration(data.get("connect_timeout"), ROUTE_DEFAULTS["connect_timeout"]),
+        "read_timeout": _duration(data.get("read_timeout"), ROUTE_DEFAULTS["read_timeout"]),
+        "rate_limit": _rate(data.get("rate_limit")),
+        "rate_limit_burst": None,
+        "cache_ttl": _duration(data.get("cache_ttl"), None),
+        "cache_size": _match(data.get("cache_size"), _SIZE, ROUTE_DEFAULTS["cache_size"]),
+    }
+    if settings["rate_limit"]:
+        amount, unit = _RATE.match(settings["rate_limit"]).groups()
+        per_second = int(amount) if unit == "s" else max(1, int(amount) // 60)
+        settings["rate_limit_burst"] = int_setting(data.get("rate_limit_burst"), per_second, 0)
+    return settings
+
+
+def upstream_name(label):
+    return f"{label}_upstream"
+
+
+def location_path(label):
+    return f"/{label}/"
+
+
+def render_upstream(label, settings):
+    lines = [f"    upstream {upstream_name(label)} {{"]
+    if settings["lb_method"] != "round_robin":
+        lines.append(f"        {settings['lb_method']};")
+    # Docker's DNS returns every replica, so one server line covers them all
+    lines.append(f"        server {label}:8000 max_fails={settings['max_fails']} fail_timeout={settings['fail_timeout']};")
+    if settings["keepalive"]:
+        lines.append(f"        keepalive {settings['keepalive']};")
+    lines.append("    }")
+    return "\n".join(lines)
+
+
+def render_route_zones(label, settings):
+    """
+    http-level directives a route needs: its rate limit and cache zones.
+    """
+    lines = []
+    if settings["rate_limit"]:
+        lines.append(f"    limit_req_zone $binary_remote_addr zone={label}_limit:10m rate={settings['rate_limit']};")
+    if settings["cache_ttl"]:
+        lines.append(
+            f"    proxy_cache_path /var/cache/nginx/{label} levels=1:2 keys_zone={label}_cache:10m "
+            f"max_size={settings['cache_size']} inactive=10m use_temp_path=off;"
+        )
+    return "\n".join(lines)
+
+
+def render_location(label, settings):
+    lines = [
+        f"        location {location_path(label)} {{",
+        f"            proxy_pass http://{upstream_name(label)}/;",
+        f"            proxy_connect_timeout {settings['connect_timeout']};",
+        f"            proxy_read_timeout {settings['read_timeout']};",
+        "            proxy_next_upstream error timeout http_502 http_503;",
+    ]
+    if settings["rate_limit"]:
+        lines.append(f"            limit_req zone={label}_limit burst={settings['rate_limit_burst']} nodelay;")
+    if settings["cache_ttl"]:
+        lines.extend([
+            f"            proxy_cache {label}_cache;",
+            f"            proxy_cache_valid 200 301 302 {settings['cache_ttl']};",
+            "            proxy_cache_use_stale error timeout updating http_500 http_502 http_503;",
+            "            proxy_cache_lock on;",
+            "            add_header X-Cache-Status $upstream_cache_status;",
+        ])
+    lines.append("        }")
+    return "\n".join(lines)
+
+
+def render_nginx_conf(upstreams, locations, settings=None, zones=()):
+    settings = settings or gateway_settings(None)
+    lines = [
+        f"worker_processes {settings['worker_processes']};",
+        f"worker_rlimit_nofile {settings['worker_connections'] * 2};",
+        "events {",
+        f"    worker_connections {settings['worker_connections']};",
+        "    multi_accept on;",
+        "}",
+        "http {",
+        "    sendfile on;",
+        "    tcp_nopush on;",
+        "    tcp_nodelay on;",
+        f"    keepalive_timeout {settings['keepalive_timeout']};",
+        f"    keepalive_requests {settings['keepalive_requests']};",
+        f"    client_max_body_size {settings['client_max_body_size']};",
+        "",
+        "    proxy_http_version 1.1;",
+        '    proxy_set_header Connection "";',
+        "    proxy_set_header Host $host;",
+        "    proxy_set_header X-Real-IP $remote_addr;",
+        "    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;",
+        "    proxy_set_header X-Forwarded-Proto $scheme;",
+        "    proxy_buffering on;",
+        "    proxy_buffer_size 16k;",
+        "    proxy_buffers 16 16k;",
+        "    limit_req_status 429;",
+    ]
+    if settings["gzip"]:
+        lines.extend([
+            "",
+            "    gzip on;",
+            "    gzip_proxied any;",
+            "    gzip_vary on;",
+            f"    gzip_comp_level {settings['gzip_comp_level']};",
+            f"    gzip_min_length {settings['gzip_min_length']};",
+            f"    gzip_types {GZIP_TYPES};",
+        ])
+    lines.append("")
+    lines.extend(zone for zone in zones if zone)
+    lines.extend(upstreams)
+    lines.extend([
+        "",
+        "    server {",
+        "        listen 80 backlog=4096;",
+    ])
+    lines.extend(locations)
+    lines.extend(["    }", "}"])
+    return "\n".join(lines) + "\n"
+
+
+def _bool(value, default):
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() not in ("0", "false", "off", "no", "")
+    return bool(value)
+
+
+def _match(value, pattern, default):
+    if value is None:
+        return default
+    value = str(value).strip()
+    return value if pattern.match(value) else default
+
+
+def _duration(value, default):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"{int(value)}s" if value >= 1 else default
+    value = _match(value, _DURATION, default)
+    return value if value is None or int(re.match(r"\d+", value).group()) > 0 else default
+
+
+def _rate(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return f"{int(value)}r/s" if value >= 1 else None
+    value = str(value).strip().lower()
+    if value.isdigit():
+        return f"{value}r/s" if int(value) >= 1 else None
+    match = _RATE.match(value)
+    return value if match and int(match.group(1)) >= 1 else None
+
+
+def _worker_processes(value):
+    if value is None or str(value).strip().lower() == "auto":
+        return GATEWAY_DEFAULTS["worker_processes"]
+    return int_setting(value, GATEWAY_DEFAULTS["worker_processes"], 1)
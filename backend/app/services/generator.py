@@ -1,199 +1,354 @@
 import os
-import shutil
+import json
+import hashlib
+from types import MappingProxyType
+from typing import Iterable, Mapping, NamedTuple, Optional
 from app.models import Diagram
+from app.graph import build_graph
+from app.services.writers import DiskWriter
+from app.services.gateway import gateway_settings, route_settings, render_upstream, render_location, render_route_zones, render_nginx_conf
+from app.services.loadtest import loadtest_route, plan_loadtest
+from app.services.scaffold import datastore_engine, datastore_service, connection_env, pool_env, plan_microservice, service_healthcheck
+from app.services.instrumentation import span, count
 
-def generate_project(diagram: Diagram):
-    project_name = diagram.project_name or "generated_project"
-    base_path = os.path.join(os.getcwd(), project_name)
-    
-    if os.path.exists(base_path):
-        shutil.rmtree(base_path)
-    os.makedirs(base_path)
+MANIFEST_FILE = ".autoarch_manifest.json"
+DEFAULT_PROJECT_NAME = "generated_project"
+# Bump whenever the emitted templates change so incremental runs rewrite everything
+MANIFEST_VERSION = 5
 
+class PlanEntry(NamedTuple):
+    path: str                 # relative to the project root, '/'-separated
+    content: bytes
+    component: Optional[str]  # component directory, None for shared files
+
+class ProjectPlan(NamedTuple):
+    """
+    Everything generate_project writes for a diagram, computed without any I/O.
+    `components` maps each component directory to the digest of its inputs,
+    `services` is the docker-compose service map docker-compose.yml renders.
+    `entries` renders the files as it is iterated, one component at a time.
+    """
+    project_name: str
+    entries: Iterable[PlanEntry]
+    components: Mapping[str, str]
+    services: Mapping[str, dict]
+
+class PlanEntries:
+    """
+    Re-iterable, lazily rendered plan entries: each component's files are
+    rendered when iteration reaches it and dropped once its entries have been
+    consumed. The shared files (gateway, load test, compose) come last.
+    """
+
+    def __init__(self, renderers, shared):
+        self._renderers = renderers  # {label: [(render, args), ...]}
+        self._shared = shared
+
+    def __iter__(self):
+        for label, calls in self._renderers.items():
+            files = {}
+            for render, args in calls:
+                files.update(render(*args))
+            for rel_path, content in files.items():
+                yield PlanEntry(f"{label}/{rel_path}", content.encode(), label)
+        yield from self._shared
+
+def generate_project(diagram: Diagram, incremental: bool = False, writer=None, progress=None):
+    """
+    Writes the project for a diagram under <cwd>/<project_name>.
+
+    Generation runs in two phases: plan_project() works out every file without
+    any I/O, then the writer flushes the plan in bulk. Archive writers receive
+    the entries as they are rendered, so an archive never holds the whole
+    project in memory, and contain no manifest.
+
+    With incremental=True the existing tree is kept: each component's inputs are
+    hashed and compared against the manifest from the previous run, and only the
+    component directories and shared files whose hash changed are rewritten.
+
+    `writer` defaults to the filesystem; pass an ArchiveWriter to produce the
+    project as an archive rooted at <project_name>/ without touching the disk.
+
+    `progress(done, total)` is called as files are flushed; it may raise to
+    abort generation (the job queue uses this for cancellation).
+    """
+    writer = writer or DiskWriter()
+    plan = plan_project(diagram)
+    if not writer.on_disk:
+        # Archives are always built from scratch and carry no manifest; the
+        # entries go to the writer as they are rendered
+        base_path = plan.project_name
+        writer.makedirs(base_path)
+        with span("flush"):
+            writer.flush(base_path, plan.entries, progress)
+        return {"message": "Code generated successfully", "path": base_path}
+
+    base_path = os.path.join(os.getcwd(), plan.project_name)
+    previous = _load_manifest(base_path) if incremental else None
+    if previous is None:
+        writer.remove(base_path)
+        writer.makedirs(base_path)
+    old_components = previous['components'] if previous else {}
+    old_files = previous['files'] if previous else {}
+
+    manifest = {'version': MANIFEST_VERSION, 'components': dict(plan.components), 'files': {}}
+    changed_components = {}
+    changed_files = []
+    pending = []
+    for entry in plan.entries:
+        if entry.component is None:
+            digest = _digest_bytes(entry.content)
+            manifest['files'][entry.path] = digest
+            if old_files.get(entry.path) == digest and writer.exists(os.path.join(base_path, entry.path)):
+                continue
+            changed_files.append(entry.path)
+        elif entry.component not in changed_components:
+            unchanged = old_components.get(entry.component) == plan.components[entry.component] \
+                and writer.exists(os.path.join(base_path, entry.component))
+            changed_components[entry.component] = not unchanged
+        if entry.component is None or changed_components[entry.component]:
+            pending.append(entry)
+
+    rebuilt = [label for label, is_changed in changed_components.items() if is_changed]
+    changed = rebuilt + changed_files
+
+    # Rebuilt components start from an empty directory so files they no longer
+    # emit disappear; components that left the diagram are dropped entirely
+    if previous is not None:
+        stale = (old_components.keys() - plan.components.keys()).union(rebuilt)
+        for label in stale:
+            writer.remove(os.path.join(base_path, label))
+        for rel_path in old_files.keys() - manifest['files'].keys():
+            writer.remove(os.path.join(base_path, rel_path))
+
+    with span("flush"):
+        writer.flush(base_path, pending, progress)
+
+    writer.write(os.path.join(base_path, MANIFEST_FILE), json.dumps(manifest, indent=2, sort_keys=True))
+
+    result = {"message": "Code generated successfully", "path": base_path}
+    if incremental:
+        result["changed"] = changed
+        result["unchanged"] = len(manifest['components']) + len(manifest['files']) - len(changed)
+    return result
+
+def plan_project(diagram: Diagram) -> ProjectPlan:
+    """
+    Plans every file of the project for a diagram without touching the disk.
+    Component files are rendered when the plan's entries are iterated.
+    """
+    project_name = output_name(diagram)
     docker_compose_services = {}
     nginx_upstreams = []
     nginx_locations = []
+    nginx_zones = []
+    loadtest_routes = []
+    # label -> [(render function, args)] for that directory, and the inputs hashed for it:
+    # only what its files and fragments are rendered from, so moving a node or
+    # restyling it doesn't rebuild anything
+    components = {}
+    component_inputs = {}
+    nginx_fragments = {}
+
+    count("nodes", len(diagram.nodes))
+    count("edges", len(diagram.edges))
+
+    # Index the diagram once so per-node lookups don't rescan every edge
+    with span("index"):
+        graph = build_graph(diagram)
+    gateways = graph.nodes_of_type("API Gateway")
+    gateway_ids = {gateway.id for gateway in gateways}
+
+    def add_component(label, render, *args):
+        components.setdefault(label, []).append((render, args))
+        component_inputs.setdefault(label, []).append({
+            'render': render.__name__,
+            'args': args,
+            'compose': docker_compose_services.get(label),
+            'nginx': nginx_fragments.get(label),
+        })
+
+    with span("plan"):
+        for node in diagram.nodes:
+            label = _label(node)
+            node_type = node.data.get('type', 'unknown')
 
-    # First pass: Identify nodes and build basic service map
-    nodes_map = {node.id: node for node in diagram.nodes}
-    
-    # Helper to find connected databases for a service
-    def get_connected_dbs(service_node_id):
-        dbs = []
-        for edge in diagram.edges:
-            if edge.source == service_node_id:
-                target_node = nodes_map.get(edge.target)
-                if target_node and target_node.data.get('type') == 'Database':
-                    dbs.append(target_node)
-            elif edge.target == service_node_id:
-                source_node = nodes_map.get(edge.source)
-                if source_node and source_node.data.get('type') == 'Database':
-                    dbs.append(source_node)
-        return dbs
-
-    for node in diagram.nodes:
-        label = node.data.get('label', 'unknown').lower().replace(" ", "_").replace(".", "")
-        node_type = node.data.get('type', 'unknown')
-        component_path = os.path.join(base_path, label)
-        
-        if node_type == "Mobile App":
-            generate_mobile_app(component_path, label)
-            # Mobile apps usually don't go into docker-compose for backend orchestration, 
-            # but we can add them if we want to serve web-builds.
-        
-        elif node_type == "Web App":
-            generate_web_app(component_path, label)
-            docker_compose_services[label] = {
-                'build': f'./{label}',
-                'ports': ['3000:3000']
-            }
-
-        elif node_type == "Microservice" or node_type == "Service":
-            connected_dbs = get_connected_dbs(node.id)
-            env_vars = {}
-            for db in connected_dbs:
-                db_label = db.data.get('label', 'db').lower().replace(" ", "_")
-                env_vars['DATABASE_URL'] = f"postgresql://user:password@{db_label}:5432/db"
-            
-            generate_microservice(component_path, label, env_vars)
-            
-            service_config = {
-                'build': f'./{label}',
-                'environment': [f"{k}={v}" for k, v in env_vars.items()]
-            }
-            docker_compose_services[label] = service_config
-            
-            # Add to Nginx config
-            nginx_upstreams.append(f"upstream {label}_upstream {{ server {label}:8000; }}")
-            nginx_locations.append(f"    location /{label}/ {{\n        proxy_pass http://{label}_upstream/;\n    }}")
-
-        elif node_type == "Database":
-            docker_compose_services[label] = {
-                'image': 'postgres:13',
-                'environment': [
-                    'POSTGRES_USER=user',
-                    'POSTGRES_PASSWORD=password',
-                    'POSTGRES_DB=db'
-                ],
-                'volumes': [f'{label}_data:/var/lib/postgresql/data']
-            }
-
-        elif node_type == "API Gateway" or "gateway" in label:
-            # We'll generate the gateway config at the end
-            pass
+            if node_type == "Mobile App":
+                add_component(label, plan_mobile_app, label)
+                # Mobile apps usually don't go into docker-compose for backend orchestration,
+                # but we can add them if we want to serve web-builds.
+
+            elif node_type == "Web App":
+                docker_compose_services[label] = {
+                    'build': f'./{label}',
+                    'ports': ['3000:3000']
+                }
+                add_component(label, plan_web_app, label)
+
+            elif node_type == "Microservice" or node_type == "Service":
+                # Each connected datastore gets its own variable instead of sharing DATABASE_URL;
+                # named exactly like the datastore's own compose service below
+                datastores = [(_label(db), datastore_engine(db.data)) for db in graph.neighbors(node.id, 'Database')]
+                env_vars, databases, caches = connection_env(datastores)
+                env_vars.update(pool_env(node.data, databases, caches))
+
+                # Performance settings come from the node, overridden by its gateway edges
+                gateway_edges = [
+                    edge.data for edge in graph.incident.get(node.id, [])
+                    if (edge.target if edge.source == node.id else edge.source) in gateway_ids
+                ]
+                route = route_settings(node.data, *gateway_edges)
+
+                service_config = {'build': f'./{label}'}
+                if env_vars:
+                    service_config['environment'] = [f"{k}={v}" for k, v in env_vars.items()]
+                if datastores:
+                    service_config['depends_on'] = {name: {'condition': 'service_healthy'} for name, _ in datastores}
+                service_config['healthcheck'] = service_healthcheck()
+                if route['replicas'] > 1:
+                    service_config['deploy'] = {'replicas': route['replicas']}
+                docker_compose_services[label] = service_config
+
+                # Add to Nginx config
+                upstream = render_upstream(label, route)
+                location = render_location(label, route)
+                zone = render_route_zones(label, route)
+                nginx_upstreams.append(upstream)
+                nginx_locations.append(location)
+                nginx_zones.append(zone)
+                nginx_fragments[label] = [upstream, location, zone]
+                loadtest_routes.append(loadtest_route(label, node.data))
+
+                add_component(label, plan_microservice, label, datastores)
+
+            elif node_type == "Database":
+                docker_compose_services[label] = datastore_service(label, datastore_engine(node.data))
+
+            elif node_type == "API Gateway" or "gateway" in label:
+                # We'll generate the gateway config at the end
+                pass
+
+        digests = {label: _digest(inputs) for label, inputs in component_inputs.items()}
+        entries = []
 
     # Generate API Gateway if needed (or if we have microservices)
     if nginx_upstreams:
-        gateway_path = os.path.join(base_path, "api_gateway")
-        os.makedirs(gateway_path, exist_ok=True)
-        
-        nginx_conf = "events {}\nhttp {\n" + "\n".join(nginx_upstreams) + "\n    server {\n        listen 80;\n" + "\n".join(nginx_locations) + "\n    }\n}"
-        
-        with open(os.path.join(gateway_path, "nginx.conf"), "w") as f:
-            f.write(nginx_conf)
-            
-        with open(os.path.join(gateway_path, "Dockerfile"), "w") as f:
-            f.write("FROM nginx:alpine\nCOPY nginx.conf /etc/nginx/nginx.conf")
-            
+        with span("render_gateway"):
+            settings = gateway_settings(gateways[0].data if gateways else None)
+            nginx_conf = render_nginx_conf(nginx_upstreams, nginx_locations, settings, nginx_zones)
+        entries.append(PlanEntry("api_gateway/nginx.conf", nginx_conf.encode(), None))
+        entries.append(PlanEntry("api_gateway/Dockerfile", b"FROM nginx:alpine\nCOPY nginx.conf /etc/nginx/nginx.conf", None))
+
+        # Load-test harness aimed at the same routes the gateway exposes
+        for rel_path, content in plan_loadtest(loadtest_routes, gateways[0].data if gateways else None).items():
+            entries.append(PlanEntry(rel_path, content, None))
+
         docker_compose_services['api_gateway'] = {
             'build': './api_gateway',
             'ports': ['80:80'],
+            'ulimits': {'nofile': {'soft': settings['worker_connections'] * 2, 'hard': settings['worker_connections'] * 2}},
             'depends_on': [s for s in docker_compose_services.keys() if s != 'api_gateway']
         }
 
     # Generate docker-compose.yml
-    generate_docker_compose(base_path, docker_compose_services)
+    with span("render_compose"):
+        compose = render_docker_compose(docker_compose_services)
+    entries.append(PlanEntry("docker-compose.yml", compose.encode(), None))
 
-    return {"message": "Code generated successfully", "path": base_path}
+    return ProjectPlan(project_name, PlanEntries(components, tuple(entries)), MappingProxyType(digests),
+                       MappingProxyType(docker_compose_services))
 
-def generate_mobile_app(path, label):
-    os.makedirs(path, exist_ok=True)
+def output_name(diagram: Diagram) -> str:
+    """
+    Name of the directory (or archive root) generate_project writes a diagram to.
+    """
+    return diagram.project_name or DEFAULT_PROJECT_NAME
+
+def _label(node, default='unknown'):
+    return node.data.get('label', default).lower().replace(" ", "_").replace(".", "")
+
+def _digest(value):
+    return _digest_bytes(json.dumps(value, sort_keys=True, default=str).encode())
+
+def _digest_bytes(payload):
+    return hashlib.sha256(payload).hexdigest()
+
+def _load_manifest(base_path):
+    """
+    Returns the previous run's manifest, or None when the tree has to be rebuilt.
+    """
+    try:
+        with open(os.path.join(base_path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return None
+    manifest.setdefault('components', {})
+    manifest.setdefault('files', {})
+    return manifest
+
+def plan_mobile_app(label):
     # ... (Keep existing mobile generation logic or simplify)
-    with open(os.path.join(path, "App.js"), "w") as f:
-        f.write(f"// Mobile App: {label}\nimport React from 'react';\nimport {{ Text, View }} from 'react-native';\nexport default function App() {{ return <View><Text>Welcome to {label}</Text></View>; }}")
-    with open(os.path.join(path, "package.json"), "w") as f:
-        f.write(f'{{"name": "{label}", "version": "1.0.0", "dependencies": {{"react": "18.2.0", "react-native": "0.71.8"}} }}')
+    return {
+        "App.js": f"// Mobile App: {label}\nimport React from 'react';\nimport {{ Text, View }} from 'react-native';\nexport default function App() {{ return <View><Text>Welcome to {label}</Text></View>; }}",
+        "package.json": f'{{"name": "{label}", "version": "1.0.0", "dependencies": {{"react": "18.2.0", "react-native": "0.71.8"}} }}',
+    }
 
-def generate_web_app(path, label):
-    os.makedirs(path, exist_ok=True)
+def plan_web_app(label):
     # ... (Keep existing web generation logic or simplify)
-    os.makedirs(os.path.join(path, "src"), exist_ok=True)
-    with open(os.path.join(path, "src", "App.jsx"), "w") as f:
-        f.write(f"// Web App: {label}\nexport default function App() {{ return <h1>Welcome to {label}</h1>; }}")
-    with open(os.path.join(path, "package.json"), "w") as f:
-        f.write(f'{{"name": "{label}", "version": "0.0.0", "scripts": {{"dev": "vite", "build": "vite build"}}, "dependencies": {{"react": "^18.2.0"}} }}')
-    with open(os.path.join(path, "Dockerfile"), "w") as f:
-        f.write("FROM node:18-alpine\nWORKDIR /app\nCOPY . .\nRUN npm install\nCMD [\"npm\", \"run\", \"dev\"]")
-
-def generate_microservice(path, label, env_vars):
-    os.makedirs(path, exist_ok=True)
-    os.makedirs(os.path.join(path, "app"), exist_ok=True)
-    
-    # main.py
-    with open(os.path.join(path, "app", "main.py"), "w") as f:
-        f.write(f"""
-from fastapi import FastAPI
-import os
+    return {
+        "src/App.jsx": f"// Web App: {label}\nexport default function App() {{ return <h1>Welcome to {label}</h1>; }}",
+        "package.json": f'{{"name": "{label}", "version": "0.0.0", "scripts": {{"dev": "vite", "build": "vite build"}}, "dependencies": {{"react": "^18.2.0"}} }}',
+        "Dockerfile": "FROM node:18-alpine\nWORKDIR /app\nCOPY . .\nRUN npm install\nCMD [\"npm\", \"run\", \"dev\"]",
+    }
+
+def generate_docker_compose(base_path, services, writer=None):
+    writer = writer or DiskWriter()
+    writer.write(os.path.join(base_path, "docker-compose.yml"), render_docker_compose(services))
+
+def render_docker_compose(services):
+    lines = ["version: '3.8'", "services:"]
+    # Insertion-ordered and O(1) to dedupe, unlike a list scan per volume
+    volumes = {}
 
-app = FastAPI(title="{label}")
-
-@app.get("/")
-def read_root():
-    return {{"message": "Hello from {label}!"}}
-
-@app.get("/health")
-def health_check():
-    return {{"status": "healthy", "db_url": os.getenv("DATABASE_URL", "Not Configured")}}
-""")
-
-    # requirements.txt
-    with open(os.path.join(path, "requirements.txt"), "w") as f:
-        f.write("fastapi\nuvicorn\nsqlalchemy\npsycopg2-binary\n")
-
-    # Dockerfile
-    with open(os.path.join(path, "Dockerfile"), "w") as f:
-        f.write("""
-FROM python:3.9-slim
-WORKDIR /app
-COPY requirements.txt .
-RUN pip install --no-cache-dir -r requirements.txt
-COPY . .
-CMD ["uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000"]
-""")
-
-def generate_docker_compose(base_path, services):
-    content = "version: '3.8'\nservices:\n"
-    volumes = []
-    
     for name, config in services.items():
-        content += f"  {name}:\n"
+        lines.append(f"  {name}:")
         for key, value in config.items():
-            if key == 'environment':
-                content += "    environment:\n"
-                for env in value:
-                    content += f"      - {env}\n"
+            if isinstance(value, dict):
+                lines.append(f"    {key}:")
+                _render_mapping(lines, value, 6)
+            elif key == 'environment':
+                lines.append("    environment:")
+                lines.extend(f"      - {env}" for env in value)
             elif key == 'ports':
-                content += "    ports:\n"
-                for port in value:
-                    content += f"      - '{port}'\n"
+                lines.append("    ports:")
+                lines.extend(f"      - '{port}'" for port in value)
             elif key == 'depends_on':
-                content += "    depends_on:\n"
-                for dep in value:
-                    content += f"      - {dep}\n"
+                lines.append("    depends_on:")
+                lines.extend(f"      - {dep}" for dep in value)
             elif key == 'volumes':
-                content += "    volumes:\n"
+                lines.append("    volumes:")
                 for vol in value:
-                    content += f"      - {vol}\n"
-                    vol_name = vol.split(':')[0]
-                    if vol_name not in volumes:
-                        volumes.append(vol_name)
+                    lines.append(f"      - {vol}")
+                    volumes[vol.split(':')[0]] = None
             else:
-                content += f"    {key}: {value}\n"
-    
+                lines.append(f"    {key}: {value}")
+
     if volumes:
-        content += "\nvolumes:\n"
-        for vol in volumes:
-            content += f"  {vol}:\n"
+        lines.append("")
+        lines.append("volumes:")
+        lines.extend(f"  {vol}:" for vol in volumes)
+
+    return "\n".join(lines) + "\n"
 
-    with open(os.path.join(base_path, "docker-compose.yml"), "w") as f:
-        f.write(content)
+def _render_mapping(lines, mapping, indent):
+    for key, value in mapping.items():
+        if isinstance(value, dict):
+            lines.append(f"{' ' * indent}{key}:")
+            _render_mapping(lines, value, indent + 2)
+        elif isinstance(value, list):
+            # Flow style, so exec-form healthcheck tests stay on one line
+            lines.append(f"{' ' * indent}{key}: {json.dumps(value)}")
+        else:
+            lines.append(f"{' ' * indent}{key}: {value}")
@@ -0,0 +1,188 @@
+import os
+import time
+import threading
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+# AUTOARCH_INSTRUMENTATION=0 turns every hook below into a no-op
+ENABLED = os.getenv("AUTOARCH_INSTRUMENTATION", "1").lower() not in ("0", "false", "off", "no")
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NOOP = nullcontext()
+
+
+class Trace:
+    """
+    Spans and counts collected while handling one request or one job. It is
+    folded into the global registry once, when the request or job ends.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.counts = {}
+
+    def durations(self):
+        totals = {}
+        for name, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def export(self) -> dict:
+        return {"spans": list(self.spans), "counts": dict(self.counts)}
+
+
+_current_trace = ContextVar("autoarch_trace", default=None)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((self.name, seconds))
+        else:
+            REGISTRY.observe(self.name, seconds)
+
+
+def span(name: str):
+    """
+    Times a phase: `with span("render_compose"): ...`
+    """
+    if not ENABLED:
+        return _NOOP
+    return _Span(name)
+
+
+def count(name: str, value: int = 1):
+    if not ENABLED:
+        return
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.counts[name] = trace.counts.get(name, 0) + value
+    else:
+        REGISTRY.inc(name, value)
+
+
+def start_trace():
+    """
+    Makes a new Trace current; returns it with the token for end_trace().
+    """
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+class Registry:
+    """
+    Process-wide histograms and counters, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (metric, label value) -> [bucket counts..., sum, count]
+        self._counters = {}
+
+    def observe(self, phase: str, seconds: float, metric: str = "autoarch_phase_seconds"):
+        with self._lock:
+            self._observe(metric, phase, seconds)
+
+    def inc(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe_trace(self, exported: dict):
+        with self._lock:
+            for name, seconds in exported["spans"]:
+                self._observe("autoarch_phase_seconds", name, seconds)
+            for name, value in exported["counts"].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        label_names = {"autoarch_phase_seconds": "phase", "autoarch_request_seconds": "route"}
+        for metric in sorted({metric for metric, _ in histograms}):
+            lines.append(f"# TYPE {metric} histogram")
+            label = label_names.get(metric, "name")
+            for (name, value), values in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS, values):
+                    cumulative += bucket
+                    lines.append(f'{metric}_bucket{{{label}="{value}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{label}="{value}",le="+Inf"}} {values[-1]}')
+                lines.append(f'{metric}_sum{{{label}="{value}"}} {values[-2]}')
+                lines.append(f'{metric}_count{{{label}="{value}"}} {values[-1]}')
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE autoarch_{name}_total counter")
+            lines.append(f"autoarch_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def _observe(self, metric, value, seconds):
+        values = self._histograms.get((metric, value))
+        if values is None:
+            values = self._histograms[(metric, value)] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                values[i] += 1
+                break
+        values[-2] += seconds
+        values[-1] += 1
+
+
+REGISTRY = Registry()
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that gives each HTTP request its own Trace, reports the
+    spans recorded before the response starts in a Server-Timing header, and
+    adds the whole trace to the registry when the response is done.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = start_trace()
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in trace.durations().items()]
+                timings.append(f"total;dur={(time.perf_counter() - start) * 1000:.2f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(timings).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_trace(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            REGISTRY.observe_trace(trace.export())
+            REGISTRY.observe(f'{scope["method"]} {route_path}', time.perf_counter() - start,
+                             metric="autoarch_request_seconds")
@@ -0,0 +1,332 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from app.models import Diagram
+from app.services.generator import generate_project, output_name
+from app.services.instrumentation import REGISTRY, start_trace, end_trace
+
+# Configuration, read once when the manager is created
+#   AUTOARCH_JOB_EXECUTOR      "process" (default) or "thread"
+#   AUTOARCH_JOB_WORKERS       pool size, defaults to the CPU count
+#   AUTOARCH_MAX_PENDING_JOBS  queued + running jobs accepted before /generate returns 429
+#   AUTOARCH_JOB_RETENTION     finished jobs kept for status lookups
+DEFAULT_MAX_PENDING_JOBS = 64
+DEFAULT_JOB_RETENTION = 1000
+
+PENDING = "pending"
+RUNNING = "running"
+CANCELLING = "cancelling"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _run_job(shared, job_id: str, diagram: Diagram, incremental: bool):
+    """
+    Pool entry point. `shared` holds the progress and cancellation flags of
+    the manager that submitted the job: a Manager dict for process pools, a
+    plain dict for thread pools. Progress is published at most ~100 times per
+    job so a process pool doesn't pay an IPC round trip for every component.
+    The job's trace is returned with the result so the API process can
+    aggregate it.
+    """
+    cancel_key = ("cancel", job_id)
+    progress_key = ("progress", job_id)
+    shared[("started", job_id)] = time.time()
+    last = [-1]
+
+    def report(done, total):
+        step = max(1, total // 100)
+        if done != total and done - last[0] < step:
+            return
+        last[0] = done
+        if shared.get(cancel_key):
+            raise JobCancelled()
+        shared[progress_key] = (done, total)
+
+    trace, token = start_trace()
+    try:
+        result = generate_project(diagram, incremental=incremental, progress=report)
+    finally:
+        end_trace(token)
+    return result, trace.export()
+
+
+class Job:
+    def __init__(self, job_id: str, diagram: Diagram, incremental: bool, on_finish=None):
+        self.id = job_id
+        # The output directory, which is what jobs are serialized on
+        self.project_name = output_name(diagram)
+        self.diagram = diagram
+        self.incremental = incremental
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.progress = (0, 0)
+        self.timings = {}
+        # Pool future, set once the job is handed to a worker
+        self.future = None
+        # Resolved when the job reaches a finished state; awaitable via asyncio.wrap_future
+        self.done = Future()
+        # Called with the job once it has finished, on the manager's hook thread
+        self.on_finish = on_finish
+
+    def to_dict(self):
+        done, total = self.progress
+        return {
+            "job_id": self.id,
+            "project_name": self.project_name,
+            "status": self.status,
+            "progress": {"done": done, "total": total},
+            "result": self.result,
+            "error": self.error,
+            "timings": self.timings,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Runs generate_project off the event loop in a process or thread pool and
+    tracks each submission as a Job.
+
+    Jobs that target the same project_name write to the same directory, so they
+    are run one after another: a job only reaches the pool once the previous
+    job for its project has finished.
+
+    A job's `on_finish` hook runs on a dedicated thread once the job has
+    finished, never under the manager's lock, so it may block (e.g. on a
+    database write). Hook errors are printed and otherwise ignored.
+    """
+
+    def __init__(self, executor: str = "process", max_workers: int = None,
+                 max_pending: int = DEFAULT_MAX_PENDING_JOBS, retention: int = DEFAULT_JOB_RETENTION):
+        if executor not in ("process", "thread"):
+            raise ValueError(f"Unknown job executor: {executor}")
+        self.executor_kind = executor
+        self.max_pending = max_pending
+        self.retention = retention
+        self._jobs = OrderedDict()
+        self._by_project = {}  # project_name -> deque of unfinished jobs, head is submitted
+        # Re-entrant: a done callback can fire synchronously inside _start
+        self._lock = threading.RLock()
+
+        if executor == "process":
+            self._manager = multiprocessing.Manager()
+            self._shared = self._manager.dict()
+            self._pool = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._manager = None
+            self._shared = {}
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generate-job")
+        self._hooks = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-hooks")
+
+    @classmethod
+    def from_env(cls):
+        workers = os.getenv("AUTOARCH_JOB_WORKERS")
+        return cls(
+            executor=os.getenv("AUTOARCH_JOB_EXECUTOR", "process"),
+            max_workers=int(workers) if workers else None,
+            max_pending=int(os.getenv("AUTOARCH_MAX_PENDING_JOBS", DEFAULT_MAX_PENDING_JOBS)),
+            retention=int(os.getenv("AUTOARCH_JOB_RETENTION", DEFAULT_JOB_RETENTION)),
+        )
+
+    def submit(self, diagram: Diagram, incremental: bool = False, on_finish=None) -> Job:
+        return self.submit_batch([diagram], incremental, on_finish)[0]
+
+    def submit_batch(self, diagrams, incremental: bool = False, on_finish=None):
+        """
+        Queues every diagram as its own job, or none of them if the batch
+        doesn't fit under max_pending.
+        """
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job.status not in FINISHED_STATES)
+            if active + len(diagrams) > self.max_pending:
+                raise JobQueueFull(f"Too many pending jobs ({active}), try again later")
+            jobs = []
+            for diagram in diagrams:
+                job = Job(uuid.uuid4().hex, diagram, incremental, on_finish)
+                self._jobs[job.id] = job
+                queue = self._by_project.setdefault(job.project_name, deque())
+                queue.append(job)
+                if len(queue) == 1:
+                    self._start(job)
+                jobs.append(job)
+            self._evict()
+            return jobs
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def describe(self, job: Job) -> dict:
+        """
+        Job as a dict, with status and progress refreshed from the workers.
+        """
+        with self._lock:
+            if job.status not in FINISHED_STATES:
+                if job.status == PENDING and ("started", job.id) in self._shared:
+                    job.status = RUNNING
+                job.progress = self._shared.get(("progress", job.id), job.progress)
+            return job.to_dict()
+
+    def cancel(self, job_id: str):
+        # Checked and changed under one lock so concurrent cancels of the same
+        # job can't both act on it
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return job
+            if job.future is None:
+                # Still waiting behind another job for the same project
+                self._by_project[job.project_name].remove(job)
+                self._mark_finished(job, CANCELLED)
+            elif not job.future.cancel():
+                # Already running: the worker stops at its next progress report.
+                # (A job that never started is marked cancelled by its done
+                # callback, which runs inside future.cancel().)
+                self._shared[("cancel", job.id)] = True
+                job.status = CANCELLING
+            return job
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        # Let the hooks of jobs finished so far (and just cancelled) complete
+        self._hooks.shutdown(wait=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+    def _start(self, job: Job):
+        try:
+            job.future = self._pool.submit(_run_job, self._shared, job.id, job.diagram, job.incremental)
+        except RuntimeError as e:
+            # Pool already shut down
+            job.error = str(e)
+            self._mark_finished(job, FAILED)
+            return
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+
+    def _finish(self, job: Job, future):
+        with self._lock:
+            if future.cancelled():
+                self._mark_finished(job, CANCELLED)
+            else:
+                error = future.exception()
+                if error is None:
+                    job.result, trace = future.result()
+                    REGISTRY.observe_trace(trace)
+                    spans_ms = {}
+                    for name, seconds in trace["spans"]:
+                        spans_ms[name] = round(spans_ms.get(name, 0) + seconds * 1000, 3)
+                    job.timings = {"spans_ms": spans_ms, "counts": trace["counts"]}
+                    job.progress = self._shared.get(("progress", job.id), job.progress)
+                    self._mark_finished(job, COMPLETED)
+                elif isinstance(error, JobCancelled):
+                    self._mark_finished(job, CANCELLED)
+                else:
+                    job.error = str(error)
+                    self._mark_finished(job, FAILED)
+            try:
+                for key in ("cancel", "progress", "started"):
+                    self._shared.pop((key, job.id), None)
+            except (OSError, EOFError):
+                # Manager already gone during shutdown
+                pass
+
+            queue = self._by_project.get(job.project_name)
+            if queue and queue[0] is job:
+                queue.popleft()
+                if queue:
+                    self._start(queue[0])
+                else:
+                    del self._by_project[job.project_name]
+
+    def _mark_finished(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = time.time()
+        # The diagram isn't needed anymore; don't keep it alive for retention
+        job.diagram = None
+        if not job.done.done():
+            job.done.set_result(job)
+        if job.on_finish is not None:
+            try:
+                self._hooks.submit(self._run_hook, job)
+            except RuntimeError:
+                print(f"Job {job.id} finished after shutdown; its on_finish hook was skipped")
+
+    @staticmethod
+    def _run_hook(job: Job):
+        try:
+            job.on_finish(job)
+        except Exception as e:
+            print(f"on_finish hook for job {job.id} failed: {e!r}")
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+
+def dedupe_project_names(diagrams):
+    """
+    Renames repeated project names within a batch (name, name_2, name_3, ...)
+    so each diagram gets its own output directory.
+    """
+    taken = {output_name(diagram) for diagram in diagrams}
+    seen = set()
+    result = []
+    for diagram in diagrams:
+        name = output_name(diagram)
+        if name in seen:
+            suffix = 2
+            while f"{name}_{suffix}" in taken:
+                suffix += 1
+            name = f"{name}_{suffix}"
+            taken.add(name)
+            diagram = diagram.model_copy(update={"project_name": name})
+        seen.add(name)
+        result.append(diagram)
+    return result
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Process-wide JobManager, created on first use so importing the API doesn't
+    spawn worker processes.
+    """
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager.from_env()
+        return _job_manager
+
+
+def shutdown_job_manager():
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is not None:
+            _job_manager.shutdown()
+            _job_manager = None
@@ -0,0 +1,183 @@
+"""
+RFC 6902 JSON Patch over plain JSON values (dicts, lists, scalars).
+
+apply_patch() never mutates its input: only the containers on the path of
+each operation are copied, everything else is shared with the original. A
+patch that touches one node of a large diagram therefore copies the nodes
+list and that node, not the other nodes.
+"""
+
+OPERATIONS = ("add", "remove", "replace", "move", "copy", "test")
+
+
+class JsonPatchError(ValueError):
+    """
+    The patch document itself is malformed.
+    """
+
+
+class JsonPatchConflict(JsonPatchError):
+    """
+    The patch is well formed but doesn't apply to this document: a path is
+    missing or a `test` operation failed.
+    """
+
+
+def parse_pointer(pointer):
+    """
+    RFC 6901 JSON Pointer -> list of reference tokens.
+    """
+    if not isinstance(pointer, str):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def apply_patch(document, patch):
+    if not isinstance(patch, list):
+        raise JsonPatchError("A JSON patch must be an array of operations")
+    for index, operation in enumerate(patch):
+        try:
+            document = _apply_operation(document, operation)
+        except JsonPatchError as e:
+            raise type(e)(f"Operation {index}: {e}") from None
+    return document
+
+
+def _apply_operation(document, operation):
+    if not isinstance(operation, dict):
+        raise JsonPatchError("operation must be an object")
+    op = operation.get("op")
+    if op not in OPERATIONS:
+        raise JsonPatchError(f"unknown op {op!r}")
+    path = parse_pointer(_member(operation, "path"))
+
+    if op == "add":
+        return _add(document, path, _member(operation, "value"))
+    if op == "remove":
+        return _remove(document, path)[0]
+    if op == "replace":
+        value = _member(operation, "value")
+        if not path:
+            return value
+        return _update(document, path, lambda parent, key: _set(parent, key, value, replace=True))
+    if op == "test":
+        if not _equal(_get(document, path), _member(operation, "value")):
+            raise JsonPatchConflict(f"test failed at {operation['path']!r}")
+        return document
+
+    source = parse_pointer(_member(operation, "from"))
+    if op == "move":
+        if path[:len(source)] == source and path != source:
+            raise JsonPatchError("cannot move a value into one of its children")
+        document, value = _remove(document, source)
+        return _add(document, path, value)
+    return _add(document, path, _get(document, source))
+
+
+def _member(operation, name):
+    if name not in operation:
+        raise JsonPatchError(f"missing {name!r}")
+    return operation[name]
+
+
+def _get(document, path):
+    for token in path:
+        if isinstance(document, dict):
+            if token not in document:
+                raise JsonPatchConflict(f"path not found: /{'/'.join(path)}")
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[_index(document, token)]
+        else:
+            raise JsonPatchConflict(f"path not found: /{'/'.join(path)}")
+    return document
+
+
+def _update(document, path, change):
+    """
+    Copies the containers along `path` and calls change(parent copy, last
+    token) on the innermost one. Returns the new root.
+    """
+    if not path:
+        raise JsonPatchError("the root can only be added or replaced as a whole")
+    *parents, key = path
+    copies = [_copy(document)]
+    for token in parents:
+        child = _get(copies[-1], [token])
+        if not isinstance(child, (dict, list)):
+            raise JsonPatchConflict(f"path not found: /{'/'.join(path)}")
+        child = _copy(child)
+        _set(copies[-1], token, child, replace=True)
+        copies.append(child)
+    change(copies[-1], key)
+    return copies[0]
+
+
+def _add(document, path, value):
+    if not path:
+        return value
+    return _update(document, path, lambda parent, key: _set(parent, key, value, replace=False))
+
+
+def _remove(document, path):
+    removed = []
+
+    def delete(parent, key):
+        if isinstance(parent, dict):
+            if key not in parent:
+                raise JsonPatchConflict(f"path not found: /{'/'.join(path)}")
+            removed.append(parent.pop(key))
+        else:
+            removed.append(parent.pop(_index(parent, key)))
+
+    return _update(document, path, delete), removed[0]
+
+
+def _set(parent, key, value, replace):
+    if isinstance(parent, dict):
+        if replace and key not in parent:
+            raise JsonPatchConflict(f"path not found: {key!r}")
+        parent[key] = value
+    elif isinstance(parent, list):
+        if replace:
+            parent[_index(parent, key)] = value
+        elif key == "-":
+            parent.append(value)
+        else:
+            parent.insert(_index(parent, key, allow_end=True), value)
+    else:
+        raise JsonPatchConflict(f"cannot add {key!r} to a {type(parent).__name__}")
+
+
+def _index(array, token, allow_end=False):
+    if token == "-" or not token.isdigit() or (len(token) > 1 and token[0] == "0"):
+        raise JsonPatchConflict(f"invalid array index {token!r}")
+    index = int(token)
+    if index > len(array) or (index == len(array) and not allow_end):
+        raise JsonPatchConflict(f"array index {index} out of range")
+    return index
+
+
+def _copy(container):
+    if isinstance(container, dict):
+        return dict(container)
+    if isinstance(container, list):
+        return list(container)
+    raise JsonPatchConflict(f"cannot descend into a {type(container).__name__}")
+
+
+def _equal(a, b):
+    # JSON equality: 1 == 1.0, but true is not 1
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_equal(a[key], b[key]) for key in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, (dict, list)) or isinstance(b, (dict, list)):
+        return False
+    return a == b
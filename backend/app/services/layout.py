@@ -0,0 +1,271 @@
+import numpy as np
+from app.models import Diagram
+from app.services.instrumentation import span, count
+
+NODE_SPACING = 250   # between neighbours in a layer
+LAYER_SPACING = 150  # between layers
+SWEEPS = 4           # down+up barycenter passes for crossing reduction
+COORD_PASSES = 8     # neighbour-pull passes for coordinate assignment
+MAX_EDGE_SPAN = 8    # longer edges get no dummy chain and are drawn straight
+
+DIRECTIONS = ("TB", "LR")
+
+# Where a type sits in a request's path, clients first and stores last. Edges
+# pointing up this order are drawn reversed, so cycles never reach layering.
+TYPE_RANK = {
+    "Mobile App": 0, "Web App": 0, "SPA": 0,
+    "CDN": 1, "Load Balancer": 1,
+    "API Gateway": 2, "Nginx": 2,
+    "Microservice": 3, "Service": 3,
+    "RabbitMQ/KAFKA": 4,
+    "Database": 5, "Management": 5,
+}
+DEFAULT_RANK = 3
+
+
+def layout_diagram(diagram: Diagram, direction="TB", force=False) -> Diagram:
+    """
+    Fills in the position of every node that has none, in place, and returns
+    the diagram. A diagram without any positions (or force=True) is laid out
+    as a whole; when only some nodes are missing, the placed ones stay put and
+    the new ones are laid out in a band below (or right of) them.
+    """
+    nodes = diagram.nodes
+    missing = [i for i, node in enumerate(nodes) if node.position is None]
+    if not missing and not force:
+        return diagram
+
+    index = {node.id: i for i, node in enumerate(nodes)}
+    pairs = [(index[edge.source], index[edge.target]) for edge in diagram.edges
+             if edge.source in index and edge.target in index]
+    types = [node.data.get("type") for node in nodes]
+    placed = [(node.position.get("x", 0.0), node.position.get("y", 0.0)) for node in nodes if node.position is not None]
+    targets, coords = _layout_missing(types, pairs, missing, placed, direction, force)
+    for i, (x, y) in zip(targets.tolist(), coords.tolist()):
+        nodes[i].position = {"x": x, "y": y}
+    return diagram
+
+
+def layout_compact(compact, direction="TB", force=False):
+    """
+    layout_diagram for a CompactDiagram: fills its x / y arrays in place.
+    """
+    n = len(compact)
+    missing = np.isnan(compact.x)
+    missing[list(compact.extra_positions)] = False
+    if not missing.any() and not force:
+        return compact
+
+    x, y = compact.x.copy(), compact.y.copy()
+    for i, position in compact.extra_positions.items():
+        x[i], y[i] = position.get("x", 0.0), position.get("y", 0.0)
+    internal = (compact.source < n) & (compact.target < n)
+    pairs = np.column_stack((compact.source[internal], compact.target[internal]))
+    types = [data.get("type") for data in compact.data]
+    placed = np.column_stack((x, y))[~missing]
+    targets, coords = _layout_missing(types, pairs, np.flatnonzero(missing), placed, direction, force)
+    compact.x[targets] = coords[:, 0]
+    compact.y[targets] = coords[:, 1]
+    for i in targets.tolist():
+        compact.extra_positions.pop(i, None)
+    return compact
+
+
+def _layout_missing(types, pairs, missing, placed, direction, force):
+    """
+    Returns (node indices, their coordinates): every node with force=True or
+    when nothing is placed yet, otherwise the `missing` ones moved into a
+    band past the `placed` (x, y) positions.
+    """
+    with span("layout"):
+        coords = compute_layout(types, pairs, direction)
+    count("layout_nodes", len(types))
+    if force or not len(placed):
+        return np.arange(len(types)), coords.round(1)
+
+    missing = np.asarray(missing, dtype=np.int64)
+    placed = np.asarray(placed, dtype=float)
+    axis = 1 if direction == "TB" else 0
+    across = 1 - axis
+    band = coords[missing]
+    band[:, axis] += placed[:, axis].max() + LAYER_SPACING - band[:, axis].min()
+    band[:, across] += placed[:, across].min() - band[:, across].min()
+    return missing, band.round(1)
+
+
+def compute_layout(types, pairs, direction="TB"):
+    """
+    Layered (Sugiyama) layout of a graph of len(types) nodes with edges
+    [(source index, target index)]. Returns an (n, 2) array of x, y.
+
+    Layers come from longest paths after orienting edges by TYPE_RANK, edges
+    spanning up to MAX_EDGE_SPAN layers are split into chains of dummy nodes
+    (longer ones stay a single segment, which bounds the dummies at
+    MAX_EDGE_SPAN per edge), crossings are reduced with
+    barycenter sweeps and x is relaxed towards the neighbours' mean while
+    keeping NODE_SPACING between nodes of a layer. Every step is a handful of
+    array operations per layer or per pass.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"direction must be one of: {', '.join(DIRECTIONS)}")
+    n = len(types)
+    if n == 0:
+        return np.zeros((0, 2))
+
+    rank = np.array([TYPE_RANK.get(node_type, DEFAULT_RANK) for node_type in types])
+    src, dst = _orient_edges(n, rank, pairs)
+    layer = _longest_path_layers(n, src, dst, rank)
+    layer_all, rank_all, seg_src, seg_dst = _split_long_edges(n, layer, rank, src, dst)
+
+    order, pos, starts = _initial_order(layer_all, rank_all)
+    _reduce_crossings(order, pos, starts, layer_all, seg_src, seg_dst)
+    x = _assign_x(order, pos, layer_all, seg_src, seg_dst)
+
+    coords = np.column_stack((x[:n] - x[:n].min(), layer * float(LAYER_SPACING)))
+    return coords if direction == "TB" else coords[:, ::-1].copy()
+
+
+def _orient_edges(n, rank, pairs):
+    # Order nodes by (rank, index); edges against that order are reversed,
+    # which leaves an acyclic graph. Self-loops and duplicates are dropped.
+    # Edges come back sorted by that order of their source, a topological one.
+    edges = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    key = rank * n + np.arange(n)
+    backward = key[edges[:, 0]] > key[edges[:, 1]]
+    edges[backward] = edges[backward][:, ::-1]
+    edges = np.unique(edges, axis=0)
+    edges = edges[np.argsort(key[edges[:, 0]], kind="stable")]
+    return edges[:, 0], edges[:, 1]
+
+
+def _longest_path_layers(n, src, dst, rank):
+    # Edges arrive in topological order of their source, so by the time a
+    # node's out-edges come up its own layer is final: one pass, O(n + E)
+    layer = [0] * n
+    for s, d in zip(src.tolist(), dst.tolist()):
+        if layer[d] <= layer[s]:
+            layer[d] = layer[s] + 1
+    layer = np.array(layer, dtype=np.int64)
+
+    # Unconnected nodes join the first layer holding connected nodes of
+    # their rank (or a lower one) rather than all piling into layer 0
+    connected = np.zeros(n, dtype=bool)
+    connected[src] = connected[dst] = True
+    if connected.any() and not connected.all():
+        unset = np.iinfo(np.int64).max
+        first = np.full(rank.max() + 1, unset)
+        np.minimum.at(first, rank[connected], layer[connected])
+        floor = np.maximum.accumulate(np.where(first == unset, 0, first))
+        layer[~connected] = floor[rank[~connected]]
+    return layer
+
+
+def _split_long_edges(n, layer, rank, src, dst):
+    """
+    Replaces each edge spanning 1 < k <= MAX_EDGE_SPAN layers with a chain
+    through k - 1 dummy nodes (numbered from n), so its segments join adjacent
+    layers. Longer edges are kept as one segment: splitting them would cost
+    O(n * span) dummies, e.g. O(n^2) for a hub joined to every node of a chain.
+    """
+    span_ = layer[dst] - layer[src]
+    span_ = np.where(span_ > MAX_EDGE_SPAN, 1, span_)
+    extra = span_ - 1
+    total = int(extra.sum())
+    edge_of = np.repeat(np.arange(len(src)), extra)
+    step = np.arange(total) - np.repeat(np.cumsum(extra) - extra, extra)
+
+    # Each edge becomes the run [src, dummies..., dst] in one flat array
+    chain_start = np.cumsum(span_ + 1) - (span_ + 1)
+    chain = np.empty(int((span_ + 1).sum()), dtype=np.int64)
+    chain[chain_start] = src
+    chain[chain_start + span_] = dst
+    chain[chain_start[edge_of] + step + 1] = n + np.arange(total)
+
+    is_last = np.zeros(len(chain), dtype=bool)
+    is_last[chain_start + span_] = True
+    seg_src = chain[:-1][~is_last[:-1]]
+    seg_dst = chain[1:][~is_last[:-1]]
+
+    layer_all = np.concatenate((layer, layer[src][edge_of] + step + 1))
+    rank_all = np.concatenate((rank, rank[src][edge_of]))
+    return layer_all, rank_all, seg_src, seg_dst
+
+
+def _initial_order(layer_all, rank_all):
+    m = len(layer_all)
+    order = np.lexsort((np.arange(m), rank_all, layer_all))
+    starts = np.concatenate(([0], np.cumsum(np.bincount(layer_all))))
+    pos = np.empty(m, dtype=np.int64)
+    pos[order] = np.arange(m) - starts[layer_all[order]]
+    return order, pos, starts
+
+
+def _reduce_crossings(order, pos, starts, layer_all, seg_src, seg_dst):
+    """
+    Barycenter heuristic: each layer in turn is re-sorted by the mean position
+    of its neighbours in the layer just fixed, sweeping down then up. Nodes
+    without such neighbours keep their current position as their key.
+    """
+    layers = len(starts) - 1
+    if layers < 2 or not len(seg_src):
+        return
+    # Segments grouped by the layer of their lower / upper end
+    below = _group(layer_all[seg_dst], layers)
+    above = _group(layer_all[seg_src], layers)
+
+    def sort_layer(l, segments, moving, fixed):
+        lo, hi = starts[l], starts[l + 1]
+        size = hi - lo
+        if size < 2 or not len(segments):
+            return
+        local = pos[moving[segments]]
+        degree = np.bincount(local, minlength=size)
+        total = np.bincount(local, weights=pos[fixed[segments]], minlength=size)
+        current = np.arange(size, dtype=float)
+        bary = np.divide(total, degree, out=current, where=degree > 0)
+        members = np.empty(size, dtype=np.int64)
+        members[pos[order[lo:hi]]] = order[lo:hi]
+        members = members[np.argsort(bary, kind="stable")]
+        order[lo:hi] = members
+        pos[members] = np.arange(size)
+
+    for _ in range(SWEEPS):
+        for l in range(1, layers):
+            sort_layer(l, below[l], seg_dst, seg_src)
+        for l in range(layers - 2, -1, -1):
+            sort_layer(l, above[l], seg_src, seg_dst)
+
+
+def _group(keys, groups):
+    by_key = np.argsort(keys, kind="stable")
+    bounds = np.searchsorted(keys[by_key], np.arange(groups + 1))
+    return [by_key[bounds[g]:bounds[g + 1]] for g in range(groups)]
+
+
+def _assign_x(order, pos, layer_all, seg_src, seg_dst):
+    """
+    Starts from evenly spaced layers and repeatedly moves every node towards
+    the mean x of its neighbours. Spacing is restored after each pass by
+    packing each layer from the left and from the right (running max / min of
+    x - rank * spacing, kept per layer by a per-layer offset) and averaging
+    the two, which keeps the order and at least NODE_SPACING between nodes.
+    """
+    spacing = float(NODE_SPACING)
+    x = pos * spacing
+    degree = np.bincount(seg_src, minlength=len(x)) + np.bincount(seg_dst, minlength=len(x))
+    layer_sorted = layer_all[order]
+    gap = pos[order] * spacing
+
+    for _ in range(COORD_PASSES):
+        pull = np.bincount(seg_src, weights=x[seg_dst], minlength=len(x)) \
+            + np.bincount(seg_dst, weights=x[seg_src], minlength=len(x))
+        desired = np.divide(pull, degree, out=x.copy(), where=degree > 0)
+
+        shifted = desired[order] - gap
+        offset = layer_sorted * (shifted.max() - shifted.min() + spacing)
+        left = np.maximum.accumulate(shifted + offset)
+        right = np.minimum.accumulate((shifted + offset)[::-1])[::-1]
+        x = np.empty_like(x)
+        x[order] = (left + right) / 2 - offset + gap
+    return x
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+
+def cache_key(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL for LLM responses.
+
+    get_or_compute() also collapses concurrent misses for the same key: the
+    first caller runs the upstream request, the others wait on its result.
+    Values must be JSON-serializable when `path` is set, since entries are
+    persisted there and reloaded on startup. Writes are debounced: a change
+    is saved `save_delay` seconds later together with any that follow it, and
+    flush() saves pending changes right away (call it at shutdown).
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 24 * 3600, path: str = None, save_delay: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.save_delay = save_delay
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer of the file at a time
+        self._save_timer = None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        if path:
+            self._load()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("AUTOARCH_LLM_CACHE_SIZE", 256)),
+            ttl=float(os.getenv("AUTOARCH_LLM_CACHE_TTL", 24 * 3600)),
+            path=os.getenv("AUTOARCH_LLM_CACHE_PATH") or None,
+            save_delay=float(os.getenv("AUTOARCH_LLM_CACHE_SAVE_DELAY", 5.0)),
+        )
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._put(key, value)
+            self._schedule_save()
+
+    def get_or_compute(self, key: str, compute):
+        with self._lock:
+            value = self._get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            pending = self._inflight.get(key)
+            if pending is None:
+                self.misses += 1
+                pending = self._inflight[key] = Future()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return pending.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(value)
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._schedule_save()
+
+    def flush(self):
+        """
+        Saves pending changes now instead of when the debounce timer fires.
+        """
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "persistent": bool(self.path),
+            }
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key, value, expires_at=None):
+        self._entries[key] = (expires_at or time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, expires_at, value in stored:
+            if expires_at >= now:
+                self._put(key, value, expires_at)
+
+    def _schedule_save(self):
+        # Called with self._lock held
+        if not self.path:
+            return
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_delay, self._save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _save(self):
+        with self._save_lock:
+            with self._lock:
+                self._save_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                stored = [[key, expires_at, value] for key, (expires_at, value) in self._entries.items()]
+            # Write to a temp file first so a crash never leaves a truncated cache
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(stored, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Could not persist LLM cache to {self.path}: {e}")
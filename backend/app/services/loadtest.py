@@ -0,0 +1,46 @@
+import os
+import json
+from app.services.gateway import upstream_name, location_path
+
+# The harness is a standalone script, copied verbatim into every project
+HARNESS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "loadtest_harness.py")
+
+with open(HARNESS_PATH, "rb") as f:
+    HARNESS = f.read()
+
+
+def loadtest_route(label, data):
+    """
+    The harness route for a service behind the gateway. A node's `load_weight`
+    sets its share of the request mix.
+    """
+    try:
+        weight = float(data.get("load_weight", 1))
+    except (TypeError, ValueError):
+        weight = 1.0
+    return {
+        "name": label,
+        "method": "GET",
+        "path": location_path(label),
+        "upstream": upstream_name(label),
+        "weight": weight if weight >= 0 else 1.0,
+    }
+
+
+def plan_loadtest(routes, gateway_data=None):
+    """
+    Files of the load-test harness. Targets come from the API Gateway node's
+    `target_rps` and `target_p99_ms`; the harness fails when they are missed.
+    """
+    gateway_data = gateway_data or {}
+    targets = {}
+    for key, target in (("target_rps", "rps"), ("target_p99_ms", "p99_ms")):
+        try:
+            targets[target] = float(gateway_data[key]) if gateway_data.get(key) is not None else None
+        except (TypeError, ValueError):
+            targets[target] = None
+    config = {"routes": list(routes), "targets": targets}
+    return {
+        "loadtest/loadtest.py": HARNESS,
+        "loadtest/routes.json": (json.dumps(config, indent=2) + "\n").encode(),
+    }
@@ -0,0 +1,14 @@
+# Parsing for the settings users type into node and edge data, shared by the
+# gateway and service scaffolding.
+
+
+def int_setting(value, default, minimum):
+    """
+    `value` as an int, or `default` when it is missing, not a number or below
+    `minimum`.
+    """
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number >= minimum else default
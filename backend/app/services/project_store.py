@@ -0,0 +1,397 @@
+import os
+import json
+import time
+import zlib
+import base64
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from app.services.instrumentation import span
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Configuration, read once when the store is created
+#   AUTOARCH_DB_PATH  SQLite file holding projects, versions and generations
+DEFAULT_DB_PATH = "autoarch.db"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Archives larger than this are streamed but not kept
+MAX_CACHED_ARCHIVE = 64 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    owner TEXT,
+    latest_version INTEGER NOT NULL,
+    node_count INTEGER NOT NULL,
+    edge_count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS projects_updated ON projects (updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS projects_owner_updated ON projects (owner, updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS projects_name_nocase ON projects (name COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS versions (
+    project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    diagram BLOB NOT NULL,
+    node_count INTEGER NOT NULL,
+    edge_count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (project_id, version)
+) WITHOUT ROWID;
+
+-- Node types of each project's latest version
+CREATE TABLE IF NOT EXISTS node_types (
+    project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    node_type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (project_id, node_type)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS node_types_type ON node_types (node_type, project_id);
+
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    job_id TEXT,
+    result TEXT,
+    error TEXT,
+    archive BLOB,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS generations_project ON generations (project_id, id DESC);
+CREATE INDEX IF NOT EXISTS generations_archive ON generations (project_id, version, kind) WHERE archive IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS generations_job ON generations (job_id) WHERE job_id IS NOT NULL;
+"""
+
+PROJECT_COLUMNS = "id, name, owner, latest_version, node_count, edge_count, created_at, updated_at"
+
+
+# Diagrams without a project_name get this one from the model; storing them
+# under it would merge unrelated diagrams into one project
+PLACEHOLDER_NAMES = ("", "generated_project")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidProjectName(ValueError):
+    pass
+
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+class ProjectStore:
+    """
+    Projects, their diagram versions and generation history in one SQLite
+    file. Listing and search are keyset-paginated index scans (newest first),
+    so a page costs the same however many projects there are.
+
+    Each thread gets its own connection; WAL mode lets readers run alongside
+    the single writer.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("AUTOARCH_DB_PATH", DEFAULT_DB_PATH))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so two saves of the same
+        # project can't both read the same latest_version
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # Projects and versions
+
+    def save_version(self, document: dict, owner: str = None) -> dict:
+        """
+        Stores a validated diagram document as the next version of the
+        project named by its project_name, creating the project if needed.
+        Saving the same content as the latest version adds nothing. Returns
+        the project with `saved_version` and whether a version was `created`.
+        Raises InvalidProjectName for a missing or placeholder name.
+        """
+        name = document["project_name"]
+        if name.strip() in PLACEHOLDER_NAMES:
+            raise InvalidProjectName("Set project_name to store a diagram; unnamed diagrams would share one project")
+        with span("store_encode"):
+            raw = dumps(document)
+            digest = hashlib.sha256(raw).hexdigest()
+            blob = zlib.compress(raw, 6)
+        nodes, edges = document["nodes"], document["edges"]
+        node_types = {}
+        for node in nodes:
+            node_type = node["data"].get("type", "unknown")
+            node_types[node_type] = node_types.get(node_type, 0) + 1
+        now = time.time()
+
+        with span("store_write"), self._transaction() as conn:
+            project = conn.execute("SELECT id, latest_version, owner FROM projects WHERE name = ?", (name,)).fetchone()
+            if project is not None:
+                latest = conn.execute("SELECT digest FROM versions WHERE project_id = ? AND version = ?",
+                                      (project["id"], project["latest_version"])).fetchone()
+                if latest is not None and latest["digest"] == digest:
+                    if owner is not None and owner != project["owner"]:
+                        conn.execute("UPDATE projects SET owner = ?, updated_at = ? WHERE id = ?", (owner, now, project["id"]))
+                    return dict(self._project_row(conn, "id = ?", project["id"]), saved_version=project["latest_version"], created=False)
+                project_id, version = project["id"], project["latest_version"] + 1
+                conn.execute(
+                    "UPDATE projects SET latest_version = ?, node_count = ?, edge_count = ?, updated_at = ?,"
+                    " owner = COALESCE(?, owner) WHERE id = ?",
+                    (version, len(nodes), len(edges), now, owner, project_id),
+                )
+                conn.execute("DELETE FROM node_types WHERE project_id = ?", (project_id,))
+            else:
+                version = 1
+                project_id = conn.execute(
+                    "INSERT INTO projects (name, owner, latest_version, node_count, edge_count, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (name, owner, version, len(nodes), len(edges), now, now),
+                ).lastrowid
+            conn.execute(
+                "INSERT INTO versions (project_id, version, digest, diagram, node_count, edge_count, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (project_id, version, digest, blob, len(nodes), len(edges), now),
+            )
+            conn.executemany("INSERT INTO node_types (project_id, node_type, count) VALUES (?, ?, ?)",
+                             [(project_id, node_type, n) for node_type, n in node_types.items()])
+            return dict(self._project_row(conn, "id = ?", project_id), saved_version=version, created=True)
+
+    def get_project(self, name: str):
+        return self._project_row(self._connect(), "name = ?", name)
+
+    def get_version(self, name: str, version: int = None):
+        """
+        {"project": ..., "version": ..., "diagram": document} for a version
+        (the latest by default), or None.
+        """
+        conn = self._connect()
+        project = self._project_row(conn, "name = ?", name)
+        if project is None:
+            return None
+        row = conn.execute(
+            "SELECT version, digest, diagram, node_count, edge_count, created_at FROM versions"
+            " WHERE project_id = ? AND version = ?",
+            (project["id"], project["latest_version"] if version is None else version),
+        ).fetchone()
+        if row is None:
+            return None
+        with span("store_decode"):
+            document = _loads(zlib.decompress(row["diagram"]))
+        info = {key: row[key] for key in ("version", "digest", "node_count", "edge_count", "created_at")}
+        return {"project": project, "version": info, "diagram": document}
+
+    def list_versions(self, name: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None):
+        conn = self._connect()
+        project = self._project_row(conn, "name = ?", name)
+        if project is None:
+            return None
+        limit = _page_size(limit)
+        params = [project["id"]]
+        where = "project_id = ?"
+        if cursor:
+            where += " AND version < ?"
+            params.extend(decode_cursor(cursor, 1))
+        rows = conn.execute(
+            f"SELECT version, digest, node_count, edge_count, created_at FROM versions WHERE {where}"
+            " ORDER BY version DESC LIMIT ?", (*params, limit + 1),
+        ).fetchall()
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(items[-1]["version"]) if len(rows) > limit else None
+        return {"versions": items, "next_cursor": next_cursor}
+
+    def delete_project(self, name: str) -> bool:
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM projects WHERE name = ?", (name,)).rowcount > 0
+
+    def search_projects(self, q: str = None, owner: str = None, node_type: str = None,
+                        limit: int = DEFAULT_PAGE_SIZE, cursor: str = None) -> dict:
+        """
+        Projects newest first, optionally filtered by name prefix (case
+        insensitive), owner and a node type present in the latest version.
+        Pass the returned next_cursor to get the following page.
+        """
+        limit = _page_size(limit)
+        where = []
+        params = []
+        if owner is not None:
+            where.append("owner = ?")
+            params.append(owner)
+        if q:
+            # Served by projects_name_nocase: LIKE with a fixed prefix is a range scan
+            escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("name LIKE ? ESCAPE '\\'")
+            params.append(escaped + "%")
+        if node_type is not None:
+            where.append("id IN (SELECT project_id FROM node_types WHERE node_type = ?)")
+            params.append(node_type)
+        if cursor:
+            where.append("(updated_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor, 2))
+        sql = f"SELECT {PROJECT_COLUMNS} FROM projects"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY updated_at DESC, id DESC LIMIT ?"
+
+        with span("store_query"):
+            rows = self._connect().execute(sql, (*params, limit + 1)).fetchall()
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(items[-1]["updated_at"], items[-1]["id"]) if len(rows) > limit else None
+        return {"projects": items, "next_cursor": next_cursor}
+
+    def node_types(self, project_id: int) -> dict:
+        rows = self._connect().execute(
+            "SELECT node_type, count FROM node_types WHERE project_id = ? ORDER BY node_type", (project_id,)
+        ).fetchall()
+        return {row["node_type"]: row["count"] for row in rows}
+
+    # Generations
+
+    def start_generation(self, project_id: int, version: int, kind: str, job_id: str = None) -> int:
+        with self._transaction() as conn:
+            return conn.execute(
+                "INSERT INTO generations (project_id, version, kind, status, job_id, created_at)"
+                " VALUES (?, ?, ?, 'running', ?, ?)",
+                (project_id, version, kind, job_id, time.time()),
+            ).lastrowid
+
+    def record_job(self, project_id: int, version: int, job_id: str, status: str,
+                   result=None, error: str = None) -> int:
+        """
+        Records a generation job's state and returns its generation id. Keyed
+        by job_id, so the "running" and finished records may arrive in either
+        order: a finished record is never overwritten by a running one.
+        """
+        finished_at = None if status == "running" else time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO generations (project_id, version, kind, status, job_id, result, error, created_at, finished_at)"
+                " VALUES (?, ?, 'job', ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (job_id) WHERE job_id IS NOT NULL DO UPDATE SET"
+                " status = excluded.status, result = excluded.result, error = excluded.error,"
+                " finished_at = excluded.finished_at WHERE generations.status = 'running'",
+                (project_id, version, status, job_id, None if result is None else json.dumps(result), error,
+                 time.time(), finished_at),
+            )
+            return conn.execute("SELECT id FROM generations WHERE job_id = ?", (job_id,)).fetchone()["id"]
+
+    def finish_generation(self, generation_id: int, status: str, result=None, error: str = None, archive: bytes = None):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE generations SET status = ?, result = ?, error = ?, archive = ?, finished_at = ? WHERE id = ?",
+                (status, None if result is None else json.dumps(result), error, archive, time.time(), generation_id),
+            )
+
+    def cached_archive(self, project_id: int, version: int, kind: str):
+        row = self._connect().execute(
+            "SELECT archive FROM generations WHERE project_id = ? AND version = ? AND kind = ?"
+            " AND archive IS NOT NULL ORDER BY id DESC LIMIT 1",
+            (project_id, version, kind),
+        ).fetchone()
+        return None if row is None else row["archive"]
+
+    def list_generations(self, name: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None):
+        conn = self._connect()
+        project = self._project_row(conn, "name = ?", name)
+        if project is None:
+            return None
+        limit = _page_size(limit)
+        params = [project["id"]]
+        where = "project_id = ?"
+        if cursor:
+            where += " AND id < ?"
+            params.extend(decode_cursor(cursor, 1))
+        rows = conn.execute(
+            "SELECT id, version, kind, status, job_id, result, error, archive IS NOT NULL AS cached,"
+            f" created_at, finished_at FROM generations WHERE {where} ORDER BY id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+        items = []
+        for row in rows[:limit]:
+            item = dict(row)
+            item["cached"] = bool(item["cached"])
+            item["result"] = None if item["result"] is None else json.loads(item["result"])
+            items.append(item)
+        next_cursor = encode_cursor(items[-1]["id"]) if len(rows) > limit else None
+        return {"generations": items, "next_cursor": next_cursor}
+
+    def _project_row(self, conn, where: str, value):
+        row = conn.execute(f"SELECT {PROJECT_COLUMNS} FROM projects WHERE {where}", (value,)).fetchone()
+        return None if row is None else dict(row)
+
+
+def _page_size(limit) -> int:
+    return max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+_project_store = None
+_project_store_lock = threading.Lock()
+
+
+def get_project_store() -> ProjectStore:
+    """
+    Process-wide ProjectStore, created (with its schema) on first use.
+    """
+    global _project_store
+    with _project_store_lock:
+        if _project_store is None:
+            _project_store = ProjectStore.from_env()
+        return _project_store
@@ -0,0 +1,361 @@
+import re
+import json
+from app.services.node_settings import int_setting
+
+# How each datastore engine is run in docker-compose and reached from a service.
+# A Database node picks its engine from data["engine"], or from its label.
+DATASTORES = {
+    "postgres": {
+        "image": "postgres:13",
+        "url": "postgresql+asyncpg://user:password@{host}:5432/db",
+        "environment": ["POSTGRES_USER=user", "POSTGRES_PASSWORD=password", "POSTGRES_DB=db"],
+        "data_dir": "/var/lib/postgresql/data",
+        "healthcheck": ["CMD-SHELL", "pg_isready -U user -d db"],
+        "driver": "asyncpg",
+    },
+    "mysql": {
+        "image": "mysql:8.0",
+        "url": "mysql+aiomysql://user:password@{host}:3306/db",
+        "environment": ["MYSQL_USER=user", "MYSQL_PASSWORD=password", "MYSQL_DATABASE=db", "MYSQL_ROOT_PASSWORD=password"],
+        "data_dir": "/var/lib/mysql",
+        "healthcheck": ["CMD", "mysqladmin", "ping", "-h", "localhost"],
+        "driver": "aiomysql",
+    },
+    "redis": {
+        "image": "redis:7-alpine",
+        "url": "redis://{host}:6379/0",
+        "command": "redis-server --appendonly yes --maxmemory 256mb --maxmemory-policy allkeys-lru",
+        "data_dir": "/data",
+        "healthcheck": ["CMD", "redis-cli", "ping"],
+    },
+}
+
+# Connection pool sizing, overridable per Microservice node. Every gunicorn
+# worker owns its own pools, so keep replicas * workers * (pool + overflow)
+# below the database's max_connections.
+POOL_DEFAULTS = {
+    "db_pool_size": 5,
+    "db_max_overflow": 10,
+    "db_pool_timeout": 30,
+    "db_pool_recycle": 1800,
+    "redis_max_connections": 50,
+    "redis_ttl": 60,
+}
+
+HEALTHCHECK = {"interval": "10s", "timeout": "5s", "retries": 5, "start_period": "10s"}
+
+
+def datastore_engine(data):
+    engine = str(data.get("engine", "")).lower()
+    if engine in DATASTORES:
+        return engine
+    label = str(data.get("label", "")).lower()
+    if "redis" in label or "cache" in label:
+        return "redis"
+    if "mysql" in label or "maria" in label:
+        return "mysql"
+    return "postgres"
+
+
+def datastore_service(label, engine):
+    """
+    docker-compose entry for a Database node.
+    """
+    store = DATASTORES[engine]
+    service = {'image': store['image']}
+    if 'command' in store:
+        service['command'] = store['command']
+    if 'environment' in store:
+        service['environment'] = list(store['environment'])
+    service['volumes'] = [f"{label}_data:{store['data_dir']}"]
+    service['healthcheck'] = {'test': store['healthcheck'], **HEALTHCHECK}
+    return service
+
+
+def connection_env(datastores):
+    """
+    Splits a service's connected datastores, [(label, engine)], into the
+    environment it gets and the variable each SQL database / Redis is read from.
+
+    The first SQL database is DATABASE_URL and the first Redis is REDIS_URL;
+    further ones get <LABEL>_DATABASE_URL / <LABEL>_REDIS_URL so none overwrite
+    each other.
+    """
+    env_vars, databases, caches = {}, {}, {}
+    for label, engine in datastores:
+        target = caches if engine == "redis" else databases
+        if label in target:
+            continue
+        suffix = "REDIS_URL" if engine == "redis" else "DATABASE_URL"
+        var = suffix if not target else f"{_env_name(label)}_{suffix}"
+        target[label] = var
+        env_vars[var] = DATASTORES[engine]['url'].format(host=label)
+    return env_vars, databases, caches
+
+
+def pool_env(data, databases, caches):
+    """
+    Worker and pool sizing for a service, from its node data.
+    """
+    env_vars = {}
+    workers = int_setting(data.get("workers"), None, 1)
+    if workers:
+        env_vars['WEB_CONCURRENCY'] = workers
+    if databases:
+        for key in ("db_pool_size", "db_max_overflow", "db_pool_timeout", "db_pool_recycle"):
+            env_vars[key.upper()] = int_setting(data.get(key), POOL_DEFAULTS[key], 0)
+    if caches:
+        for key in ("redis_max_connections", "redis_ttl"):
+            env_vars[key.upper()] = int_setting(data.get(key), POOL_DEFAULTS[key], 1)
+    return env_vars
+
+
+def plan_microservice(label, datastores=()):
+    """
+    Files of a FastAPI service run by gunicorn with uvicorn workers, with a
+    pooled async SQLAlchemy engine per connected database and a pooled Redis
+    client per connected cache. `datastores` is [(label, engine)].
+    """
+    _, databases, caches = connection_env(datastores)
+    files = {}
+
+    imports = ["from contextlib import asynccontextmanager", "from fastapi import FastAPI, Response"]
+    startup = []
+    shutdown = []
+    checks = []
+    if databases:
+        imports.append("from app import db")
+        startup.append("    db.init_engines()")
+        shutdown.append("    await db.dispose_engines()")
+        checks.append("    checks.update(await db.check_databases())")
+        files["app/db.py"] = _DB_MODULE.replace("__DATABASES__", _py_dict(databases)).replace("__DEFAULT__", repr(next(iter(databases))))
+    if caches:
+        imports.append("from app import cache")
+        startup.append("    cache.init_clients()")
+        shutdown.insert(0, "    await cache.close_clients()")
+        checks.append("    checks.update(await cache.check_caches())")
+        files["app/cache.py"] = _CACHE_MODULE.replace("__CACHES__", _py_dict(caches)).replace("__DEFAULT__", repr(next(iter(caches))))
+
+    # main.py
+    files["app/main.py"] = "\n".join(imports) + f"""
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Pools are created per worker process, after gunicorn forks
+{chr(10).join(startup) or "    pass"}
+    yield
+{chr(10).join(shutdown) or "    pass"}
+
+
+app = FastAPI(title="{label}", lifespan=lifespan)
+
+
+@app.get("/")
+async def read_root():
+    return {{"message": "Hello from {label}!"}}
+
+
+@app.get("/health")
+async def health_check(response: Response):
+    checks = {{}}
+""" + "".join(line + "\n" for line in checks) + """    healthy = all(status == "ok" for status in checks.values())
+    if not healthy:
+        response.status_code = 503
+    return {"status": "healthy" if healthy else "degraded", "checks": checks}
+"""
+
+    files["app/__init__.py"] = ""
+    files["gunicorn.conf.py"] = _GUNICORN_CONF
+
+    # requirements.txt
+    requirements = ["fastapi", "uvicorn[standard]", "gunicorn"]
+    if databases:
+        requirements.append("sqlalchemy[asyncio]>=2.0")
+        requirements.extend(sorted({DATASTORES[engine]['driver'] for _, engine in datastores if engine != "redis"}))
+    if caches:
+        requirements.append("redis>=5.0")
+    files["requirements.txt"] = "\n".join(requirements) + "\n"
+
+    # Dockerfile
+    files["Dockerfile"] = """FROM python:3.11-slim
+ENV PYTHONDONTWRITEBYTECODE=1 PYTHONUNBUFFERED=1
+WORKDIR /app
+COPY requirements.txt .
+RUN pip install --no-cache-dir -r requirements.txt
+COPY . .
+EXPOSE 8000
+CMD ["gunicorn", "app.main:app", "-c", "gunicorn.conf.py"]
+"""
+    return files
+
+
+def service_healthcheck():
+    test = ["CMD", "python", "-c", "import urllib.request; urllib.request.urlopen('http://localhost:8000/health')"]
+    return {'test': test, **HEALTHCHECK}
+
+
+def _env_name(label):
+    return re.sub(r"[^A-Z0-9]+", "_", label.upper()).strip("_")
+
+
+def _py_dict(mapping):
+    items = "".join(f"    {json.dumps(key)}: {json.dumps(value)},\n" for key, value in mapping.items())
+    return "{\n" + items + "}"
+
+
+_GUNICORN_CONF = """import multiprocessing
+import os
+
+bind = "0.0.0.0:8000"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Outlive the gateway's idle upstream connections so nginx never reuses a closed one
+keepalive = 75
+timeout = 60
+graceful_timeout = 30
+# Recycle workers periodically to bound memory growth
+max_requests = 10000
+max_requests_jitter = 1000
+accesslog = "-"
+"""
+
+_DB_MODULE = """import os
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+# Database label -> environment variable holding its URL
+DATABASES = __DATABASES__
+DEFAULT_DATABASE = __DEFAULT__
+
+engines = {}
+sessions = {}
+
+
+def init_engines():
+    for name, env_var in DATABASES.items():
+        url = os.getenv(env_var)
+        if not url:
+            continue
+        engines[name] = create_async_engine(
+            url,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pool_pre_ping=True,
+        )
+        sessions[name] = async_sessionmaker(engines[name], expire_on_commit=False)
+
+
+async def dispose_engines():
+    for engine in engines.values():
+        await engine.dispose()
+    engines.clear()
+    sessions.clear()
+
+
+def session_dependency(name=DEFAULT_DATABASE):
+    \"\"\"
+    FastAPI dependency yielding a session from the named database's pool:
+    `session: AsyncSession = Depends(get_session)`
+    \"\"\"
+    async def dependency():
+        async with sessions[name]() as session:
+            yield session
+    return dependency
+
+
+get_session = session_dependency()
+
+
+async def check_databases():
+    status = {}
+    for name in DATABASES:
+        engine = engines.get(name)
+        if engine is None:
+            status[name] = "not configured"
+            continue
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            status[name] = "ok"
+        except Exception as exc:
+            status[name] = f"error: {exc.__class__.__name__}"
+    return status
+"""
+
+_CACHE_MODULE = """import json
+import os
+import redis.asyncio as redis
+
+# Cache label -> environment variable holding its URL
+CACHES = __CACHES__
+DEFAULT_CACHE = __DEFAULT__
+DEFAULT_TTL = int(os.getenv("REDIS_TTL", "60"))
+
+clients = {}
+
+
+def init_clients():
+    for name, env_var in CACHES.items():
+        url = os.getenv(env_var)
+        if not url:
+            continue
+        pool = redis.ConnectionPool.from_url(
+            url,
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+            decode_responses=True,
+        )
+        clients[name] = redis.Redis(connection_pool=pool)
+
+
+async def close_clients():
+    for client in clients.values():
+        await client.aclose()
+    clients.clear()
+
+
+async def cached(key, loader, ttl=None, cache=DEFAULT_CACHE):
+    \"\"\"
+    Read-through cache: returns the JSON value stored under `key`, or awaits
+    loader(), stores its result for `ttl` seconds and returns it. Redis being
+    unavailable degrades to calling loader() directly.
+    \"\"\"
+    client = clients.get(cache)
+    if client is None:
+        return await loader()
+    try:
+        hit = await client.get(key)
+    except redis.RedisError:
+        return await loader()
+    if hit is not None:
+        return json.loads(hit)
+    value = await loader()
+    try:
+        await client.set(key, json.dumps(value, default=str), ex=ttl or DEFAULT_TTL)
+    except redis.RedisError:
+        pass
+    return value
+
+
+async def invalidate(key, cache=DEFAULT_CACHE):
+    client = clients.get(cache)
+    if client is not None:
+        await client.delete(key)
+
+
+async def check_caches():
+    status = {}
+    for name in CACHES:
+        client = clients.get(name)
+        if client is None:
+            status[name] = "not configured"
+            continue
+        try:
+            await client.ping()
+            status[name] = "ok"
+        except Exception as exc:
+            status[name] = f"error: {exc.__class__.__name__}"
+    return status
+"""
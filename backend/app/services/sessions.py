@@ -0,0 +1,206 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from pydantic import ValidationError
+from app.models import Diagram, Node, Edge
+from app.services.json_patch import apply_patch
+from app.services.instrumentation import span, count
+
+# Configuration, read once when the store is created
+#   AUTOARCH_MAX_SESSIONS  sessions kept; the least recently used go first
+#   AUTOARCH_SESSION_TTL   seconds a session survives without being used
+DEFAULT_MAX_SESSIONS = 1000
+DEFAULT_SESSION_TTL = 24 * 3600
+
+ELEMENT_MODELS = {"nodes": Node, "edges": Edge}
+
+
+class PreconditionFailed(Exception):
+    def __init__(self, etag):
+        super().__init__(f"Session has moved on to {etag}")
+        self.etag = etag
+
+
+class InvalidDiagram(ValueError):
+    pass
+
+
+class DiagramSession:
+    """
+    A diagram held server-side as its JSON document, at a version that goes
+    up by one with every patch. The document is never mutated in place:
+    patches build a new one sharing all untouched nodes and edges.
+    """
+
+    def __init__(self, session_id: str, document: dict):
+        self.id = session_id
+        self.document = document
+        self.version = 1
+        self.created_at = self.updated_at = self.used_at = time.time()
+        self.lock = threading.Lock()
+        self._diagram = None
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.id}.{self.version}"'
+
+    def matches(self, if_match: str) -> bool:
+        # Strong comparison, so weak (W/) tags never match
+        tags = [tag.strip() for tag in if_match.split(",")]
+        return "*" in tags or self.etag in tags
+
+    def apply(self, patch, if_match: str = None):
+        """
+        Applies an RFC 6902 patch and bumps the version. With `if_match` the
+        patch only applies to the version that ETag names (PreconditionFailed
+        otherwise). Raises JsonPatchError / JsonPatchConflict for patches that
+        are malformed or don't apply, and InvalidDiagram when the result is not
+        a valid Diagram; the session is unchanged in all of these cases.
+        """
+        with self.lock:
+            if if_match is not None and not self.matches(if_match):
+                raise PreconditionFailed(self.etag)
+            with span("session_patch"):
+                document = apply_patch(self.document, patch)
+                document = _validate_changes(self.document, document)
+            count("session_patch_ops", len(patch))
+            self.document = document
+            self.version += 1
+            self.updated_at = time.time()
+            self._diagram = None
+            return self.version
+
+    def diagram(self) -> Diagram:
+        """
+        The current version as a Diagram. Every element was validated when it
+        entered the document, so the models are built without validating again.
+        """
+        with self.lock:
+            if self._diagram is None:
+                document = self.document
+                self._diagram = Diagram.model_construct(
+                    nodes=[Node.model_construct(**node) for node in document["nodes"]],
+                    edges=[Edge.model_construct(**edge) for edge in document["edges"]],
+                    project_name=document["project_name"],
+                )
+            return self._diagram
+
+    def to_dict(self, include_diagram: bool = False):
+        result = {
+            "session_id": self.id,
+            "version": self.version,
+            "project_name": self.document["project_name"],
+            "nodes": len(self.document["nodes"]),
+            "edges": len(self.document["edges"]),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        if include_diagram:
+            result["diagram"] = self.document
+        return result
+
+
+def _validate_changes(old: dict, new) -> dict:
+    """
+    Validates what a patch changed and returns the normalized document. Nodes
+    and edges the patch didn't touch are the same objects as before and are
+    skipped; new or modified ones are validated and stored normalized.
+    """
+    if not isinstance(new, dict):
+        raise InvalidDiagram("A diagram must be an object")
+    project_name = new.get("project_name", Diagram.model_fields["project_name"].default)
+    if not isinstance(project_name, str):
+        raise InvalidDiagram("project_name must be a string")
+
+    result = {}
+    for key, model in ELEMENT_MODELS.items():
+        elements = new.get(key)
+        if not isinstance(elements, list):
+            raise InvalidDiagram(f"{key} must be an array")
+        if elements is old[key]:
+            result[key] = elements
+            continue
+        unchanged = {id(element) for element in old[key]}
+        validated = []
+        for i, element in enumerate(elements):
+            if id(element) not in unchanged:
+                try:
+                    element = model.model_validate(element).model_dump()
+                except ValidationError as e:
+                    raise InvalidDiagram(f"/{key}/{i}: {e}")
+            validated.append(element)
+        result[key] = validated
+    result["project_name"] = project_name
+    return result
+
+
+class SessionStore:
+    """
+    In-memory diagram sessions, bounded by count (LRU) and idle time.
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, ttl: float = DEFAULT_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_sessions=int(os.getenv("AUTOARCH_MAX_SESSIONS", DEFAULT_MAX_SESSIONS)),
+            ttl=float(os.getenv("AUTOARCH_SESSION_TTL", DEFAULT_SESSION_TTL)),
+        )
+
+    def create(self, document: dict) -> DiagramSession:
+        """
+        Stores a validated diagram document, as from Diagram.model_dump() or
+        CompactDiagram.to_dict().
+        """
+        session = DiagramSession(uuid.uuid4().hex, document)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._evict()
+        return session
+
+    def get(self, session_id: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            now = time.time()
+            if now - session.used_at > self.ttl:
+                del self._sessions[session_id]
+                return None
+            session.used_at = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self):
+        now = time.time()
+        expired = [sid for sid, session in self._sessions.items() if now - session.used_at > self.ttl]
+        for session_id in expired:
+            del self._sessions[session_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore.from_env()
+        return _session_store
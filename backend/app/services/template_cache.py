@@ -0,0 +1,89 @@
+import gzip
+import json
+import hashlib
+from fastapi import Request, Response
+from app.models import Diagram
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TEMPLATE_CACHE_CONTROL = "public, max-age=3600"
+
+
+class EncodedTemplate:
+    """
+    A template serialized once, with its compressed variants and ETags.
+    Each encoding gets its own strong ETag since the bytes differ.
+    """
+
+    def __init__(self, template_id: str, template: dict):
+        self.id = template_id
+        self.node_count = len(template.get("nodes", []))
+        self.edge_count = len(template.get("edges", []))
+        identity = json.dumps(template, separators=(",", ":")).encode()
+        digest = hashlib.sha256(identity).hexdigest()[:32]
+
+        self.bodies = {"identity": identity, "gzip": gzip.compress(identity, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(identity, quality=11)
+        self.etags = {
+            encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+            for encoding in self.bodies
+        }
+
+
+def build_template_cache(templates: dict) -> dict:
+    """
+    Validates every template against the Diagram model and pre-encodes it.
+    Raises ValueError naming the first invalid template, so a bad entry fails
+    at startup instead of on the first request.
+    """
+    cache = {}
+    for template_id, template in templates.items():
+        try:
+            Diagram(**template)
+        except Exception as e:
+            raise ValueError(f"Template '{template_id}' is not a valid Diagram: {e}")
+        cache[template_id] = EncodedTemplate(template_id, template)
+    return cache
+
+
+def negotiate_encoding(accept_encoding: str, available) -> str:
+    """
+    Picks br, then gzip, then identity among the codings the client accepts
+    (q=0 excludes a coding).
+    """
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = params.strip().replace(" ", "")
+        if q.startswith("q=") and q[2:] in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(coding)
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match: str, etags) -> bool:
+    # If-None-Match uses weak comparison, so a W/ prefix still matches
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or not candidates.isdisjoint(etags)
+
+
+def template_response(entry: EncodedTemplate, request: Request) -> Response:
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), entry.bodies)
+    headers = {
+        "ETag": entry.etags[encoding],
+        "Cache-Control": TEMPLATE_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, entry.etags.values()):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=entry.bodies[encoding], media_type="application/json", headers=headers)
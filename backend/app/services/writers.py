@@ -0,0 +1,166 @@
+import os
+import io
+import time
+import shutil
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.services.instrumentation import count
+
+ARCHIVE_FORMATS = {
+    "zip": "application/zip",
+    "tar.gz": "application/gzip",
+}
+
+# Files per flush task: large enough to amortise the pool overhead, small
+# enough that progress and cancellation still move in fine steps
+FLUSH_BATCH_SIZE = 64
+FLUSH_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+
+
+class DiskWriter:
+    """
+    Writes generated files to the local filesystem.
+    """
+    on_disk = True
+
+    def makedirs(self, path):
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, path, content):
+        if isinstance(content, str):
+            content = content.encode()
+        with open(path, "wb") as f:
+            f.write(content)
+        count("bytes_written", len(content))
+
+    def flush(self, base_path, entries, progress=None):
+        """
+        Writes plan entries under base_path: every directory is created once up
+        front, then the files are written in batches on a thread pool (file I/O
+        releases the GIL). If `progress` raises, batches not yet started are
+        cancelled and the exception propagates.
+        """
+        entries = list(entries)
+        total = len(entries)
+        for directory in sorted({os.path.dirname(entry.path) for entry in entries}):
+            os.makedirs(os.path.join(base_path, directory), exist_ok=True)
+
+        def write_batch(batch):
+            written = 0
+            for entry in batch:
+                with open(os.path.join(base_path, entry.path), "wb") as f:
+                    f.write(entry.content)
+                written += len(entry.content)
+            return len(batch), written
+
+        batches = [entries[i:i + FLUSH_BATCH_SIZE] for i in range(0, total, FLUSH_BATCH_SIZE)]
+        if progress:
+            progress(0, total)
+        if len(batches) <= 1:
+            # Not worth a pool for a handful of files
+            results = [write_batch(batch) for batch in batches]
+        else:
+            results = []
+            with ThreadPoolExecutor(max_workers=min(FLUSH_WORKERS, len(batches))) as pool:
+                futures = [pool.submit(write_batch, batch) for batch in batches]
+                done_files = 0
+                try:
+                    for future in as_completed(futures):
+                        results.append(future.result())
+                        done_files += results[-1][0]
+                        if progress and done_files < total:
+                            progress(done_files, total)
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        count("bytes_written", sum(written for _, written in results))
+        if progress:
+            progress(total, total)
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def remove(self, path):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+class ArchiveWriter:
+    """
+    Virtual file tree that packs every file into a zip or tar.gz archive as soon
+    as it is written. The archive bytes go to `sink`, a write-only file object, so
+    nothing touches the disk. Entries are consumed as they are produced: fed a
+    plan's lazy entries, only the component being packed is held in memory.
+    """
+    on_disk = False
+
+    def __init__(self, sink, fmt="zip"):
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unsupported archive format: {fmt}")
+        self.fmt = fmt
+        self.paths = set()
+        self._mtime = time.time()
+        if fmt == "zip":
+            self._archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            # "w|gz" is tarfile's streaming mode: it never seeks on the sink
+            self._archive = tarfile.open(fileobj=sink, mode="w|gz")
+
+    def makedirs(self, path):
+        # Directories are implied by the entry paths
+        pass
+
+    def write(self, path, content):
+        name = path.replace(os.sep, "/")
+        data = content.encode() if isinstance(content, str) else content
+        if self.fmt == "zip":
+            info = zipfile.ZipInfo(name, time.localtime(self._mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            self._archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = self._mtime
+            info.mode = 0o644
+            self._archive.addfile(info, io.BytesIO(data))
+        self.paths.add(name)
+        count("bytes_written", len(data))
+
+    def flush(self, base_path, entries, progress=None):
+        """
+        Packs plan entries in order, without collecting them first; archive
+        members have to be written one at a time, so there is nothing to
+        parallelise here. `progress` gets total=None until the last entry
+        unless `entries` has a length.
+        """
+        total = len(entries) if hasattr(entries, "__len__") else None
+        done = 0
+        for entry in entries:
+            if progress:
+                progress(done, total)
+            self.write(f"{base_path}/{entry.path}", entry.content)
+            done += 1
+        if progress:
+            progress(done, done)
+
+    def exists(self, path):
+        return path.replace(os.sep, "/") in self.paths
+
+    def remove(self, path):
+        # Entries already streamed out cannot be taken back; generation never
+        # removes a path it wrote in the same run.
+        pass
+
+    def close(self):
+        self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,75 @@
+"""
+Parse time and memory of a Diagram request body: the pydantic models
+(Diagram.model_validate_json, as FastAPI does for a `diagram: Diagram`
+parameter) vs the compact representation (CompactDiagram.from_json).
+
+Memory is what the parsed result keeps alive, and the peak while parsing,
+both measured with tracemalloc.
+
+Run from the backend directory:
+    python benchmarks/bench_compact.py [--sizes 10000 100000] [--repeat 3]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Diagram
+from app.compact import CompactDiagram, orjson
+from synthetic import make_diagram
+
+CASES = {
+    "pydantic models": Diagram.model_validate_json,
+    "compact": CompactDiagram.from_json,
+}
+
+
+def best_time(parse, body, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(body)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def memory(parse, body):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = parse(body)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained - before, peak - before
+
+
+def run(sizes, repeat):
+    print(f"JSON parser for the compact path: {'orjson' if orjson is not None else 'json (orjson not installed)'}")
+    print(f"{'nodes':>7} {'case':<16} {'body MB':>8} {'parse ms':>9} {'retained MB':>12} {'peak MB':>8}")
+    for size in sizes:
+        body = make_diagram(size).model_dump_json().encode()
+        baseline = None
+        for name, parse in CASES.items():
+            seconds = best_time(parse, body, repeat)
+            retained, peak = memory(parse, body)
+            print(f"{size:>7} {name:<16} {len(body) / 1e6:>8.1f} {seconds * 1000:>9.1f} "
+                  f"{retained / 1e6:>12.1f} {peak / 1e6:>8.1f}", end="")
+            if baseline is None:
+                baseline = (seconds, retained)
+                print()
+            else:
+                print(f"   {baseline[0] / seconds:.1f}x faster, {baseline[1] / retained:.1f}x less memory")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,51 @@
+"""
+Times generate_project on synthetic diagrams of growing size.
+
+Run from the backend directory:
+    python benchmarks/bench_generate.py [--sizes 250 500 1000 2000 4000 8000]
+
+Generation is linear when the per-node cost stays flat as the diagram grows.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.generator import generate_project
+from synthetic import make_diagram
+
+
+def run(sizes, repeat):
+    print(f"{'nodes':>8} {'edges':>8} {'best (s)':>10} {'us/node':>10}")
+    per_node = []
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for size in sizes:
+                diagram = make_diagram(size)
+                best = float("inf")
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    generate_project(diagram)
+                    best = min(best, time.perf_counter() - start)
+                cost = best / len(diagram.nodes) * 1e6
+                per_node.append(cost)
+                print(f"{len(diagram.nodes):>8} {len(diagram.edges):>8} {best:>10.3f} {cost:>10.1f}")
+        finally:
+            os.chdir(cwd)
+
+    # Quadratic work would make this ratio grow with the size ratio
+    growth = per_node[-1] / per_node[0]
+    print(f"\nper-node cost, largest vs smallest: {growth:.2f}x over {sizes[-1] / sizes[0]:.0f}x more nodes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 500, 1000, 2000, 4000, 8000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(sorted(args.sizes), args.repeat)
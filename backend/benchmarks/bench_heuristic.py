@@ -0,0 +1,106 @@
+"""
+Throughput of the heuristic diagram generator on synthetic ticket text,
+against the if/else chain it replaced (kept below as `legacy_generate`).
+
+Run from the backend directory:
+    python benchmarks/bench_heuristic.py [--prompts 5000] [--words 60]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Diagram, Node, Edge
+from app.services.ai_service import generate_diagram_heuristic, generate_diagrams_heuristic
+from synthetic import make_prompts
+
+
+def legacy_generate(prompt, project_type):
+    """
+    generate_diagram_heuristic before the rule table: one substring check per
+    keyword and a validated model per node and edge.
+    """
+    prompt = prompt.lower()
+    nodes = []
+    edges = []
+
+    def add_node(label, type, x, y, icon=None, color=None):
+        node_id = str(uuid.uuid4())
+        data = {"label": label, "type": type}
+        if icon: data["icon"] = icon
+        if color: data["color"] = color
+        nodes.append(Node(id=node_id, type=type.lower().replace(" ", ""), position={"x": x, "y": y}, data=data))
+        return node_id
+
+    def add_edge(source, target):
+        edges.append(Edge(id=f"e{source}-{target}", source=source, target=target))
+
+    if project_type == 'mobile':
+        client_id = add_node("Mobile App", "Mobile App", 250, 50, "Mobile", "bg-purple-600")
+    else:
+        client_id = add_node("Web App", "Web App", 250, 50, "Web", "bg-blue-500")
+    if "load balancer" in prompt or "scale" in prompt:
+        gateway_id = add_node("Load Balancer", "Load Balancer", 250, 200, "Server", "bg-yellow-500")
+    else:
+        gateway_id = add_node("API Gateway", "API Gateway", 250, 200, "Gateway", "bg-orange-500")
+    add_edge(client_id, gateway_id)
+    core_svc_id = add_node("Core Service", "Microservice", 250, 350, "Microservice", "bg-green-600")
+    add_edge(gateway_id, core_svc_id)
+    if "auth" in prompt or "login" in prompt or "user" in prompt:
+        add_edge(gateway_id, add_node("Auth Service", "Microservice", 50, 350, "Key", "bg-blue-500"))
+    if "payment" in prompt or "stripe" in prompt or "shop" in prompt:
+        add_edge(gateway_id, add_node("Payment Service", "Microservice", 450, 350, "Microservice", "bg-green-600"))
+    if "search" in prompt:
+        search_id = add_node("Search Service", "Microservice", 650, 350, "Microservice", "bg-green-600")
+        add_edge(gateway_id, search_id)
+        add_edge(search_id, add_node("Elasticsearch", "ELK", 650, 500, "Stack", "bg-blue-400"))
+    add_edge(core_svc_id, add_node("Primary DB", "Database", 250, 500, "Database", "bg-red-600"))
+    if "cache" in prompt or "fast" in prompt or "real-time" in prompt:
+        add_edge(core_svc_id, add_node("Redis Cache", "Database", 450, 500, "Stack", "bg-red-400"))
+    if "queue" in prompt or "async" in prompt or "event" in prompt:
+        add_edge(core_svc_id, add_node("Kafka", "RabbitMQ/KAFKA", 50, 500, "Queue", "bg-blue-800"))
+    return Diagram(nodes=nodes, edges=edges, project_name="ai_generated_project")
+
+
+# Each case turns the whole prompt list into diagrams and keeps them
+CASES = {
+    "legacy": lambda prompts: [legacy_generate(prompt, "web") for prompt in prompts],
+    "rule table": lambda prompts: [generate_diagram_heuristic(prompt, "web", layout=False) for prompt in prompts],
+    "rule table+layout": lambda prompts: [generate_diagram_heuristic(prompt, "web") for prompt in prompts],
+    "batch+layout": lambda prompts: generate_diagrams_heuristic(prompts, "web"),
+}
+
+
+def run(count, words, repeat):
+    prompts = make_prompts(count, words)
+    print(f"prompts: {count}, words/prompt: {words}")
+    # Cases take turns within each round, so a slow spell on the machine
+    # doesn't land on one case only
+    best = dict.fromkeys(CASES, float("inf"))
+    for _ in range(repeat):
+        for name, generate in CASES.items():
+            # Like timeit, without the collector's passes over the kept diagrams
+            gc.collect()
+            gc.disable()
+            start = time.perf_counter()
+            generate(prompts)
+            best[name] = min(best[name], time.perf_counter() - start)
+            gc.enable()
+
+    baseline = best["legacy"]
+    for name, seconds in best.items():
+        print(f"{name:<18} best of {repeat}: {seconds:.3f}s, {count / seconds:>9,.0f} prompts/s, "
+              f"{seconds / count * 1e6:6.1f} us/prompt   {baseline / seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=5000)
+    parser.add_argument("--words", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.prompts, args.words, args.repeat)
@@ -0,0 +1,96 @@
+"""
+Requests/s for GET /templates/{id}: pre-encoded responses vs encoding the
+template dict on every request (the previous behaviour).
+
+Requests are driven straight through the ASGI interface, so the numbers
+cover routing and response building without any network overhead.
+
+Run from the backend directory:
+    python benchmarks/bench_templates.py [--requests 5000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from app.api.routes import router, TEMPLATE_CACHE
+from app.data.templates import TEMPLATES
+
+
+def legacy_app():
+    app = FastAPI()
+
+    @app.get("/templates/{template_id}")
+    async def get_template(template_id: str):
+        return TEMPLATES[template_id]
+
+    return app
+
+
+def current_app():
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+async def call(app, path, headers):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": headers, "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    status = []
+    size = [0]
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif message["type"] == "http.response.body":
+            size[0] += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status[0], size[0]
+
+
+async def measure(app, path, headers, count):
+    await call(app, path, headers)
+    start = time.perf_counter()
+    for _ in range(count):
+        status, size = await call(app, path, headers)
+    elapsed = time.perf_counter() - start
+    return count / elapsed, status, size
+
+
+async def run(count, template_id):
+    path = f"/templates/{template_id}"
+    app = current_app()
+    etag = TEMPLATE_CACHE[template_id].etags["gzip"]
+
+    cases = [
+        ("legacy dict response", legacy_app(), []),
+        ("pre-encoded identity", app, []),
+        ("pre-encoded gzip", app, [(b"accept-encoding", b"gzip")]),
+        ("pre-encoded br", app, [(b"accept-encoding", b"br, gzip")]),
+        ("conditional 304", app, [(b"accept-encoding", b"gzip"), (b"if-none-match", etag.encode())]),
+    ]
+    baseline = None
+    print(f"{'case':<24} {'status':>6} {'bytes':>7} {'req/s':>10} {'speedup':>8}")
+    for name, case_app, headers in cases:
+        rps, status, size = await measure(case_app, path, headers, count)
+        baseline = baseline or rps
+        print(f"{name:<24} {status:>6} {size:>7} {rps:>10,.0f} {rps / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--template", default="ios")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.template))
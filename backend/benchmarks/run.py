@@ -0,0 +1,197 @@
+"""
+Benchmark suite for the backend hot paths.
+
+Run from the backend directory:
+    python benchmarks/run.py                          # full suite, print results
+    python benchmarks/run.py --quick --save base.json # small sizes, save JSON
+    python benchmarks/run.py --compare base.json      # exit 1 on regressions
+
+Each case is timed as the best of --repeat runs per size. With --compare, a
+case/size that is more than --threshold slower than the baseline counts as a
+regression; sizes missing from either side are skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Diagram
+from app.compact import CompactDiagram
+from app.services.ai_service import generate_diagrams_heuristic
+from app.services.capacity import simulate_capacity
+from app.services.layout import layout_diagram
+from app.services.sessions import SessionStore
+from app.services.generator import generate_project, generate_docker_compose, plan_project
+from synthetic import make_diagram, make_deep_diagram, make_prompts
+
+SIZES = {
+    "generate_project": [10, 100, 1000, 5000],
+    "generate_docker_compose": [10, 1000, 10000, 50000],
+    "generate_diagram_heuristic": [100, 1000, 5000],
+    "diagram_validation": [10, 1000, 10000, 50000],
+    "capacity_simulation": [10, 100, 500],
+    "layout": [100, 1000, 5000],
+    "layout_deep": [100, 1000, 5000],
+    "session_patch": [1000, 10000, 50000],
+    "compact_parse": [10, 1000, 10000, 50000],
+}
+QUICK_SIZES = {
+    "generate_project": [10, 100, 1000],
+    "generate_docker_compose": [10, 1000, 5000],
+    "generate_diagram_heuristic": [100, 1000],
+    "diagram_validation": [10, 1000, 5000],
+    "capacity_simulation": [10, 100],
+    "layout": [100, 1000],
+    "layout_deep": [100, 2000],
+    "session_patch": [1000, 10000],
+    "compact_parse": [10, 1000, 5000],
+}
+
+
+def setup_generate_project(size, workdir):
+    diagram = make_diagram(size)
+    return lambda: generate_project(diagram)
+
+
+def setup_generate_docker_compose(size, workdir):
+    # The service map generate_project renders, datastore engines,
+    # healthchecks and replicas included
+    services = plan_project(make_diagram(size)).services
+    return lambda: generate_docker_compose(workdir, services)
+
+
+def setup_generate_diagram_heuristic(size, workdir):
+    prompts = make_prompts(size)
+    return lambda: generate_diagrams_heuristic(prompts, "web")
+
+
+def setup_diagram_validation(size, workdir):
+    payload = make_diagram(size).model_dump_json()
+    return lambda: Diagram.model_validate_json(payload)
+
+
+def setup_compact_parse(size, workdir):
+    payload = make_diagram(size).model_dump_json().encode()
+    return lambda: CompactDiagram.from_json(payload)
+
+
+def setup_capacity_simulation(size, workdir):
+    diagram = make_diagram(size)
+    # Keep the call graph acyclic, as in a layered architecture
+    order = {node.id: i for i, node in enumerate(diagram.nodes)}
+    diagram.edges = [edge for edge in diagram.edges if order[edge.source] < order[edge.target]]
+    return lambda: simulate_capacity(diagram, rps=100)
+
+
+def setup_layout(size, workdir):
+    diagram = make_diagram(size)
+    return lambda: layout_diagram(diagram, force=True)
+
+
+def setup_layout_deep(size, workdir):
+    diagram = make_deep_diagram(size)
+    return lambda: layout_diagram(diagram, force=True)
+
+
+def setup_session_patch(size, workdir):
+    # A one-field edit, as sent by the properties panel
+    session = SessionStore().create(make_diagram(size).model_dump())
+    patch = [{"op": "replace", "path": f"/nodes/{size // 2}/data/label", "value": "Renamed"}]
+    return lambda: session.apply(patch)
+
+
+CASES = {
+    "generate_project": setup_generate_project,
+    "generate_docker_compose": setup_generate_docker_compose,
+    "generate_diagram_heuristic": setup_generate_diagram_heuristic,
+    "diagram_validation": setup_diagram_validation,
+    "capacity_simulation": setup_capacity_simulation,
+    "layout": setup_layout,
+    "layout_deep": setup_layout_deep,
+    "session_patch": setup_session_patch,
+    "compact_parse": setup_compact_parse,
+}
+
+
+def run_suite(sizes, repeat, only=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for name, setup in CASES.items():
+                if only and name not in only:
+                    continue
+                results[name] = {}
+                for size in sizes[name]:
+                    fn = setup(size, workdir)
+                    best = float("inf")
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        fn()
+                        best = min(best, time.perf_counter() - start)
+                    results[name][str(size)] = best
+                    print(f"{name:<28} {size:>7} {best * 1000:>10.2f} ms")
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints current vs baseline per case/size and returns the regressions.
+    """
+    regressions = []
+    print(f"\n{'case':<28} {'size':>7} {'base ms':>10} {'now ms':>10} {'change':>8}")
+    for name, by_size in results.items():
+        for size, seconds in by_size.items():
+            base = baseline.get(name, {}).get(size)
+            if base is None:
+                continue
+            change = seconds / base - 1
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions.append((name, size, change))
+            print(f"{name:<28} {size:>7} {base * 1000:>10.2f} {seconds * 1000:>10.2f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for CI smoke runs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", choices=list(CASES), help="run only these cases")
+    parser.add_argument("--save", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON produced by --save")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = run_suite(QUICK_SIZES if args.quick else SIZES, args.repeat, args.only)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "created_at": time.time(),
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Synthetic inputs for the benchmarks: layered architecture diagrams of any
+size and ticket-like prompts for the heuristic generator.
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Diagram, Node, Edge
+
+# Share of each node type; the remainder after rounding goes to Microservice
+DEFAULT_MIX = {"Web App": 0.1, "API Gateway": 0.05, "Microservice": 0.6, "Database": 0.25}
+LAYER_X = {"Web App": 0, "Mobile App": 0, "API Gateway": 300, "Microservice": 600, "Database": 900}
+
+PROMPT_FILLER = ("the", "service", "should", "handle", "orders", "from", "customers", "and", "report", "status",
+                 "within", "seconds", "for", "every", "region", "team", "needs", "dashboard", "with", "metrics")
+PROMPT_KEYWORDS = ("load balancer", "scale", "auth", "login", "user", "payment", "stripe", "shop", "search",
+                   "cache", "fast", "real-time", "queue", "async", "event")
+
+
+def make_diagram(n_nodes: int, mix: dict = None, edge_density: float = 1.5, seed: int = 0,
+                 project_name: str = "bench_project") -> Diagram:
+    """
+    Builds a diagram of about n_nodes nodes wired like a real system: every
+    client calls a gateway, every gateway fronts a share of the services, and
+    each service makes on average `edge_density` further calls, about 70% to
+    databases and the rest to other services.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    counts = {node_type: int(n_nodes * share) for node_type, share in mix.items()}
+    counts["Microservice"] = counts.get("Microservice", 0) + n_nodes - sum(counts.values())
+    if counts["Microservice"] and not counts.get("API Gateway"):
+        counts["API Gateway"] = 1
+        counts["Microservice"] = max(0, counts["Microservice"] - 1)
+
+    nodes = []
+    ids = {}
+    for node_type, count in counts.items():
+        ids[node_type] = []
+        for i in range(count):
+            node_id = f"{node_type.lower().replace(' ', '_')}_{i}"
+            nodes.append(Node(
+                id=node_id,
+                type="custom",
+                position={"x": LAYER_X.get(node_type, 1200), "y": i * 100},
+                data={"label": f"{node_type} {i}", "type": node_type},
+            ))
+            ids[node_type].append(node_id)
+
+    edges = []
+
+    def connect(source, target):
+        edges.append(Edge(id=f"e{len(edges)}", source=source, target=target))
+
+    clients = ids.get("Web App", []) + ids.get("Mobile App", [])
+    gateways = ids.get("API Gateway", [])
+    services = ids.get("Microservice", [])
+    databases = ids.get("Database", [])
+
+    for i, client in enumerate(clients):
+        if gateways:
+            connect(client, gateways[i % len(gateways)])
+    for i, service in enumerate(services):
+        if gateways:
+            connect(gateways[i % len(gateways)], service)
+        calls = int(edge_density) + (rng.random() < edge_density % 1)
+        for _ in range(calls):
+            if databases and (rng.random() < 0.7 or len(services) < 2):
+                connect(service, rng.choice(databases))
+            elif len(services) > 1:
+                connect(service, rng.choice(services))
+
+    return Diagram(nodes=nodes, edges=edges, project_name=project_name)
+
+
+def make_deep_diagram(n_nodes: int, project_name: str = "bench_deep") -> Diagram:
+    """
+    Worst case for layered layout: a chain of n_nodes - 1 services, each
+    calling the next, plus one hub service that calls every one of them, so
+    the longest path is n_nodes deep and the hub's edges span every depth.
+    """
+    n_nodes = max(n_nodes, 2)
+    nodes = [Node(id=f"service_{i}", type="custom", data={"label": f"Service {i}", "type": "Microservice"})
+             for i in range(n_nodes)]
+    chain = [Edge(id=f"c{i}", source=f"service_{i}", target=f"service_{i + 1}") for i in range(n_nodes - 2)]
+    hub = [Edge(id=f"h{i}", source=f"service_{n_nodes - 1}", target=f"service_{i}") for i in range(n_nodes - 1)]
+    return Diagram(nodes=nodes, edges=chain + hub, project_name=project_name)
+
+
+def make_prompts(count: int, words: int = 60, seed: int = 0):
+    rng = random.Random(seed)
+    prompts = []
+    for _ in range(count):
+        tokens = [rng.choice(PROMPT_FILLER) for _ in range(words)]
+        for _ in range(rng.randint(0, 5)):
+            tokens[rng.randrange(words)] = rng.choice(PROMPT_KEYWORDS)
+        prompts.append(" ".join(tokens).capitalize())
+    return prompts
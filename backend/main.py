@@ -1,8 +1,18 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router
+from app.services.jobs import shutdown_job_manager
+from app.services.ai_service import flush_llm_cache
+from app.services.instrumentation import ENABLED as INSTRUMENTATION_ENABLED, ServerTimingMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    shutdown_job_manager()
+    flush_llm_cache()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,8 +20,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["ETag"],  # Read back for If-Match on session patches
 )
 
+if INSTRUMENTATION_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
 app.include_router(router)
 
 if __name__ == "__main__":
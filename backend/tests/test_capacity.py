@@ -0,0 +1,145 @@
+import copy
+import math
+
+import pytest
+
+from app.data.templates import TEMPLATES
+from app.models import Diagram
+from app.services.capacity import simulate_capacity, CapacityError
+
+
+def diagram(nodes, edges=()):
+    return Diagram(
+        nodes=[{"id": node_id, "type": "custom", "data": data} for node_id, data in nodes.items()],
+        edges=[{"id": f"e{i}", "source": source, "target": target, "data": data}
+               for i, (source, target, data) in enumerate(edges)],
+    )
+
+
+def by_id(report):
+    return {node["id"]: node for node in report["nodes"]}
+
+
+def erlang_c(servers, load):
+    """
+    Erlang C from the Erlang B recursion, independently of the solver.
+    """
+    blocking = 1.0
+    for k in range(1, servers + 1):
+        blocking = load * blocking / (k + load * blocking)
+    rho = load / servers
+    return blocking / (1 - rho * (1 - blocking))
+
+
+def test_mm1_utilization_latency_and_percentiles():
+    # lambda = 50/s, mu = 100/s: rho = 0.5, time in system ~ Exp(mu - lambda)
+    report = simulate_capacity(diagram({
+        "client": {"type": "Mobile App"},
+        "svc": {"type": "Microservice", "service_time_ms": 10, "max_connections": 1},
+    }, [("client", "svc", {})]), rates={"client": 50})
+
+    svc = by_id(report)["svc"]
+    assert svc["utilization"] == pytest.approx(0.5)
+    assert svc["queue_length"] == pytest.approx(0.5)          # Lq = rho^2 / (1 - rho)
+    assert svc["latency_ms"]["mean"] == pytest.approx(20.0)   # 1 / (mu - lambda)
+    assert svc["latency_ms"]["p50"] == pytest.approx(1000 * math.log(2) / 50, abs=1e-3)
+    assert svc["latency_ms"]["p99"] == pytest.approx(1000 * math.log(100) / 50, abs=1e-3)
+    assert report["summary"]["bottleneck"]["id"] == "svc"
+    assert report["summary"]["max_offered_rps"] == pytest.approx(100.0, rel=1e-4)
+    assert report["clients"]["client"]["latency_ms"]["mean"] == pytest.approx(20.0)
+
+
+@pytest.mark.parametrize("servers,rate", [(2, 100), (10, 800), (64, 5000)])
+def test_mmc_matches_erlang_c(servers, rate):
+    service_time = 0.01
+    report = simulate_capacity(diagram({
+        "client": {"type": "Web App"},
+        "svc": {"type": "Microservice", "service_time_ms": 10, "max_connections": servers},
+    }, [("client", "svc", {})]), rates={"client": rate})
+
+    load = rate * service_time
+    wait_probability = erlang_c(servers, load)
+    svc = by_id(report)["svc"]
+    # The report rounds utilisation and queue length to 4 decimals, times to the microsecond
+    assert svc["utilization"] == pytest.approx(load / servers, abs=1e-4)
+    assert svc["queue_length"] == pytest.approx(wait_probability * load / servers / (1 - load / servers), abs=1e-4)
+    expected_ms = 1000 * (service_time + wait_probability / (servers / service_time - rate))
+    assert svc["latency_ms"]["mean"] == pytest.approx(expected_ms, abs=1e-3)
+
+
+def test_erlang_c_known_value():
+    # Two servers at one Erlang wait with probability exactly 1/3
+    report = simulate_capacity(diagram({
+        "client": {"type": "Web App"},
+        "svc": {"type": "Microservice", "service_time_ms": 10, "max_connections": 2},
+    }, [("client", "svc", {})]), rates={"client": 100})
+    svc = by_id(report)["svc"]
+    assert svc["queue_length"] == pytest.approx(1 / 3, abs=1e-4)  # C * rho / (1 - rho)
+    assert svc["latency_ms"]["mean"] == pytest.approx(10 + 1000 / 3 / 100, abs=1e-3)
+
+
+def test_fanout_multiplies_arrivals():
+    nodes = {
+        "client": {"type": "Mobile App"},
+        "svc": {"type": "Microservice"},
+        "db": {"type": "Database"},
+    }
+    single = simulate_capacity(diagram(nodes, [("client", "svc", {}), ("svc", "db", {})]), rates={"client": 40})
+    double = simulate_capacity(diagram(nodes, [("client", "svc", {}), ("svc", "db", {"fanout": 2})]), rates={"client": 40})
+
+    assert by_id(single)["db"]["arrival_rps"] == pytest.approx(40)
+    assert by_id(double)["db"]["arrival_rps"] == pytest.approx(80)
+    assert by_id(double)["svc"]["arrival_rps"] == pytest.approx(40)
+
+
+def test_async_call_adds_no_caller_latency():
+    nodes = {
+        "client": {"type": "Mobile App"},
+        "svc": {"type": "Microservice", "service_time_ms": 10, "max_connections": 64},
+        "mail": {"type": "Management", "service_time_ms": 500},
+    }
+    alone = simulate_capacity(diagram(nodes, [("client", "svc", {})]), rates={"client": 50})
+    with_async = simulate_capacity(diagram(nodes, [("client", "svc", {}), ("svc", "mail", {"async": True})]),
+                                   rates={"client": 50})
+    with_sync = simulate_capacity(diagram(nodes, [("client", "svc", {}), ("svc", "mail", {})]), rates={"client": 50})
+
+    assert by_id(with_async)["mail"]["arrival_rps"] == pytest.approx(50)
+    assert by_id(with_async)["svc"]["latency_ms"] == by_id(alone)["svc"]["latency_ms"]
+    assert by_id(with_sync)["svc"]["latency_ms"]["mean"] > 500
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"rps": 0}, {"rates": {"svc": 0}}])
+def test_no_offered_load_is_an_error(kwargs):
+    nodes = {"client": {"type": "Mobile App"}, "svc": {"type": "Microservice"}}
+    with pytest.raises(CapacityError):
+        simulate_capacity(diagram(nodes, [("client", "svc", {})]), **kwargs)
+
+
+def test_annotated_ios_template_finds_the_order_service():
+    document = copy.deepcopy(TEMPLATES["ios"])
+    annotations = {
+        # Orders are the hot path behind the gateway and run few workers
+        "s3": {"load_weight": 3, "service_time_ms": 40, "max_connections": 2},
+        "d1": {"service_time_ms": 8},
+    }
+    edge_annotations = {
+        "e13": {"fanout": 3},     # Order Service -> Primary DB, three queries per order
+        "e15": {"async": True},   # order events are published without waiting
+    }
+    for node in document["nodes"]:
+        node["data"].update(annotations.get(node["id"], {}))
+    for edge in document["edges"]:
+        edge["data"] = edge_annotations.get(edge["id"], {})
+
+    report = simulate_capacity(Diagram(**document), rps=100)
+
+    summary = report["summary"]
+    assert summary["saturated"]
+    assert summary["bottleneck"]["label"] == "Order Service"
+    assert summary["max_offered_rps"] < 100
+    nodes = by_id(report)
+    assert nodes["s3"]["arrival_rps"] == pytest.approx(100 * 3 / 8)
+    assert nodes["d1"]["arrival_rps"] == pytest.approx(100 / 8 * 2 + 100 * 3 / 8 * 3)
+    # The gateway waits on it synchronously, so it backs up too; nothing else does
+    assert {node_id for node_id, node in nodes.items() if node["saturated"]} == {"s3", "g1"}
+    assert max(node["utilization"] for node_id, node in nodes.items() if node_id not in ("s3", "g1")) < 0.2
@@ -0,0 +1,45 @@
+import copy
+
+from app.compact import CompactDiagram
+from app.models import Diagram
+from app.services.instrumentation import start_trace, end_trace
+
+DOCUMENT = {
+    "project_name": "shop",
+    "nodes": [
+        {"id": "a", "type": "custom", "data": {"type": "Microservice", "label": "svc"}, "position": {"x": 1.0, "y": 2.0}},
+        {"id": "b", "type": "custom", "data": {"type": "Database"}, "position": None},
+    ],
+    "edges": [{"id": "e1", "source": "a", "target": "b", "data": {"protocol": "sql"}}],
+}
+
+
+def traced_from_dict(document):
+    trace, token = start_trace()
+    try:
+        compact = CompactDiagram.from_dict(document)
+    finally:
+        end_trace(token)
+    return compact, {name for name, _ in trace.spans}, trace.counts
+
+
+def test_fast_path_does_not_alias_input():
+    document = copy.deepcopy(DOCUMENT)
+    compact, spans, counts = traced_from_dict(document)
+
+    compact.data[0]["label"] = "changed"
+    compact.edge_data[0]["protocol"] = "grpc"
+
+    assert document == DOCUMENT
+    assert "validate_fallback" not in spans and "compact_fallback" not in counts
+
+
+def test_fallback_is_reported_separately():
+    # A numeric string coordinate is coerced by the model, so the fast path hands over
+    document = copy.deepcopy(DOCUMENT)
+    document["nodes"][1]["position"] = {"x": "3", "y": 4}
+    compact, spans, counts = traced_from_dict(document)
+
+    assert "validate_fallback" in spans
+    assert counts["compact_fallback"] == 1
+    assert compact.to_dict() == Diagram.model_validate(document).model_dump()
@@ -0,0 +1,213 @@
+"""
+Replays a recorded OpenAI streaming response (fixtures/llm_stream_coffee_shop.sse,
+the raw SSE body of a chat.completions stream) through the diagram stream
+parser, re-chunked in different ways, and through stream_diagram_with_llm
+with a fake client serving the same recording.
+"""
+import json
+import os
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import Diagram
+from app.services import ai_service
+from app.services.diagram_stream import DiagramStreamParser, parse_diagram_stream
+from app.services.llm_cache import ResponseCache
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "llm_stream_coffee_shop.sse")
+
+
+def read_sse_events(body_chunks):
+    """
+    Decodes an SSE body arriving in arbitrary chunks into the JSON payloads of
+    its `data:` events, stopping at [DONE].
+    """
+    buffer = ""
+    for chunk in body_chunks:
+        buffer += chunk
+        while "\n\n" in buffer:
+            event, buffer = buffer.split("\n\n", 1)
+            data = "\n".join(line[len("data: "):] for line in event.split("\n") if line.startswith("data: "))
+            if data == "[DONE]":
+                return
+            yield json.loads(data)
+
+
+def split_randomly(text, seed, max_size):
+    rng = random.Random(seed)
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, max_size)
+        yield text[i:i + size]
+        i += size
+
+
+def recorded_body():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return f.read()
+
+
+def recorded_deltas(body_chunks=None):
+    events = read_sse_events(body_chunks if body_chunks is not None else [recorded_body()])
+    return [choice["delta"]["content"] for event in events for choice in event["choices"]
+            if choice["delta"].get("content")]
+
+
+def diagram_from_events(events):
+    nodes, edges, project_name, errors = [], [], None, []
+    for kind, payload in events:
+        if kind == "node":
+            nodes.append(payload)
+        elif kind == "edge":
+            edges.append(payload)
+        elif kind == "project_name":
+            project_name = payload
+        elif kind == "error":
+            errors.append(payload)
+    assert not errors
+    return Diagram(nodes=nodes, edges=edges, project_name=project_name)
+
+
+class FakeStreamingClient:
+    """
+    Stands in for the OpenAI client: create(stream=True) replays the recorded
+    SSE body, cut into transport chunks of random size, as chunk objects.
+    """
+
+    def __init__(self, body, seed=0):
+        self.body = body
+        self.seed = seed
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, stream=False, **kwargs):
+        events = read_sse_events(split_randomly(self.body, self.seed, 97))
+        if not stream:
+            content = "".join(choice["delta"].get("content") or "" for event in events for choice in event["choices"])
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        return (
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=choice["delta"].get("content")))
+                                     for choice in event["choices"]])
+            for event in events
+        )
+
+
+@pytest.fixture
+def fresh_llm_cache(monkeypatch):
+    monkeypatch.setattr(ai_service, "llm_cache", ResponseCache())
+
+
+def test_recorded_stream_equals_non_streamed_parse():
+    deltas = recorded_deltas()
+    expected = Diagram(**json.loads("".join(deltas)))
+
+    streamed = diagram_from_events(parse_diagram_stream(deltas))
+
+    assert streamed == expected
+    assert len(streamed.nodes) == 5 and len(streamed.edges) == 5
+
+
+@pytest.mark.parametrize("seed,max_size", [(1, 1), (2, 3), (3, 17), (4, 256), (5, 100000)])
+def test_sse_body_split_anywhere_gives_same_diagram(seed, max_size):
+    # Transport chunks cut through SSE events, JSON escapes and non-ASCII
+    # characters before the deltas are even extracted
+    deltas = recorded_deltas(split_randomly(recorded_body(), seed, max_size))
+    assert deltas == recorded_deltas()
+
+    rechunked = list(split_randomly("".join(deltas), seed, max_size))
+    assert diagram_from_events(parse_diagram_stream(rechunked)) == diagram_from_events(parse_diagram_stream(deltas))
+
+
+def test_every_two_way_split_of_an_element():
+    # Partial JSON across a chunk boundary at every possible offset,
+    # including inside \" and \\ escapes and around braces in strings
+    text = '{"nodes": [{"id": "a", "type": "x", "data": {"label": "say \\"hi\\" {ok} [1] \\\\"}}], "edges": []}'
+    whole = list(parse_diagram_stream([text]))
+    assert [kind for kind, _ in whole] == ["node"]
+    assert whole[0][1].data["label"] == 'say "hi" {ok} [1] \\'
+    for i in range(1, len(text)):
+        assert list(parse_diagram_stream([text[:i], text[i:]])) == whole, i
+
+
+def test_malformed_tail_keeps_completed_elements():
+    text = "".join(recorded_deltas())
+    # Cut inside the fourth edge and append garbage, as a dropped stream would
+    cut = text.index('"e4"')
+    events = list(parse_diagram_stream(split_randomly(text[:cut] + ', "sour}}]]"\x00', 9, 5)))
+
+    kinds = [kind for kind, _ in events]
+    assert kinds.count("node") == 5
+    assert [payload.id for kind, payload in events if kind == "edge"] == ["e1", "e2", "e3"]
+    assert "project_name" not in kinds
+
+
+def test_invalid_element_reported_without_stopping():
+    parser = DiagramStreamParser()
+    events = parser.feed('{"nodes": [{"id": "a", "type": "x"}, {"id": "b", "type": "x", "da')
+    events += parser.feed('ta": {}}], "edges": [], "project_name": "p"}')
+    assert [kind for kind, _ in events] == ["error", "node", "project_name"]
+    assert events[1][1].id == "b"
+
+
+def streamed_diagram(events):
+    """
+    The diagram a client assembles from stream_diagram_with_llm: the elements,
+    then the positions from the trailing layout event.
+    """
+    positions = {}
+    if events and events[-1][0] == "layout":
+        positions = events[-1][1]
+        events = events[:-1]
+    diagram = diagram_from_events(events)
+    for node in diagram.nodes:
+        node.position = positions.get(node.id, node.position)
+    return diagram
+
+
+def test_stream_with_fake_client_matches_non_streamed(monkeypatch, fresh_llm_cache):
+    monkeypatch.setattr(ai_service, "get_client", lambda api_key: FakeStreamingClient(recorded_body(), seed=3))
+
+    events = list(ai_service.stream_diagram_with_llm("coffee shop", "web", "test-key"))
+
+    assert events[-1][0] == "layout"
+    expected = ai_service.layout_diagram(Diagram(**json.loads("".join(recorded_deltas()))))
+    assert streamed_diagram(events) == expected
+
+
+def test_non_streamed_call_through_fake_client(monkeypatch, fresh_llm_cache):
+    monkeypatch.setattr(ai_service, "get_client", lambda api_key: FakeStreamingClient(recorded_body(), seed=4))
+    streamed = streamed_diagram(list(ai_service.stream_diagram_with_llm("coffee shop", "web", "test-key")))
+
+    monkeypatch.setattr(ai_service, "llm_cache", ResponseCache())
+    assert ai_service.generate_diagram_with_llm("coffee shop", "web", "test-key") == streamed
+
+
+def test_cached_answer_replays_same_diagram(monkeypatch, fresh_llm_cache):
+    monkeypatch.setattr(ai_service, "get_client", lambda api_key: FakeStreamingClient(recorded_body()))
+    first = streamed_diagram(list(ai_service.stream_diagram_with_llm("coffee shop", "web", "test-key")))
+
+    monkeypatch.setattr(ai_service, "get_client", lambda api_key: pytest.fail("expected a cache hit"))
+    replayed = list(ai_service.stream_diagram_with_llm("coffee shop", "web", "test-key"))
+
+    assert streamed_diagram(replayed) == first
+
+
+def test_malformed_stream_from_llm_reports_error(monkeypatch, fresh_llm_cache):
+    # The upstream stream dies mid-document: elements already sent stand, the
+    # failure is reported as an error event and nothing is cached
+    text = "".join(recorded_deltas())
+    truncated = text[:text.index('"e4"')] + ', "sour'
+    events = [{"choices": [{"delta": {"content": delta}}]} for delta in split_randomly(truncated, 5, 4)]
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+    monkeypatch.setattr(ai_service, "get_client", lambda api_key: FakeStreamingClient(body))
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(ai_service, "OpenAI", object)
+
+    events = list(ai_service.stream_diagram_from_prompt("coffee shop", "web"))
+
+    kinds = [kind for kind, _ in events]
+    assert kinds.count("node") == 5 and kinds.count("edge") == 3
+    assert kinds[-2:] == ["error", "done"]
+    assert events[-1][1] == {"source": "llm", "nodes": 5, "edges": 3}
+    assert ai_service.llm_cache.stats()["entries"] == 0
@@ -0,0 +1,60 @@
+import copy
+
+from app.data.templates import TEMPLATES
+from app.models import Diagram
+from app.services.generator import generate_project, plan_project
+
+
+def ios_diagram(**changes):
+    """
+    The ios template, with `changes` ({node id: data or position updates}) applied.
+    """
+    document = copy.deepcopy(TEMPLATES["ios"])
+    for node in document["nodes"]:
+        for key, value in changes.get(node["id"], {}).items():
+            if key in ("x", "y"):
+                node["position"][key] += value
+            else:
+                node["data"][key] = value
+    return Diagram(**document, project_name="shop")
+
+
+def test_unlabeled_datastore_is_a_real_compose_service():
+    diagram = Diagram(
+        nodes=[
+            {"id": "gw", "type": "custom", "data": {"type": "API Gateway", "label": "Gateway"}},
+            {"id": "svc", "type": "custom", "data": {"type": "Microservice", "label": "Orders"}},
+            {"id": "db", "type": "custom", "data": {"type": "Database"}},
+            {"id": "cache", "type": "custom", "data": {"type": "Database", "label": "Cache", "engine": "redis"}},
+        ],
+        edges=[
+            {"id": "e1", "source": "gw", "target": "svc"},
+            {"id": "e2", "source": "svc", "target": "db"},
+            {"id": "e3", "source": "svc", "target": "cache"},
+        ],
+        project_name="shop",
+    )
+    services = plan_project(diagram).services
+
+    depends_on = services["orders"]["depends_on"]
+    assert len(depends_on) == 2 and set(depends_on) <= set(services)
+    hosts = {entry.split("@")[-1].split(":")[0] for entry in services["orders"]["environment"] if "@" in entry}
+    assert hosts <= set(services)
+
+
+def test_moving_or_restyling_nodes_keeps_component_digests():
+    before = plan_project(ios_diagram()).components
+    after = plan_project(ios_diagram(g1={"x": 5}, s1={"y": -40, "color": "bg-red-500", "icon": "Bell"})).components
+    assert after == before
+
+
+def test_incremental_run_rebuilds_only_what_changed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generate_project(ios_diagram())
+
+    moved = generate_project(ios_diagram(g1={"x": 5}, c1={"x": 30, "y": 12}), incremental=True)
+    assert moved["changed"] == []
+
+    renamed = generate_project(ios_diagram(c2={"label": "Kitchen App"}), incremental=True)
+    assert renamed["changed"] == ["kitchen_app"]
+    assert not (tmp_path / "shop" / "restaurant_app").exists()
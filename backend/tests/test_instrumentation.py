@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.models import Diagram
+from app.services import instrumentation
+from app.services.instrumentation import start_trace, end_trace
+from main import app
+
+DOCUMENT = {
+    "project_name": "shop",
+    "nodes": [
+        {"id": "c", "type": "custom", "data": {"type": "Mobile App"}},
+        {"id": "s", "type": "custom", "data": {"type": "Microservice"}},
+    ],
+    "edges": [{"id": "e1", "source": "c", "target": "s"}],
+}
+
+
+@pytest.fixture
+def traces(monkeypatch):
+    """
+    Spans of each request handled while the fixture is active.
+    """
+    exported = []
+    monkeypatch.setattr(instrumentation.REGISTRY, "observe_trace", exported.append)
+    return exported
+
+
+def span_names(trace):
+    return [name for name, _ in trace["spans"]]
+
+
+def test_models_do_not_import_services():
+    code = "import sys, app.models; print([m for m in sys.modules if m.startswith('app.services')])"
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=backend)
+    assert result.stdout.strip() == "[]"
+
+
+def test_model_validation_outside_requests_is_not_timed():
+    trace, token = start_trace()
+    try:
+        Diagram(**DOCUMENT)
+        Diagram.model_validate(DOCUMENT)
+    finally:
+        end_trace(token)
+    assert trace.spans == []
+
+
+def test_request_bodies_are_timed_once(traces):
+    client = TestClient(app)
+    response = client.post("/simulate", json={"diagram": DOCUMENT, "rps": 10})
+    assert response.status_code == 200
+    assert "validate;dur=" in response.headers["server-timing"]
+    # The nested diagram is part of the one body validation
+    assert span_names(traces[-1]).count("validate") == 1
+
+    response = client.post("/layout", json=DOCUMENT)
+    assert response.status_code == 200
+    assert span_names(traces[-1]).count("validate") == 1
+
+
+def test_invalid_body_is_still_a_422(traces):
+    response = TestClient(app).post("/simulate", json={"diagram": {"nodes": "x"}, "rps": 10})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:2] == ["body", "diagram"]
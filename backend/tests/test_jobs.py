@@ -0,0 +1,136 @@
+import sys
+import threading
+
+import pytest
+
+from app.models import Diagram
+from app.services import jobs
+from app.services.jobs import JobManager, dedupe_project_names, COMPLETED, PENDING, CANCELLED
+
+
+def diagram(project_name):
+    return Diagram(nodes=[], edges=[], project_name=project_name)
+
+
+@pytest.fixture
+def blocking_generate(monkeypatch, tmp_path):
+    """
+    Replaces generate_project with one that waits for `release` and records
+    how many jobs write each output directory at the same time.
+    """
+    monkeypatch.chdir(tmp_path)
+    release = threading.Event()
+    lock = threading.Lock()
+    active, peak = {}, {}
+
+    def generate(diagram, incremental=False, progress=None):
+        name = jobs.output_name(diagram)
+        with lock:
+            active[name] = active.get(name, 0) + 1
+            peak[name] = max(peak.get(name, 0), active[name])
+        release.wait(timeout=10)
+        with lock:
+            active[name] -= 1
+        return {"path": name}
+
+    monkeypatch.setattr(jobs, "generate_project", generate)
+    return release, peak
+
+
+def test_unnamed_and_default_named_jobs_are_serialized(blocking_generate):
+    release, peak = blocking_generate
+    manager = JobManager(executor="thread", max_workers=4)
+    try:
+        first = manager.submit(diagram(""))
+        second = manager.submit(diagram("generated_project"))
+
+        # Both write ./generated_project, so the second waits for the first
+        assert first.project_name == second.project_name == "generated_project"
+        assert second.future is None and second.status == PENDING
+
+        release.set()
+        assert second.done.result(timeout=10).status == COMPLETED
+        assert first.status == COMPLETED
+    finally:
+        release.set()
+        manager.shutdown()
+    assert peak == {"generated_project": 1}
+
+
+@pytest.fixture
+def frequent_thread_switches():
+    # Switch threads as often as possible so racing calls interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_concurrent_cancels_of_a_waiting_job(blocking_generate, frequent_thread_switches):
+    release, _ = blocking_generate
+    manager = JobManager(executor="thread", max_workers=2)
+    try:
+        for _ in range(20):
+            manager.submit(diagram("shop"))
+            waiting = manager.submit(diagram("shop"))
+            barrier = threading.Barrier(8)
+            errors = []
+
+            def cancel():
+                barrier.wait()
+                try:
+                    manager.cancel(waiting.id)
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=cancel) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert errors == [] and waiting.status == CANCELLED
+            assert list(manager._by_project["shop"]) != [waiting]
+            release.set()
+            manager.list()[-2].done.result(timeout=10)
+            release.clear()
+    finally:
+        release.set()
+        manager.shutdown()
+
+
+def test_thread_managers_keep_their_own_progress_and_cancel_flags(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    reported = {}
+
+    def generate(diagram, incremental=False, progress=None):
+        progress(1, 2)
+        reported[diagram.project_name].set()
+        # Runs until cancelled through the manager that submitted it
+        for _ in range(1000):
+            progress(2, 2)
+            threading.Event().wait(0.01)
+        return {"path": diagram.project_name}
+
+    monkeypatch.setattr(jobs, "generate_project", generate)
+    first, second = JobManager(executor="thread"), JobManager(executor="thread")
+    try:
+        submitted = []
+        # Each manager starts a worker in turn, then the first one runs another job
+        for manager, name in ((first, "a"), (second, "b"), (first, "c")):
+            reported[name] = threading.Event()
+            submitted.append((manager, manager.submit(diagram(name))))
+            assert reported[name].wait(timeout=10)
+
+        for manager, job in submitted:
+            assert manager.describe(job)["progress"]["total"] == 2
+            manager.cancel(job.id)
+        for manager, job in submitted:
+            assert job.done.result(timeout=10).status == CANCELLED
+    finally:
+        first.shutdown()
+        second.shutdown()
+
+
+def test_batch_dedupes_normalized_names():
+    names = [d.project_name for d in dedupe_project_names([diagram(""), diagram("generated_project"), diagram("a")])]
+    assert names == ["", "generated_project_2", "a"]
@@ -0,0 +1,135 @@
+import copy
+
+import pytest
+
+from app.services.json_patch import apply_patch, parse_pointer, JsonPatchError, JsonPatchConflict
+
+DOCUMENT = {
+    "nodes": [{"id": "a", "data": {"label": "A"}}, {"id": "b", "data": {"label": "B"}}],
+    "edges": [],
+    "meta": {"a/b": 1, "m~n": 2, "flag": True},
+}
+
+
+def patched(*operations):
+    document = copy.deepcopy(DOCUMENT)
+    result = apply_patch(document, list(operations))
+    assert document == DOCUMENT
+    return result
+
+
+def test_pointer_escapes():
+    assert parse_pointer("") == []
+    assert parse_pointer("/meta/a~1b") == ["meta", "a/b"]
+    # ~01 is "~1" literally, not "/"
+    assert parse_pointer("/~01/~0") == ["~1", "~"]
+    assert patched({"op": "replace", "path": "/meta/m~0n", "value": 3})["meta"]["m~n"] == 3
+
+
+@pytest.mark.parametrize("pointer", ["meta", 3, None])
+def test_invalid_pointer(pointer):
+    with pytest.raises(JsonPatchError):
+        apply_patch(DOCUMENT, [{"op": "remove", "path": pointer}])
+
+
+def test_add():
+    assert [n["id"] for n in patched({"op": "add", "path": "/nodes/-", "value": {"id": "c"}})["nodes"]] == ["a", "b", "c"]
+    assert [n["id"] for n in patched({"op": "add", "path": "/nodes/0", "value": {"id": "c"}})["nodes"]] == ["c", "a", "b"]
+    assert [n["id"] for n in patched({"op": "add", "path": "/nodes/2", "value": {"id": "c"}})["nodes"]] == ["a", "b", "c"]
+    assert patched({"op": "add", "path": "/meta/flag", "value": False})["meta"]["flag"] is False
+    assert patched({"op": "add", "path": "", "value": {"x": 1}}) == {"x": 1}
+
+
+@pytest.mark.parametrize("path,error", [
+    ("/nodes/3", JsonPatchConflict),         # past the end
+    ("/nodes/01", JsonPatchConflict),        # leading zero
+    ("/nodes/x", JsonPatchConflict),
+    ("/missing/child", JsonPatchConflict),
+    ("/meta/flag/deeper", JsonPatchConflict),
+])
+def test_add_error_paths(path, error):
+    with pytest.raises(error):
+        apply_patch(DOCUMENT, [{"op": "add", "path": path, "value": 1}])
+
+
+def test_remove():
+    assert [n["id"] for n in patched({"op": "remove", "path": "/nodes/0"})["nodes"]] == ["b"]
+    assert "flag" not in patched({"op": "remove", "path": "/meta/flag"})["meta"]
+    for path in ("/nodes/2", "/nodes/-", "/meta/missing"):
+        with pytest.raises(JsonPatchConflict):
+            apply_patch(DOCUMENT, [{"op": "remove", "path": path}])
+    with pytest.raises(JsonPatchError):
+        apply_patch(DOCUMENT, [{"op": "remove", "path": ""}])
+
+
+def test_replace():
+    assert patched({"op": "replace", "path": "/nodes/1/data/label", "value": "C"})["nodes"][1]["data"]["label"] == "C"
+    assert patched({"op": "replace", "path": "", "value": []}) == []
+    for path in ("/nodes/2", "/meta/missing", "/nodes/-"):
+        with pytest.raises(JsonPatchConflict):
+            apply_patch(DOCUMENT, [{"op": "replace", "path": path, "value": 1}])
+    with pytest.raises(JsonPatchError):
+        apply_patch(DOCUMENT, [{"op": "replace", "path": "/meta/flag"}])
+
+
+def test_move():
+    result = patched({"op": "move", "from": "/nodes/0", "path": "/nodes/-"})
+    assert [n["id"] for n in result["nodes"]] == ["b", "a"]
+    result = patched({"op": "move", "from": "/meta", "path": "/nodes/0/data/meta"})
+    assert "meta" not in result and result["nodes"][0]["data"]["meta"] == DOCUMENT["meta"]
+    with pytest.raises(JsonPatchError):
+        apply_patch(DOCUMENT, [{"op": "move", "from": "/nodes/0", "path": "/nodes/0/data/self"}])
+    with pytest.raises(JsonPatchConflict):
+        apply_patch(DOCUMENT, [{"op": "move", "from": "/meta/missing", "path": "/edges/-"}])
+    with pytest.raises(JsonPatchError):
+        apply_patch(DOCUMENT, [{"op": "move", "path": "/edges/-"}])
+
+
+def test_copy_does_not_alias():
+    result = patched({"op": "copy", "from": "/nodes/0", "path": "/nodes/-"},
+                     {"op": "replace", "path": "/nodes/2/data/label", "value": "copy"})
+    assert result["nodes"][0]["data"]["label"] == "A"
+    assert result["nodes"][2]["data"]["label"] == "copy"
+    with pytest.raises(JsonPatchConflict):
+        apply_patch(DOCUMENT, [{"op": "copy", "from": "/nodes/5", "path": "/edges/-"}])
+
+
+def test_test_operation():
+    assert patched({"op": "test", "path": "/meta/a~1b", "value": 1.0}) == DOCUMENT
+    assert patched({"op": "test", "path": "/nodes/0", "value": {"data": {"label": "A"}, "id": "a"}}) == DOCUMENT
+    # JSON true is not the number 1, in either direction
+    for path, value in (("/meta/a~1b", True), ("/meta/flag", 1), ("/nodes/0/id", "b"), ("/edges", {})):
+        with pytest.raises(JsonPatchConflict):
+            apply_patch(DOCUMENT, [{"op": "test", "path": path, "value": value}])
+    with pytest.raises(JsonPatchConflict):
+        apply_patch(DOCUMENT, [{"op": "test", "path": "/meta/missing", "value": None}])
+
+
+@pytest.mark.parametrize("patch", [
+    {"op": "add", "path": "/x", "value": 1},   # not an array
+    [["add", "/x", 1]],
+    [{"op": "frobnicate", "path": "/x"}],
+    [{"path": "/x", "value": 1}],
+    [{"op": "add", "value": 1}],
+])
+def test_malformed_patch(patch):
+    with pytest.raises(JsonPatchError) as info:
+        apply_patch(DOCUMENT, patch)
+    assert not isinstance(info.value, JsonPatchConflict)
+
+
+def test_failed_patch_leaves_document_unchanged():
+    document = copy.deepcopy(DOCUMENT)
+    with pytest.raises(JsonPatchConflict, match="Operation 1"):
+        apply_patch(document, [{"op": "replace", "path": "/nodes/0/data/label", "value": "Z"},
+                               {"op": "remove", "path": "/nodes/9"}])
+    assert document == DOCUMENT
+
+
+def test_untouched_elements_are_shared():
+    document = copy.deepcopy(DOCUMENT)
+    result = apply_patch(document, [{"op": "replace", "path": "/nodes/1/data/label", "value": "C"}])
+    assert result["nodes"][0] is document["nodes"][0]
+    assert result["edges"] is document["edges"] and result["meta"] is document["meta"]
+    assert result["nodes"] is not document["nodes"] and result["nodes"][1] is not document["nodes"][1]
+    assert document == DOCUMENT
@@ -0,0 +1,143 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.compact import CompactDiagram
+from app.models import Diagram
+from app.services.layout import (layout_diagram, layout_compact, compute_layout, NODE_SPACING, LAYER_SPACING,
+                                 MAX_EDGE_SPAN, TYPE_RANK, _orient_edges, _longest_path_layers, _split_long_edges)
+
+TYPES = list(TYPE_RANK) + ["Something Else", None]
+
+
+def random_graph(n, edges, seed):
+    rng = random.Random(seed)
+    types = [rng.choice(TYPES) for _ in range(n)]
+    pairs = [(rng.randrange(n), rng.randrange(n)) for _ in range(edges)]
+    return types, pairs
+
+
+def diagram(types, pairs, positions=None):
+    positions = positions or {}
+    return Diagram(
+        nodes=[{"id": f"n{i}", "type": "custom", "data": {"type": t} if t else {}, "position": positions.get(i)}
+               for i, t in enumerate(types)],
+        edges=[{"id": f"e{k}", "source": f"n{s}", "target": f"n{d}"} for k, (s, d) in enumerate(pairs)],
+    )
+
+
+def layers_of(coords):
+    rows = {}
+    for i, (x, y) in enumerate(coords.tolist()):
+        rows.setdefault(y, []).append(x)
+    return rows
+
+
+def test_cycles_and_self_loops_are_laid_out():
+    # A ring of services, a two-node cycle, self-loops and duplicate edges
+    n = 3000
+    types = ["Microservice"] * n
+    pairs = [(i, (i + 1) % n) for i in range(n)] + [(0, 1), (1, 0), (5, 5), (7, 7), (2, 3)]
+    coords = compute_layout(types, pairs)
+    assert coords.shape == (n, 2) and np.isfinite(coords).all()
+    # The ring is cut once, so it becomes one long path
+    assert len(layers_of(coords)) == n
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_nodes_in_a_layer_keep_their_spacing(seed):
+    types, pairs = random_graph(300, 600, seed)
+    coords = compute_layout(types, pairs)
+    for xs in layers_of(coords).values():
+        assert np.all(np.diff(sorted(xs)) >= NODE_SPACING - 1e-6)
+    assert coords[:, 0].min() == 0
+    assert set(coords[:, 1].tolist()) <= {LAYER_SPACING * k for k in range(len(types))}
+
+
+def test_edges_point_down_the_layers():
+    types, pairs = random_graph(400, 800, 11)
+    coords = compute_layout(types, pairs)
+    rank = [TYPE_RANK.get(t, 3) for t in types]
+    for s, d in pairs:
+        if s == d:
+            continue
+        upper, lower = (s, d) if (rank[s], s) < (rank[d], d) else (d, s)
+        assert coords[upper, 1] < coords[lower, 1]
+
+
+def test_type_rank_puts_clients_above_stores():
+    # Edges drawn "upwards" (store -> service -> client) are reversed, not obeyed
+    types = ["Database", "Microservice", "API Gateway", "Mobile App", "Web App", "RabbitMQ/KAFKA"]
+    pairs = [(0, 1), (1, 2), (2, 3), (2, 4), (5, 1), (0, 5)]
+    y = compute_layout(types, pairs)[:, 1]
+    assert y[3] == y[4] < y[2] < y[1] < y[5] < y[0]
+
+
+def test_unconnected_nodes_join_their_rank():
+    types = ["Mobile App", "API Gateway", "Microservice", "Database", "Microservice", "Database"]
+    y = compute_layout(types, [(0, 1), (1, 2), (2, 3)])[:, 1]
+    assert y[4] == y[2] and y[5] == y[3]
+
+
+def test_long_edges_stay_single_segments():
+    # A chain with a hub joined to every node: without the span bound this
+    # needs O(n^2) dummy nodes
+    n = 2000
+    types = ["Microservice"] * n
+    pairs = [(i, i + 1) for i in range(1, n - 1)] + [(0, i) for i in range(1, n)]
+    coords = compute_layout(types, pairs)
+    assert len(layers_of(coords)) == n
+    assert coords[n - 1, 1] - coords[0, 1] == LAYER_SPACING * (n - 1)
+
+    # Only the hub's edges spanning 2..MAX_EDGE_SPAN layers get dummies
+    rank = np.full(n, TYPE_RANK["Microservice"])
+    src, dst = _orient_edges(n, rank, pairs)
+    layer_all, _, seg_src, _ = _split_long_edges(n, _longest_path_layers(n, src, dst, rank), rank, src, dst)
+    assert len(layer_all) - n == sum(span - 1 for span in range(2, MAX_EDGE_SPAN + 1))
+    assert len(seg_src) == len(src) + len(layer_all) - n
+
+
+def test_left_to_right_swaps_axes():
+    types, pairs = random_graph(50, 80, 3)
+    assert np.array_equal(compute_layout(types, pairs, "LR"), compute_layout(types, pairs)[:, ::-1])
+    with pytest.raises(ValueError):
+        compute_layout(types, pairs, "BT")
+
+
+def test_partial_layout_leaves_placed_nodes():
+    types, pairs = random_graph(40, 70, 5)
+    placed = {i: {"x": float(10 * i), "y": float(-5 * i)} for i in range(0, 40, 3)}
+    result = layout_diagram(diagram(types, pairs, placed))
+
+    for i, node in enumerate(result.nodes):
+        if i in placed:
+            assert node.position == placed[i]
+        else:
+            # New nodes go in a band below everything already on the canvas
+            assert node.position["y"] >= max(p["y"] for p in placed.values()) + LAYER_SPACING
+            assert node.position["x"] >= min(p["x"] for p in placed.values())
+
+
+def test_fully_placed_diagram_is_untouched_unless_forced():
+    types, pairs = random_graph(20, 30, 6)
+    placed = {i: {"x": float(i), "y": 0.0} for i in range(20)}
+    assert [n.position for n in layout_diagram(diagram(types, pairs, placed)).nodes] == list(placed.values())
+    forced = layout_diagram(diagram(types, pairs, placed), force=True)
+    expected = compute_layout(types, pairs).round(1)
+    assert [[n.position["x"], n.position["y"]] for n in forced.nodes] == expected.tolist()
+
+
+@pytest.mark.parametrize("direction,force,partial", [("TB", False, False), ("LR", False, True),
+                                                      ("TB", True, True), ("TB", False, True)])
+def test_compact_layout_matches_diagram_layout(direction, force, partial):
+    types, pairs = random_graph(200, 350, 8)
+    placed = {i: {"x": float(i), "y": float(i % 7)} for i in range(0, 200, 4)} if partial else {}
+    expected = layout_diagram(diagram(types, pairs, placed), direction=direction, force=force)
+
+    document = diagram(types, pairs, placed).model_dump()
+    # An edge to a node outside the diagram doesn't change the layout
+    document["edges"].append({"id": "dangling", "source": "n1", "target": "elsewhere", "data": {}})
+    compact = layout_compact(CompactDiagram.from_dict(document), direction=direction, force=force)
+
+    assert compact.positions() == [node.position for node in expected.nodes]
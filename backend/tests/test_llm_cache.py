@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from app.services import llm_cache
+from app.services.llm_cache import ResponseCache
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def run_concurrently(cache, key, compute, callers):
+    results = [None] * callers
+
+    def call(i):
+        try:
+            results[i] = cache.get_or_compute(key, compute)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_misses_make_one_upstream_call():
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"nodes": []}
+
+    threads, results = run_concurrently(cache, "k", compute, 16)
+    # Everyone but the leader is waiting on the leader's result
+    wait_for(lambda: cache.stats()["coalesced"] == 15)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result == {"nodes": []} for result in results)
+    assert cache.get_or_compute("k", lambda: pytest.fail("expected a hit")) == {"nodes": []}
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 15, 1)
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    cache = ResponseCache()
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        raise RuntimeError("upstream timeout")
+
+    threads, results = run_concurrently(cache, "k", compute, 4)
+    wait_for(lambda: cache.stats()["coalesced"] == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.stats()["entries"] == 0
+    assert cache.get_or_compute("k", lambda: "recovered") == "recovered"
+
+
+def test_entries_expire():
+    cache = ResponseCache(ttl=0.05)
+    cache.put("k", "v")
+    assert cache.get("k") == "v"
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.get_or_compute("k", lambda: "fresh") == "fresh"
+
+
+def test_least_recently_used_goes_first():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_writes_are_debounced(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.json")
+    writes = []
+    replace = os.replace
+    monkeypatch.setattr(llm_cache.os, "replace", lambda src, dst: (writes.append(dst), replace(src, dst)))
+
+    cache = ResponseCache(path=path, save_delay=0.2)
+    for i in range(50):
+        cache.put(f"k{i}", i)
+    # Nothing on the request path touched the disk
+    assert writes == [] and not os.path.exists(path)
+
+    wait_for(lambda: writes)
+    time.sleep(0.3)
+    assert writes == [path]
+    assert len(json.load(open(path))) == 50
+
+
+def test_flush_persists_and_reloads(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path=path, save_delay=60, ttl=60)
+    cache.put("kept", {"nodes": [1]})
+    cache.flush()
+
+    with open(path) as f:
+        stored = json.load(f)
+    stored.append(["expired", time.time() - 1, "old"])
+    with open(path, "w") as f:
+        json.dump(stored, f)
+
+    reloaded = ResponseCache(path=path)
+    assert reloaded.get("kept") == {"nodes": [1]}
+    assert reloaded.get("expired") is None
+    assert reloaded.stats()["entries"] == 1
+
+
+def test_unwritable_path_does_not_fail_requests(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "missing" / "cache.json"), save_delay=60)
+    cache.put("k", "v")
+    cache.flush()
+    assert cache.get("k") == "v"
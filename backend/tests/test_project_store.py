@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.models import Diagram
+from app.services.jobs import JobManager
+from app.services.project_store import ProjectStore, InvalidProjectName
+from main import app
+
+DOCUMENT = {
+    "project_name": "shop",
+    "nodes": [{"id": "a", "type": "custom", "data": {"type": "Microservice", "label": "svc"}, "position": None}],
+    "edges": [],
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProjectStore(str(tmp_path / "autoarch.db"))
+
+
+@pytest.mark.parametrize("name", ["", "  ", "generated_project"])
+def test_unnamed_diagrams_are_rejected(store, name):
+    with pytest.raises(InvalidProjectName):
+        store.save_version(dict(DOCUMENT, project_name=name))
+
+
+@pytest.mark.parametrize("first,second", [("running", "completed"), ("completed", "running")])
+def test_job_records_arrive_in_any_order(store, first, second):
+    project = store.save_version(DOCUMENT)
+    ids = {store.record_job(project["id"], 1, "job-1", status, {"ok": True} if status == "completed" else None)
+           for status in (first, second)}
+
+    [generation] = store.list_generations("shop")["generations"]
+    assert ids == {generation["id"]}
+    assert generation["status"] == "completed" and generation["result"] == {"ok": True}
+    assert generation["finished_at"] is not None
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch, store):
+    """
+    The API with its own project store and a thread-pool job manager,
+    generating into tmp_path.
+    """
+    monkeypatch.chdir(tmp_path)
+    manager = JobManager(executor="thread")
+    monkeypatch.setattr(routes, "get_project_store", lambda: store)
+    monkeypatch.setattr(routes, "get_job_manager", lambda: manager)
+    yield TestClient(app)
+    manager.shutdown()
+
+
+@pytest.mark.parametrize("first", ["running", "finished"])
+def test_generation_ends_up_completed_in_either_order(api, store, monkeypatch, first):
+    # Hold back whichever record should come second until the other is stored
+    recorded = {"running": threading.Event(), "finished": threading.Event()}
+    record_job = store.record_job
+
+    def ordered_record_job(project_id, version, job_id, status, result=None, error=None):
+        kind = "running" if status == "running" else "finished"
+        if kind != first:
+            assert recorded[first].wait(timeout=10)
+        generation_id = record_job(project_id, version, job_id, status, result, error)
+        recorded[kind].set()
+        return generation_id
+
+    monkeypatch.setattr(store, "record_job", ordered_record_job)
+    assert api.post("/projects", json=DOCUMENT).status_code == 201
+    response = api.post("/projects/shop/generate")
+    assert response.status_code == 202
+    assert recorded["finished"].wait(timeout=10) and recorded["running"].is_set()
+
+    [generation] = api.get("/projects/shop/generations").json()["generations"]
+    assert generation["id"] == response.json()["generation_id"]
+    assert generation["status"] == "completed"
+    assert generation["result"]["path"].endswith("shop")
+    assert generation["finished_at"] is not None
+
+
+def test_slow_or_failing_hook_does_not_hold_up_jobs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = JobManager(executor="thread")
+    started, release = threading.Event(), threading.Event()
+
+    def slow_failing_hook(job):
+        started.set()
+        release.wait(timeout=10)
+        raise RuntimeError("store unavailable")
+
+    try:
+        job = manager.submit(Diagram(**DOCUMENT), on_finish=slow_failing_hook)
+        assert started.wait(timeout=10)
+        # While the hook is stuck, the manager still answers and runs jobs
+        assert manager.describe(job)["status"] == "completed"
+        assert manager.submit(Diagram(**dict(DOCUMENT, project_name="other"))).done.result(timeout=10).status == "completed"
+        release.set()
+        # The failure is printed; later jobs are unaffected
+        assert manager.submit(Diagram(**DOCUMENT)).done.result(timeout=10).status == "completed"
+    finally:
+        release.set()
+        manager.shutdown()
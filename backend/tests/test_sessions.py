@@ -0,0 +1,113 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.services.sessions import SessionStore
+from main import app
+
+DOCUMENT = {
+    "project_name": "shop",
+    "nodes": [
+        {"id": "a", "type": "custom", "data": {"type": "Microservice", "label": "Orders"}, "position": {"x": 0, "y": 0}},
+        {"id": "b", "type": "custom", "data": {"type": "Database", "label": "DB"}, "position": {"x": 0, "y": 100}},
+    ],
+    "edges": [{"id": "e1", "source": "a", "target": "b"}],
+}
+RENAME = [{"op": "replace", "path": "/nodes/0/data/label", "value": "Payments"}]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = SessionStore()
+    monkeypatch.setattr(routes, "get_session_store", lambda: store)
+    return TestClient(app)
+
+
+@pytest.fixture
+def session(client):
+    response = client.post("/sessions", json=DOCUMENT)
+    assert response.status_code == 201
+    return response.json()["session_id"], response.headers["ETag"]
+
+
+def get_diagram(client, session_id):
+    return client.get(f"/sessions/{session_id}").json()["diagram"]
+
+
+def test_patch_with_current_etag(client, session):
+    session_id, etag = session
+    response = client.patch(f"/sessions/{session_id}", json=RENAME, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert response.headers["ETag"] != etag
+    assert get_diagram(client, session_id)["nodes"][0]["data"]["label"] == "Payments"
+
+
+def test_stale_etag_is_412(client, session):
+    session_id, etag = session
+    current = client.patch(f"/sessions/{session_id}", json=RENAME, headers={"If-Match": etag}).headers["ETag"]
+
+    response = client.patch(f"/sessions/{session_id}", json=[{"op": "remove", "path": "/edges/0"}],
+                            headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert response.headers["ETag"] == current
+    assert len(get_diagram(client, session_id)["edges"]) == 1
+    assert client.post(f"/sessions/{session_id}/generate", headers={"If-Match": etag}).status_code == 412
+
+
+def test_weak_etag_never_matches(client, session):
+    session_id, etag = session
+    response = client.patch(f"/sessions/{session_id}", json=RENAME, headers={"If-Match": f"W/{etag}"})
+    assert response.status_code == 412
+    assert client.patch(f"/sessions/{session_id}", json=RENAME, headers={"If-Match": "*"}).status_code == 200
+
+
+@pytest.mark.parametrize("patch", [
+    [{"op": "replace", "path": "/nodes/0/id", "value": 5}],
+    [{"op": "remove", "path": "/nodes/0/data"}],
+    [{"op": "add", "path": "/edges/-", "value": {"id": "e2", "source": "a"}}],
+    [{"op": "replace", "path": "/nodes", "value": {}}],
+    [{"op": "replace", "path": "/project_name", "value": None}],
+])
+def test_invalid_result_is_422(client, session, patch):
+    session_id, etag = session
+    before = get_diagram(client, session_id)
+    response = client.patch(f"/sessions/{session_id}", json=patch, headers={"If-Match": etag})
+    assert response.status_code == 422
+    # Nothing was applied: the same ETag still matches
+    assert client.get(f"/sessions/{session_id}").headers["ETag"] == etag
+    assert get_diagram(client, session_id) == before
+
+
+def test_conflicting_and_malformed_patches(client, session):
+    session_id, etag = session
+    assert client.patch(f"/sessions/{session_id}", json=[{"op": "remove", "path": "/nodes/7"}]).status_code == 409
+    assert client.patch(f"/sessions/{session_id}", json=[{"op": "test", "path": "/project_name", "value": "x"}]).status_code == 409
+    assert client.patch(f"/sessions/{session_id}", json=[{"op": "jump", "path": "/nodes"}]).status_code == 400
+    assert client.get(f"/sessions/{session_id}").headers["ETag"] == etag
+
+
+def test_new_elements_are_normalized(client, session):
+    session_id, _ = session
+    node = {"id": "c", "type": "custom", "data": {"type": "Microservice"}, "position": {"x": 1, "y": "2"}}
+    assert client.patch(f"/sessions/{session_id}", json=[{"op": "add", "path": "/nodes/-", "value": node}]).status_code == 200
+    assert get_diagram(client, session_id)["nodes"][2]["position"] == {"x": 1.0, "y": 2.0}
+
+
+def test_patch_does_not_change_previous_document(client, session):
+    session_id, _ = session
+    store = routes.get_session_store()
+    before = store.get(session_id).document
+    snapshot = {"nodes": [dict(node, data=dict(node["data"])) for node in before["nodes"]], "edges": list(before["edges"])}
+
+    client.patch(f"/sessions/{session_id}", json=RENAME)
+
+    after = store.get(session_id).document
+    assert after is not before
+    assert before["nodes"] == snapshot["nodes"] and before["edges"] == snapshot["edges"]
+    assert after["nodes"][1] is before["nodes"][1] and after["edges"] is before["edges"]
+
+
+def test_unknown_session_is_404(client):
+    assert client.patch("/sessions/nope", json=RENAME).status_code == 404
+    assert client.delete("/sessions/nope").status_code == 404
@@ -56,6 +56,23 @@ export const api = {
     // Add put, delete, etc. as needed
 };
 
-export const generateCode = async (diagram) => {
-    return api.post("/generate", diagram);
+export const getJob = async (jobId) => {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+    if (!response.ok) {
+        throw new Error(`API Error: ${response.statusText}`);
+    }
+    return response.json();
+};
+
+// /generate queues a background job; poll it until it finishes and return its result
+export const generateCode = async (diagram, pollInterval = 500) => {
+    let job = await api.post("/generate", diagram);
+    while (!["completed", "failed", "cancelled"].includes(job.status)) {
+        await new Promise((resolve) => setTimeout(resolve, pollInterval));
+        job = await getJob(job.job_id);
+    }
+    if (job.status !== "completed") {
+        throw new Error(job.error || `Code generation ${job.status}`);
+    }
+    return job.result;
 };